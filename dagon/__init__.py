@@ -1,23 +1,38 @@
+import asyncio
 import logging
 import logging.config
 import os
 import json
+import queue
 import re
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from logging.config import fileConfig
 import threading
 from configparser import NoSectionError
 from enum import Enum
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set
 from requests.exceptions import ConnectionError
 
 from time import time
 from datetime import datetime
 
 from dagon.config import read_config
+from dagon.context import DEFAULT_TTL, ContextCache
+from dagon.result_cache import ResultCache
+from dagon.executor import Executor
+from dagon.history import HistoryStore, command_hash
+from dagon.metrics import Metrics
+from dagon.graph import cycle_members, reachable, topological_sort
+from dagon import incremental, journal
+from dagon.scheduling import FIFOPolicy, SchedulingPolicy, get_policy, load_estimates
+from dagon import references
 from dagon.api import API
 
-from dagon.stager.base import DataMover
+from dagon.stager.base import STAGING_CACHE, DataMover
 from dagon.stager.base import StagerMover
+from dagon.shell import join_command
 
 def __getattr__(name):
     if name == "WorkflowServer":
@@ -52,6 +67,20 @@ class Status(Enum):
     FAILED = "FAILED"
 
 
+class WorkflowCycleError(Exception):
+    """
+    Raised when the dependencies of a workflow form a cycle
+
+    :ivar tasks: every task that lies on a cycle
+    :vartype tasks: list(:class:`dagon.task.Task`)
+    """
+
+    def __init__(self, tasks: List[Any]) -> None:
+        Exception.__init__(self, "A cycle has been found involving tasks %s" % ", ".join(
+            str(task.name) for task in tasks))
+        self.tasks = tasks
+
+
 class EventHook:
     """A thread-safe collection of callbacks for a workflow lifecycle event.
 
@@ -96,6 +125,158 @@ class EventHook:
                     "Listener for workflow event %s failed", self.name)
 
 
+class Scheduler(object):
+    """Event-driven ready queue used by :meth:`Workflow.run`.
+
+    Every task keeps a counter of its unfinished in-workflow producers.  A task
+    is started only when that counter reaches zero, and a producer that ends
+    releases its consumers immediately through :meth:`task_done`.  Producers
+    from other workflows (meta-workflows and the DAGon service) are not counted
+    here; the consumer task still waits for those itself.
+
+    Released tasks are handed to the workflow :class:`~dagon.executor.Executor`,
+    which starts them as execution slots become free.
+    """
+
+    def __init__(self, workflow: "Workflow", tasks: Optional[Iterable[Any]] = None) -> None:
+        self.workflow = workflow
+        # Tasks of a targeted run; the others are never started
+        self._selected: Optional[Set[Any]] = None if tasks is None else set(tasks)
+        self._lock = threading.RLock()
+        self._done: "queue.Queue[Any]" = queue.Queue()
+        self._ready: Deque[Any] = deque()
+        self._indegree: Dict[Any, int] = {}
+        self._ended: Set[Any] = set()
+        self._running = 0
+
+    def _local_prevs(self, task: Any) -> List[Any]:
+        # A consumer that references the same producer several times holds
+        # duplicated edges; each producer releases it only once.
+        return [prev for prev in dict.fromkeys(task.prevs) if prev.workflow is self.workflow]
+
+    def _count(self, task: Any) -> None:
+        pending = sum(1 for prev in self._local_prevs(task) if prev not in self._ended)
+        self._indegree[task] = pending
+        if pending == 0:
+            self._ready.append(task)
+
+    def refresh(self, tasks: Iterable[Any]) -> None:
+        """Count again the producers of tasks whose edges changed during the run.
+
+        Called when the graph changes while the workflow runs, for example when
+        a parallel task adds its fan-out tasks.  Only *tasks* are visited and
+        only their priorities are updated; tasks that were already released
+        keep their place.
+        """
+        with self._lock:
+            tasks = list(dict.fromkeys(tasks))
+            self.workflow.scheduling_policy.update(self.workflow, tasks)
+            for task in tasks:
+                if self._selected is not None and task not in self._selected:
+                    # Fan-out tasks of a selected task are part of the targeted run
+                    if not any(prev in self._selected for prev in self._local_prevs(task)):
+                        continue
+                    self._selected.add(task)
+                if task.workflow is self.workflow and self._indegree.get(task, 1) > 0 and task not in self._ended:
+                    self._count(task)
+            self._dispatch()
+
+    def task_done(self, task: Any) -> None:
+        """Report that *task* ended, whether it finished or failed."""
+        self._done.put(task)
+
+    def _release(self, task: Any) -> None:
+        self.workflow.executor.release(task)
+        self._running -= 1
+        self._ended.add(task)
+        for consumer in dict.fromkeys(task.nexts):
+            # The counters come from prevs; a stale nexts entry must not release a consumer
+            if consumer.workflow is not self.workflow or consumer in self._ended or task not in consumer.prevs or \
+                    (self._selected is not None and consumer not in self._selected):
+                continue
+            if consumer not in self._indegree:
+                self._count(consumer)
+                continue
+            if self._indegree[consumer] > 0:
+                self._indegree[consumer] -= 1
+                if self._indegree[consumer] == 0:
+                    self._ready.append(consumer)
+
+    def _dispatch(self) -> None:
+        executor = self.workflow.executor
+        while self._ready:
+            self._running += 1
+            task = self._ready.popleft()
+            task.release_time = time()
+            executor.submit(task)
+        for task in executor.acquire():
+            self._start(task)
+
+    def _start(self, task: Any) -> None:
+        try:
+            task.start()
+        except RuntimeError:
+            self.workflow.logger.debug("Task %s was already started", task.name)
+            if task.status in (Status.FINISHED, Status.FAILED):
+                self.task_done(task)
+
+    def _seed(self) -> None:
+        with self._lock:
+            self.workflow.scheduling_policy.prepare(self.workflow)
+            for task in self.workflow.topological_order():
+                if self._selected is None or task in self._selected:
+                    self._count(task)
+            self._dispatch()
+
+    def _finished(self) -> bool:
+        with self._lock:
+            return self._running == 0 and not self._ready
+
+    def _step(self, task: Any) -> None:
+        with self._lock:
+            self._release(task)
+            self._dispatch()
+
+    def run(self) -> None:
+        """Start runnable tasks and block until every released task ended."""
+        self._seed()
+        while not self._finished():
+            self._step(self._done.get())
+
+
+class AsyncScheduler(Scheduler):
+    """Ready queue used by :meth:`Workflow.run_async`.
+
+    Released tasks run as :meth:`dagon.task.Task.run_async` coroutines on the
+    event loop instead of as threads.  It must be created inside that loop.
+    """
+
+    def __init__(self, workflow: "Workflow", tasks: Optional[Iterable[Any]] = None) -> None:
+        Scheduler.__init__(self, workflow, tasks)
+        self._loop = asyncio.get_event_loop()
+        self._done = asyncio.Queue()
+        self._coroutines: Set[Any] = set()
+
+    def task_done(self, task: Any) -> None:
+        """Report that *task* ended; safe to call from any thread."""
+        self._loop.call_soon_threadsafe(self._done.put_nowait, task)
+
+    def _start(self, task: Any) -> None:
+        # The graph may be refreshed from a blocking-pool thread
+        self._loop.call_soon_threadsafe(self._spawn, task)
+
+    def _spawn(self, task: Any) -> None:
+        coroutine = self._loop.create_task(task.run_async())
+        self._coroutines.add(coroutine)
+        coroutine.add_done_callback(self._coroutines.discard)
+
+    async def run_async(self) -> None:
+        """Start runnable tasks and wait until every released task ended."""
+        self._seed()
+        while not self._finished():
+            self._step(await self._done.get())
+
+
 class Workflow(object):
     """
     **Represents a workflow executed by DagOn**
@@ -114,9 +295,21 @@ class Workflow(object):
 
     :ivar is_api_available: True if the API is available
     :vartype is_api_available: str
+
+    :ivar context_cache: machine information probed per execution target
+    :vartype context_cache: :class:`dagon.context.ContextCache`
+
+    :ivar result_cache: outputs of earlier executions reused by identical tasks, None unless configured
+    :vartype result_cache: :class:`dagon.result_cache.ResultCache`
+
+    :ivar metrics: live engine metrics, served at ``/metrics`` by the workflow service
+    :vartype metrics: :class:`dagon.metrics.Metrics`
+
+    :ivar tracer: phase timings of the runs, None unless :meth:`enable_tracing` was called
+    :vartype tracer: :class:`dagon.tracing.Tracer`
     """
 
-    SCHEMA = "workflow://"
+    SCHEMA = references.SCHEMA
 
     def __init__(
             self,
@@ -138,6 +331,9 @@ class Workflow(object):
 
         :param config_file: Path to the configuration file of the workflow. By default, try to loads 'dagon.ini'
         :type config_file: str
+
+        :param max_threads: maximum number of tasks executing at the same time
+        :type max_threads: int
         """
 
         if config is not None:
@@ -145,8 +341,13 @@ class Workflow(object):
         else:
             self.cfg = read_config(config_file)
             fileConfig(config_file)
-        print(max_threads)
         self.sem = threading.Semaphore(max_threads)
+        self.scheduling_policy: SchedulingPolicy = FIFOPolicy()
+        self.executor = Executor(max_threads, self.cfg.get('executor', {}),
+                                 priority=lambda task: self.scheduling_policy.priority(task))
+        self.context_cache = ContextCache(self.cfg.get('context', {}).get('ttl', DEFAULT_TTL))
+        self.result_cache = ResultCache.from_config(self.cfg.get('result_cache'))
+        self.tracer = None
         # supress some logs
         logging.getLogger("paramiko").setLevel(logging.WARNING)
         logging.getLogger("globus_sdk").setLevel(logging.WARNING)
@@ -158,15 +359,22 @@ class Workflow(object):
         self.dag_tps = None
         self.dry = False
         self.tasks: List[Any] = []
-        self.checkpoints: Dict[str, Any] = {}
+        self._task_index: Dict[str, Any] = {}
+        self._checkpoints = journal.store_for(checkpoint_file, self.cfg.get('checkpoint', {}).get('backend'))
         self.workflow_id = 0
         self.is_api_available = False
         self.data_mover = DataMover.COPY
         self.stager_mover = StagerMover.NORMAL
         self.name = name
-        self._dependencies_made = False
+        # Tasks whose workflow:// references are not linked into the graph yet
+        self._unresolved: Dict[Any, None] = {}
+        # Topological order and depth levels of the validated graph
+        self._order: Optional[List[Any]] = None
+        self._levels: Dict[Any, int] = {}
         self._execution_thread: Optional[threading.Thread] = None
         self._execution_lock = threading.RLock()
+        self._scheduler: Optional[Scheduler] = None
+        self._blocking_pool: Optional[ThreadPoolExecutor] = None
         self._event_hooks = {
             name: EventHook(self, name) for name in (
                 "on_workflow_start", "on_workflow_end", "on_task_start",
@@ -178,6 +386,19 @@ class Workflow(object):
         }
         for event_name, hook in self._event_hooks.items():
             setattr(self, event_name, hook)
+        self.metrics = Metrics(self)
+        self._checkpoints.write_latency = self.metrics.checkpoint_writes
+        self.history = HistoryStore.from_config(self.cfg.get('history'))
+        self.speculation = None
+        if self.cfg.get('speculation'):
+            self.enable_speculation(**self.cfg['speculation'])
+        self.prefetch = None
+        if self.cfg.get('prefetch'):
+            self.enable_prefetch(**self.cfg['prefetch'])
+        self.add_listener("on_task_end", self._record_history)
+        tracing = self.cfg.get('tracing', {})
+        if tracing.get('chrome') or tracing.get('otlp'):
+            self.enable_tracing(tracing.get('chrome'), tracing.get('otlp'))
         if jsonload is not None:  # load from json file
             self.load_json(jsonload)
 
@@ -227,6 +448,39 @@ class Workflow(object):
     def set_stager_mover(self, stager_mover):
         self.stager_mover = stager_mover
 
+    def set_pool_limit(self, pool: str, limit: Optional[int]) -> None:
+        """
+        Limit the number of tasks of a backend sub-pool executing at the same time
+
+        :param pool: sub-pool name, such as ``local``, ``ssh``, ``slurm``, ``container`` or ``service``
+        :type pool: str
+
+        :param limit: maximum running tasks of the pool, or None to use only ``max_threads``
+        :type limit: int
+        """
+        self.executor.set_limit(pool, limit)
+
+    def set_scheduling_policy(self, policy: Any) -> None:
+        """
+        Set the order in which ready tasks take free execution slots
+
+        :param policy: ``fifo``, ``critical_path``, ``fan_out`` or a :class:`dagon.scheduling.SchedulingPolicy`
+        :type policy: str or :class:`dagon.scheduling.SchedulingPolicy`
+        """
+        self.scheduling_policy = get_policy(policy)
+
+    def get_scheduling_policy(self) -> SchedulingPolicy:
+        return self.scheduling_policy
+
+    def get_executor_stats(self) -> Dict[str, Any]:
+        """
+        Return the queue depth and utilisation counters of the task executor
+
+        :return: running and queued tasks, and utilisation, globally and per sub-pool
+        :rtype: dict(str, object)
+        """
+        return self.executor.stats()
+
     def get_scratch_dir_base(self) -> str:
         """
         Returns the path to the base scratch directory
@@ -287,14 +541,7 @@ class Workflow(object):
 
         # Check if the workflow is the current one
         if workflow_name == self.name:
-
-            # For each task in the tasks collection
-            for task in self.tasks:
-
-                # Check the task name
-                if task_name == task.name:
-                    # Return the result
-                    return task
+            return self._task_index.get(task_name)
 
         return None
 
@@ -311,8 +558,13 @@ class Workflow(object):
             task.set_stager_mover(self.stager_mover)
 
         self.tasks.append(task)
+        self.metrics.status_changed(None, task.status)
+        # The first task added with a name is the one found by that name
+        self._task_index.setdefault(task.name, task)
         task.set_workflow(self)
-        self._dependencies_made = False
+        task.get_references()
+        self._unresolved[task] = None
+        self._graph_changed()
         if self.is_api_available:
             self.api.add_task(self.workflow_id, task)
 
@@ -325,26 +577,86 @@ class Workflow(object):
         """
         self.dag_tps = DAG_tps
 
-    def make_dependencies(self) -> None:
+    @property
+    def _dependencies_made(self) -> bool:
+        return not self._unresolved
+
+    def _invalidate(self, task: Any) -> None:
+        """Resolve the references of *task* again on the next dependency update"""
+        if task.workflow is self:
+            self._unresolved[task] = None
+
+    def _graph_changed(self) -> None:
+        """Discard the cached topological order after the edges changed"""
+        self._order = None
+
+    def _unlink(self, task: Any) -> None:
+        """Undo the edges and reference counts derived from the references of *task*"""
+        for producer in task.derived_prevs:
+            if producer in task.prevs:
+                task.prevs.remove(producer)
+            if task in producer.nexts:
+                producer.nexts.remove(task)
+            if producer.workflow is not None:
+                producer.reference_count = producer.reference_count - 1
+        task.derived_prevs = []
+
+    def make_dependencies(self, rebuild: bool = False) -> None:
         """
         Looks for all the dependencies between tasks
+
+        Only the tasks added, or whose command changed, since the previous call
+        are resolved; see :meth:`update_dependencies`.
+
+        :param rebuild: discard all the edges and reference counts and resolve every task again
+        :type rebuild: bool
         """
+        if rebuild:
+            # Clean all dependencies
+            for task in self.tasks:
+                task.nexts = []
+                task.prevs = []
+                task.derived_prevs = []
+                task.reference_count = 0
+            self._unresolved = dict.fromkeys(self.tasks)
+            self._graph_changed()
+        self.update_dependencies()
+
+    def update_dependencies(self, tasks: Iterable[Any] = ()) -> List[Any]:
+        """
+        Resolve the references of the tasks added or changed since the last update
 
-        # Clean all dependencies
-        for task in self.tasks:
-            task.nexts = []
-            task.prevs = []
-            task.reference_count = 0
+        Edges, reference counts and, while the workflow runs, the producer
+        counters of the scheduler are updated in place; the rest of the graph
+        is not visited again.
 
-        # Automatically detect dependencies
-        for task in self.tasks:
-            # Invoke pre run
+        :param tasks: tasks whose ``prevs`` were edited directly, so their producers are counted again
+        :type tasks: list(:class:`dagon.task.Task`)
+
+        :return: the tasks whose references were resolved
+        :rtype: list(:class:`dagon.task.Task`)
+        """
+        resolved = list(self._unresolved)
+        for task in resolved:
+            self._unlink(task)
             task.set_semaphore(self.sem)
             task.set_dag_tps(self.dag_tps)
-            task.pre_run()
-        self.Validate_WF()
-        self._dependencies_made = True
+            linked = len(task.prevs)
+            try:
+                # Automatically detect dependencies
+                task.pre_run()
+            finally:
+                task.derived_prevs = task.prevs[linked:]
+            del self._unresolved[task]
+        changed = resolved + list(tasks)
+        if not changed:
+            return resolved
+        self._validate_changes(changed)
+        if self._scheduler is not None:
+            # Tasks were added while the workflow runs (parallel mode)
+            self._scheduler.refresh(changed)
         self._fire_event("on_dependencies_made", self)
+        return resolved
 
     def enable_fair(self, profile: Any) -> Any:
         """Enable optional FAIR-by-design recording for this workflow.
@@ -359,6 +671,127 @@ class Workflow(object):
         self.fair_recorder = recorder
         return recorder
 
+    def simulate(self, **options: Any) -> Any:
+        """
+        Predict the makespan, critical path and utilisation of a run without executing anything
+
+        :param options: estimates, history, default, max_threads, pools, policy and targets,
+            see :func:`dagon.simulation.simulate`
+        :type options: dict(str, object)
+
+        :return: the simulated run
+        :rtype: :class:`dagon.simulation.SimulationReport`
+        """
+        from dagon.simulation import simulate
+        return simulate(self, **options)
+
+    def eta(self, deadline: Optional[float] = None, **options: Any) -> Dict[str, Any]:
+        """
+        Estimate when the current run, and each of its remaining tasks, will end
+
+        The rest of the run is simulated from its current state: tasks that ended are
+        left out and running tasks last the rest of their estimate. Durations come from
+        ``options["estimates"]``, ``duration`` annotations, the run history store
+        (:attr:`history`), the workflow checkpoints and finally ``options["default"]``.
+        Before a run it estimates a whole run starting now.
+
+        :param deadline: epoch seconds by which the run should end
+        :type deadline: float
+
+        :param options: estimates, default, max_threads, pools and policy, see :func:`dagon.simulation.simulate`
+        :type options: dict(str, object)
+
+        :return: ``remaining`` seconds, predicted ``end`` epoch, predicted end epoch of each remaining task
+            (``tasks``), the ``critical_path`` and, with a *deadline*, ``on_time`` and its ``slack`` in seconds
+        :rtype: dict(str, object)
+        """
+        from dagon.simulation import simulate
+
+        now = time()
+        scheduler = self._scheduler
+        targets = None
+        if scheduler is not None and scheduler._selected is not None:
+            targets = list(scheduler._selected)
+        completed, running = [], {}
+        if scheduler is not None:
+            for task in list(self.tasks):
+                if task.status in (Status.FINISHED, Status.FAILED):
+                    completed.append(task)
+                elif task.status in (Status.WAITING, Status.RUNNING):
+                    running[task] = now - task.execution_start if task.execution_start is not None else 0.0
+        durations = options.pop("history", None)
+        durations = load_estimates(self.checkpoints if durations is None else durations)
+        if self.history is not None:
+            recorded = self.history.estimates(self.name, {task.name: command_hash(task) for task in self.tasks})
+            for task in self.tasks:
+                if task.name in recorded:
+                    durations[task.checkpoint_key()] = durations[task.name] = recorded[task.name]
+        report = simulate(self, history=durations, targets=targets, completed=completed, running=running,
+                          **options)
+        eta = {"remaining": report.makespan, "end": now + report.makespan,
+               "tasks": {name: now + task.end for name, task in report.tasks.items()},
+               "critical_path": report.critical_path}
+        if deadline is not None:
+            eta["slack"] = deadline - eta["end"]
+            eta["on_time"] = eta["slack"] >= 0
+        return eta
+
+    def enable_tracing(self, chrome: Optional[str] = None, otlp: Optional[str] = None) -> Any:
+        """
+        Record the time each task spends in each phase of its execution
+
+        :param chrome: Chrome ``trace_event`` file written when each run ends
+        :type chrome: str
+
+        :param otlp: OTLP/JSON trace file written when each run ends
+        :type otlp: str
+
+        :return: the tracer, which can also export the spans on demand
+        :rtype: :class:`dagon.tracing.Tracer`
+        """
+        from dagon.tracing import Tracer
+        if self.tracer is not None:
+            self.tracer.close()
+        self.tracer = Tracer(self, chrome=chrome, otlp=otlp)
+        return self.tracer
+
+    def enable_speculation(self, **options: Any) -> Any:
+        """
+        Launch a duplicate attempt of idempotent tasks that run much longer than expected
+
+        The first attempt that succeeds is kept, see :meth:`dagon.task.Task.set_idempotent`.
+
+        :param options: multiplier, quantile, min_runtime, interval and max_attempts,
+            see :class:`dagon.speculation.Speculator`
+        :type options: dict(str, object)
+
+        :return: the speculator, which watches the tasks while the workflow runs
+        :rtype: :class:`dagon.speculation.Speculator`
+        """
+        from dagon.speculation import Speculator
+        if self.speculation is not None:
+            self.speculation.close()
+        self.speculation = Speculator(self, **options)
+        return self.speculation
+
+    def enable_prefetch(self, **options: Any) -> Any:
+        """
+        Push the outputs of each producer to the hosts of its consumers as soon as it ends
+
+        Consumers on other hosts then stage in copies already on their host, see :mod:`dagon.prefetch`.
+
+        :param options: threads, see :class:`dagon.prefetch.Prefetcher`
+        :type options: dict(str, object)
+
+        :return: the prefetcher, which transfers outputs while the workflow runs
+        :rtype: :class:`dagon.prefetch.Prefetcher`
+        """
+        from dagon.prefetch import Prefetcher
+        if self.prefetch is not None:
+            self.prefetch.close()
+        self.prefetch = Prefetcher(self, **options)
+        return self.prefetch
+
     def add_listener(self, event_name: str, listener: Callable[[Any], None]) -> None:
         """Register *listener* for a named workflow event."""
         self._get_event_hook(event_name).add(listener)
@@ -379,6 +812,39 @@ class Workflow(object):
     def _prepare_run(self) -> None:
         if not self._dependencies_made:
             self.make_dependencies()
+        # Execution targets are probed once per run
+        self.context_cache.invalidate()
+
+    def _record_history(self, task: Any) -> None:
+        if self.history is not None and task.workflow is self:
+            try:
+                self.history.record_task(task)
+            except Exception:
+                self.logger.exception("Could not record %s in the run history", task.name)
+
+    def _remove_staging_cache(self) -> None:
+        # Consumers link the copies that HARDLINK materialised; the caches are not needed after the run
+        if self._scratch_dir is None:
+            return
+        cache = "/".join((self._scratch_dir, STAGING_CACHE, self.name))
+        shutil.rmtree(cache, ignore_errors=True)
+        # Remote consumers materialise them under the same path of their own host
+        hosts: Dict[Any, Any] = {}
+        for task in self.tasks:
+            if task.ssh_connection is not None and task.data_mover == DataMover.HARDLINK:
+                hosts.setdefault((getattr(task, "ssh_username", None), task.ip, getattr(task, "ssh_port", 22)), task)
+        for task in hosts.values():
+            try:
+                result = task.ssh_connection.execute_command(join_command(("rm", "-rf", cache)))
+            except Exception as exc:
+                result = {"code": 1, "message": str(exc)}
+            if result["code"]:
+                self.logger.warning("Could not remove the staging cache of %s: %s", task.ip, result["message"])
+
+    def _task_ended(self, task: Any) -> None:
+        scheduler = self._scheduler
+        if scheduler is not None:
+            scheduler.task_done(task)
 
     # Return a json representation of the workflow
     def as_json(self) -> Dict[str, Any]:
@@ -390,7 +856,8 @@ class Workflow(object):
         """
 
         jsonWorkflow = {"tasks": {}, "name": self.name, "id": self.workflow_id, "host": self.ftpAtt.get("host", "localhost")}
-        for task in self.tasks:
+        # Producers first once the graph was validated
+        for task in (self.tasks if self._order is None else self._order):
             jsonWorkflow['tasks'][task.name] = task.as_json()
         return jsonWorkflow
 
@@ -406,21 +873,10 @@ class Workflow(object):
         :raises ValueError: if a task has no command that CWL can execute
         """
         # Dependency discovery normally happens immediately before a run.  Do
-        # it here as well, while retaining any explicit edges already attached
-        # by callers (make_dependencies rebuilds the discovered graph).
+        # it here as well; explicit edges already attached by callers are kept.
         if not self._dependencies_made:
-            explicit_edges = [
-                (previous, task)
-                for task in self.tasks
-                for previous in task.prevs
-                if previous in self.tasks
-            ]
             self.make_dependencies()
-            for previous, task in explicit_edges:
-                if previous not in task.prevs:
-                    previous.nexts.append(task)
-                    task.prevs.append(previous)
-            self.Validate_WF()
+        order = self.topological_order()
 
         def cwl_identifier(value: str, used: set) -> str:
             identifier = re.sub(r"[^A-Za-z0-9_]", "_", value)
@@ -440,7 +896,7 @@ class Workflow(object):
             for task in self.tasks
         }
         steps = {}
-        for task in self.tasks:
+        for task in order:
             command = getattr(task, "command", None)
             if not isinstance(command, str) or not command:
                 raise ValueError(
@@ -538,7 +994,7 @@ class Workflow(object):
                 "run": tool,
             }
 
-        terminal_tasks = [task for task in self.tasks if not task.nexts]
+        terminal_tasks = [task for task in order if not task.nexts]
         outputs = {
             task_ids[task] + "_completed": {
                 "type": "boolean",
@@ -560,56 +1016,135 @@ class Workflow(object):
             json.dump(document, stream, indent=2, sort_keys=False)
             stream.write("\n")
 
-    def run(self, resume_checkpoint_file = None):
-        """Run the workflow in the current thread."""
-        with self._execution_lock:
-            self._prepare_run()
+    @property
+    def checkpoints(self) -> journal.CheckpointStore:
+        """Checkpoint records by ``<workflow>.<task>`` key; assigning a dict replaces them"""
+        return self._checkpoints
 
-        if resume_checkpoint_file is not None and os.path.isfile(resume_checkpoint_file) and os.stat(resume_checkpoint_file).st_size > 0:
-            fp = open(resume_checkpoint_file, "r")
-            self.checkpoints = json.loads(fp.read())
-            fp.close()
+    @checkpoints.setter
+    def checkpoints(self, records: Dict[str, Any]) -> None:
+        self._checkpoints.reset(records)
+
+    def _load_resume_checkpoint(self, resume_checkpoint_file: Optional[str], incremental: bool = False) -> None:
+        if incremental and resume_checkpoint_file is None:
+            resume_checkpoint_file = self.checkpoint_file
+        records = journal.load(resume_checkpoint_file, self.name) if resume_checkpoint_file is not None else {}
+        if records and incremental:
+            records = self._drop_dirty_records(records)
+        if records:
+            self.checkpoints = records
 
             self.logger.debug("Resuming workflow: %s", self.name)
 
             self._scratch_dir = self.checkpoints.get('_scratch_dir', None)
         else:
             self.logger.debug("Running workflow: %s", self.name)
+        if self.checkpoint_file is not None:
+            # Task state changes are journaled while the workflow runs
+            self.checkpoints.open(self.checkpoint_file, self.name)
+
+    def _drop_dirty_records(self, records: Dict[str, Any]) -> Dict[str, Any]:
+        dirty = incremental.dirty_tasks(self, records)
+        self.logger.info("%s: %d of %d tasks changed since the previous run: %s", self.name, len(dirty),
+                         len(self.tasks), ", ".join(task.name for task in dirty))
+        for task in dirty:
+            records.pop(task.checkpoint_key(), None)
+        return records
+
+    def _complete_run(self, start_time: float) -> None:
+        completed_in = (time() - start_time)
+        self.logger.info("Workflow '" + self.name + "' completed in %s seconds ---" % completed_in)
+
+        if self.checkpoint_file is not None:
+            self.checkpoints['_scratch_dir'] = self.get_scratch_dir_base()
+
+    def run(self, resume_checkpoint_file = None, incremental: bool = False,
+            targets: Optional[Iterable[Any]] = None):
+        """
+        Run the workflow in the current thread
+
+        :param resume_checkpoint_file: checkpoint file of a previous run to resume
+        :type resume_checkpoint_file: str
+
+        :param incremental: execute again only the tasks whose command or inputs changed since the
+            previous run, and their consumers; by default the previous run is read from ``checkpoint_file``
+        :type incremental: bool
+
+        :param targets: run only these tasks and their transitive producers, see :meth:`select_tasks`
+        :type targets: list
+        """
+        with self._execution_lock:
+            self._prepare_run()
+            selected = self._select_run_tasks(targets)
+        self._load_resume_checkpoint(resume_checkpoint_file, incremental)
 
         start_time = time()
         self._fire_event("on_workflow_start", self)
+        self._scheduler = Scheduler(self, selected)
         try:
-            for task in self.tasks:
-                try:
-                    task.start()
-                except RuntimeError:
-                    self.logger.debug("Task %s was already started", task.name)
+            self._scheduler.run()
+            self._complete_run(start_time)
+        finally:
+            self._scheduler = None
+            self.checkpoints.close()
+            self._remove_staging_cache()
+            self._fire_event("on_workflow_end", self)
 
-            for task in self.tasks:
-                try:
-                    task.join()
-                except RuntimeError:
-                    self.logger.debug("Task %s could not be joined before start", task.name)
-
-            completed_in = (time() - start_time)
-            self.logger.info("Workflow '" + self.name + "' completed in %s seconds ---" % completed_in)
-
-            if self.checkpoint_file is not None:
-                self.checkpoints['_scratch_dir'] = self.get_scratch_dir_base()
-                with open(self.checkpoint_file, 'w') as fp:
-                    fp.write(json.dumps(self.checkpoints, sort_keys=True, indent=4))
+    async def run_async(self, resume_checkpoint_file: Optional[str] = None,
+                        blocking_threads: Optional[int] = None, incremental: bool = False,
+                        targets: Optional[Iterable[Any]] = None) -> None:
+        """
+        Run the workflow as coroutines on the running asyncio event loop
+
+        Tasks await their backend through :meth:`dagon.task.Task.execute_async`; blocking
+        steps of the tasks run in a thread pool of ``blocking_threads`` threads. ``max_threads``
+        still bounds the number of tasks executing at the same time.
+
+        :param resume_checkpoint_file: checkpoint file of a previous run to resume
+        :type resume_checkpoint_file: str
+
+        :param blocking_threads: size of the blocking pool, by default ``max_threads``
+        :type blocking_threads: int
+
+        :param incremental: execute again only the tasks whose command or inputs changed, see :meth:`run`
+        :type incremental: bool
+
+        :param targets: run only these tasks and their transitive producers, see :meth:`select_tasks`
+        :type targets: list
+        """
+        with self._execution_lock:
+            self._prepare_run()
+            selected = self._select_run_tasks(targets)
+        self._load_resume_checkpoint(resume_checkpoint_file, incremental)
+
+        start_time = time()
+        self._fire_event("on_workflow_start", self)
+        self._blocking_pool = ThreadPoolExecutor(max_workers=blocking_threads or self.executor.max_workers,
+                                                 thread_name_prefix="DAGonStar-%s" % self.name)
+        self._scheduler = AsyncScheduler(self, selected)
+        try:
+            await self._scheduler.run_async()
+            self._complete_run(start_time)
         finally:
+            self._scheduler = None
+            self.checkpoints.close()
+            self._remove_staging_cache()
+            self._blocking_pool.shutdown(wait=False)
+            self._blocking_pool = None
             self._fire_event("on_workflow_end", self)
 
-    def launch(self, resume_checkpoint_file=None) -> threading.Thread:
-        """Start the workflow in a background thread and return that thread."""
+    def launch(self, resume_checkpoint_file=None, incremental: bool = False,
+               targets: Optional[Iterable[Any]] = None) -> threading.Thread:
+        """Start the workflow in a background thread and return that thread; arguments as in :meth:`run`."""
         with self._execution_lock:
             if self._execution_thread is not None and self._execution_thread.is_alive():
                 raise RuntimeError("Workflow %s is already running" % self.name)
             self._prepare_run()
+            # Unknown targets are reported to the caller, not in the background thread
+            targets = None if targets is None else self.select_tasks(targets)
             self._execution_thread = threading.Thread(
                 target=self.run,
-                args=(resume_checkpoint_file,),
+                args=(resume_checkpoint_file, incremental, targets),
                 name="DAGonStar-Workflow-%s" % self.name,
             )
             self._execution_thread.start()
@@ -669,34 +1204,103 @@ class Workflow(object):
             self.add_task(tk)
         # self.make_dependencies()
 
-    def Validate_WF(self):
+    def Validate_WF(self) -> None:
         """
         Validate the workflow to avoid any kind of cycle in the graph.
 
-        Raise an Exception if a cycle is found.
+        The graph is sorted topologically without recursion; the order and the
+        depth level of each task are kept until the graph changes.
+
+        Raise a :class:`WorkflowCycleError` naming every task on a cycle if one is found.
+        """
+        order, levels, blocked = topological_sort(self.tasks)
+        if blocked:
+            # Tasks left out are on a cycle or downstream of one
+            raise WorkflowCycleError(cycle_members(blocked))
+        self._order = order
+        self._levels = levels
+
+    def _validate_changes(self, tasks: List[Any]) -> None:
         """
-        def visit(task, visited, stack):
-            if task in stack:  # If the task is already in the exploration stack, we've found a cycle
-                raise Exception(f"A cycle has been found involving task {task.name}")
-            
-            if task in visited:
-                return  # Task already visited, no cycle detected
-            
-            # Mark the task as visited and explore the successors
-            visited.add(task)
-            stack.append(task)  # Add the task to the exploration stack
+        Reject a cycle closed by the new edges into *tasks*
 
-            for next_task in task.nexts:  # Explore the next tasks
-                visit(next_task, visited, stack)
-            
-            stack.pop()  # Remove the task from the stack after exploration
+        Such a cycle runs through one of *tasks*, so only the tasks reachable from
+        them are searched; the cached order is recomputed when it is next needed.
+        """
+        downstream = reachable(tasks, lambda task: [consumer for consumer in task.nexts
+                                                    if consumer.workflow is self])
+        if len(downstream) >= len(self.tasks):
+            self.Validate_WF()
+            return
+        self._graph_changed()
+        cycle = cycle_members(downstream)
+        if cycle:
+            raise WorkflowCycleError(sorted(cycle, key=self.tasks.index))
 
-        visited = set()  # Set of already visited tasks
-        stack = []   # Stack for detecting cycles
+    def topological_order(self) -> List[Any]:
+        """
+        Return the tasks sorted so every producer comes before its consumers
 
-        for task in self.tasks:
-            if task not in visited:
-                visit(task, visited, stack)
+        :return: tasks of the workflow, validated with :meth:`Validate_WF` if the graph changed
+        :rtype: list(:class:`dagon.task.Task`)
+        """
+        if self._order is None:
+            self.Validate_WF()
+        return self._order
+
+    def select_tasks(self, targets: Iterable[Any]) -> List[Any]:
+        """
+        Return the tasks needed to produce *targets*: the targets and their transitive producers
+
+        :param targets: tasks of this workflow, task names or ``workflow://`` artifacts of this workflow
+        :type targets: list
+
+        :raises ValueError: a target is not a task of this workflow
+
+        :return: selected tasks in topological order
+        :rtype: list(:class:`dagon.task.Task`)
+        """
+        if isinstance(targets, str):
+            targets = [targets]
+        pending = []
+        for target in targets:
+            task = target
+            if isinstance(target, str):
+                reference = references.parse_reference(target) if target.startswith(self.SCHEMA) else None
+                if reference is None:
+                    task = self._task_index.get(target)
+                elif reference.workflow_name(self.name) == self.name:
+                    task = self._task_index.get(reference.task)
+                else:
+                    task = None
+            if task is None or getattr(task, "workflow", None) is not self:
+                raise ValueError("Target %s is not a task of workflow %s" % (target, self.name))
+            pending.append(task)
+        selected = set()
+        while pending:
+            task = pending.pop()
+            if task not in selected:
+                selected.add(task)
+                pending.extend(prev for prev in task.prevs if prev.workflow is self)
+        return [task for task in self.topological_order() if task in selected]
+
+    def _select_run_tasks(self, targets: Optional[Iterable[Any]]) -> Optional[List[Any]]:
+        if targets is None:
+            return None
+        selected = self.select_tasks(targets)
+        self.logger.info("%s: running %d of %d tasks for the requested targets", self.name, len(selected),
+                         len(self.tasks))
+        return selected
+
+    def get_levels(self) -> Dict[Any, int]:
+        """
+        Return the depth level of each task
+
+        :return: 0 for tasks without producers in the workflow, otherwise one more than the deepest producer
+        :rtype: dict(:class:`dagon.task.Task`, int)
+        """
+        self.topological_order()
+        return self._levels
 
     def get_task_times(self):
         """
@@ -1,9 +1,11 @@
-from flask import Flask, request
+from flask import Flask, Response, request
 from flask import jsonify
 from threading import Thread
 from flask_api import status
 from werkzeug.serving import make_server
 
+from dagon.metrics import CONTENT_TYPE
+
 
 class WorkflowServer(Thread):
 
@@ -35,6 +37,10 @@ class WorkflowServer(Thread):
                 task.set_info(data)
             return jsonify(data)
 
+        @app.route('/metrics')
+        def metrics():
+            return Response(self.workflow.metrics.render(), content_type=CONTENT_TYPE)
+
         @app.route('/check')
         def check():
             return jsonify({"status": "ok"})
@@ -17,6 +17,8 @@ class ApptainerTask(Batch):
     Inherits from Batch to integrate with Dagon's task workflow.
     """
 
+    pool = "container"
+
     def __new__(cls, *args, **kwargs):
         """
         Factory method to create RemoteApptainerTask if 'ip' is provided.
@@ -363,6 +365,8 @@ class RemoteApptainerTask(RemoteTask, ApptainerTask):
     Apptainer container execution on remote HPC systems.
     """
 
+    pool = "container"
+
     def __init__(self, name, command, image="docker://ubuntu:20.04", 
                  ip=None, ssh_username=None, keypath=None, ssh_port=22,
                  working_dir=None, remove=False, transversal_workflow=None,
@@ -726,7 +730,7 @@ class RemoteApptainerTask(RemoteTask, ApptainerTask):
         cmd_str = f"({cmd_str}) 2>&1 | grep -v 'squashfuse' | grep -v 'fuse2fs' | grep -v 'gocryptfs' | grep -v 'Converting SIF' | grep -v 'Cleaning up image'"
         
         print(f"[{self.name}] Executing apptainer command")
-        result = self.ssh_connection.execute_command(cmd_str)
+        result = self.ssh_connection.execute_command(cmd_str, self.open_output(script_name))
         
         # Debug: see what files were created
         check_cmd = f"find {self.working_dir} -type f -newer {self.staging_dir} 2>/dev/null | head -20"
@@ -1,11 +1,20 @@
+import asyncio
+import re
 import shlex
-from typing import Any, List, Optional, Union
+from datetime import datetime
+from asyncio.subprocess import PIPE as ASYNC_PIPE
+from typing import Any, List, Optional, Tuple, Union
 
+from dagon import output
+from dagon.output import OutputCapture
 from dagon.task import ExecutionResult, Task
 from dagon.remote import RemoteTask
 from subprocess import Popen, PIPE, STDOUT
 from dagon.shell import join_command, quote
 
+# Job identifier printed by sbatch
+_JOB_ID = re.compile(r"Submitted batch job (\d+)")
+
 
 class Batch(Task):
     """
@@ -58,15 +67,19 @@ class Batch(Task):
             return super().__new__(cls)
 
     @staticmethod
-    def execute_command(command: str) -> ExecutionResult:
+    def execute_command(command: str, capture: Optional[OutputCapture] = None) -> ExecutionResult:
         """
         Executes a local command
 
         :param command: command to be executed
         :type command: str
+        :param capture: receives the output as it arrives; the result then holds only its tails
+        :type capture: :class:`dagon.output.OutputCapture`
         :return: execution result
         :rtype: dict() with the execution output (str), code (int) and error (str)
         """
+        if capture is not None:
+            return output.run(shlex.split(command), capture)
         # Execute the bash command
         # with settings(
         #         hide('warnings', 'running', 'stdout', 'stderr'),
@@ -90,6 +103,32 @@ class Batch(Task):
             message = out
         return {"code": code, "message": message, "output": out}
 
+    @staticmethod
+    async def execute_command_async(command: str, capture: Optional[OutputCapture] = None) -> ExecutionResult:
+        """
+        Executes a local command without blocking the event loop
+
+        :param command: command to be executed
+        :type command: str
+        :param capture: receives the output as it arrives; the result then holds only its tails
+        :type capture: :class:`dagon.output.OutputCapture`
+        :return: execution result
+        :rtype: dict() with the execution output (str), code (int) and error (str)
+        """
+        if capture is not None:
+            return await output.run_async(shlex.split(command), capture)
+        p = await asyncio.create_subprocess_exec(*shlex.split(command), stdin=ASYNC_PIPE, stdout=ASYNC_PIPE,
+                                                 stderr=ASYNC_PIPE, close_fds=True)
+
+        out, err = await p.communicate()
+        out, err = out.decode(errors="replace"), err.decode(errors="replace")
+
+        code, message = p.returncode, ""
+        if err:
+            message = err
+        elif code:
+            message = out
+        return {"code": code, "message": message, "output": out}
 
     def on_execute(self, script: str, script_name: str) -> ExecutionResult:
         """
@@ -104,7 +143,30 @@ class Batch(Task):
         """
         # Invoke the base method
         super(Batch, self).on_execute(script, script_name)
-        return Batch.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)))
+        return Batch.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)),
+                                     self.open_output(script_name))
+
+    async def on_execute_async(self, script: str, script_name: str) -> ExecutionResult:
+        """
+        Invoke the script specified without blocking the event loop
+
+        :param script: content script
+        :type script: str
+        :param script_name: script name
+        :type script_name: str
+        :return: execution result
+        :rtype: dict() with the execution output (str) and code (int)
+        """
+        if type(self).on_execute is not Batch.on_execute:
+            # Subclasses that run the launcher elsewhere keep their blocking on_execute
+            return await super(Batch, self).on_execute_async(script, script_name)
+        super(Batch, self).on_execute(script, script_name)
+        return await Batch.execute_command_async(join_command(("bash", self.working_dir + "/.dagon/" + script_name)),
+                                                 self.open_output(script_name))
+
+    def context_key(self) -> Tuple[Any, ...]:
+        """Tasks of the local machine share one context probe"""
+        return ("local",)
 
     # returns public key
     def get_public_key(self) -> str:
@@ -114,7 +176,7 @@ class Batch(Task):
         :return: public key
         :rtype: str with the public key
         """
-        command = join_command(("cat", self.working_dir + "/.dagon/ssh_key.pub"))
+        command = self.public_key_command()
         result = Batch.execute_command(command)
         return result['output']
 
@@ -186,7 +248,8 @@ class RemoteBatch(RemoteTask, Batch):
         """
         # Invoke the base method
         RemoteTask.on_execute(self, launcher_script, script_name)
-        result = self.ssh_connection.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)))
+        result = self.ssh_connection.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)),
+                                                     self.open_output(script_name))
         return result
 
 
@@ -217,6 +280,8 @@ class Slurm(Batch):
 
     """
 
+    pool = "slurm"
+
     def __init__(
             self,
             name: str,
@@ -294,6 +359,10 @@ class Slurm(Batch):
         else:
             return super().__new__(cls)
 
+    def context_key(self) -> Tuple[Any, ...]:
+        """Tasks of the same partition share one context probe"""
+        return ("slurm", self.partition)
+
     def generate_command(self, script_name: str) -> str:
 
         """
@@ -348,7 +417,79 @@ class Slurm(Batch):
         command = self.generate_command(script_name)
 
         # Execute the bash command
-        result = Batch.execute_command(command)
+        result = Batch.execute_command(command, self.open_output(script_name))
+        self.trace_queue(result)
+        return result
+
+    def cancel(self) -> bool:
+        """
+        Cancel the Slurm job of the running task with ``scancel`` and stop ``sbatch -W``
+
+        :return: False when the launcher is not running
+        :rtype: bool
+        """
+        capture = self._runtime.output if self._runtime is not None else None
+        match = _JOB_ID.search(capture.tail("stdout")) if capture is not None else None
+        if match is not None:
+            self.query_command(join_command(("scancel", match.group(1))))
+        return super(Slurm, self).cancel()
+
+    def query_command(self, command: str) -> ExecutionResult:
+        """
+        Execute a Slurm command (``sacct``, ``scancel``) where ``sbatch`` runs
+
+        :param command: command to be executed
+        :type command: str
+
+        :return: execution result
+        :rtype: dict() with the execution output (str) and code (int)
+        """
+        return Batch.execute_command(command)
+
+    def trace_queue(self, result: ExecutionResult) -> None:
+        """
+        Record the time the job waited in the Slurm queue when the workflow is traced
+
+        :param result: result of ``sbatch -W``, whose output names the job
+        :type result: dict() with the execution output (str) and code (int)
+        """
+        if getattr(self.workflow, "tracer", None) is None:
+            return
+        match = _JOB_ID.search(result.get("output") or "")
+        if match is None:
+            return
+        times = self.query_command(join_command(("sacct", "-j", match.group(1), "-X", "-n", "-P",
+                                                 "-o", "Submit,Start")))
+        try:
+            submit, start = (datetime.strptime(value, "%Y-%m-%dT%H:%M:%S").timestamp()
+                             for value in times["output"].strip().splitlines()[0].split("|"))
+        except (IndexError, KeyError, ValueError):
+            return
+        self.workflow.tracer.add(self, "slurm.queue", submit, start, job=match.group(1))
+
+    async def on_execute_async(self, script: str, script_name: str) -> ExecutionResult:
+        """
+        Submit a script using slurm and await ``sbatch -W`` without holding a thread
+
+        :param script: script content
+        :type script: str
+
+        :param script_name: script name
+        :type script_name: str
+
+        :return: execution result
+        :rtype: dict() with the execution output (str) and code (int)
+        """
+        if type(self).on_execute is not Slurm.on_execute:
+            return await Task.on_execute_async(self, script, script_name)
+
+        super(Batch, self).on_execute(script, script_name)
+
+        if script_name == "context.sh":
+            return await Batch.execute_command_async(join_command((self.working_dir + "/.dagon/" + script_name,)))
+
+        result = await Batch.execute_command_async(self.generate_command(script_name), self.open_output(script_name))
+        await self.run_blocking(self.trace_queue, result)
         return result
 
 
@@ -357,6 +498,8 @@ class RemoteSlurm(RemoteTask, Slurm):
     ** Represent a task that runs on a remote slurm deployment **
     """
 
+    pool = "slurm"
+
     def __init__(
             self,
             name: str,
@@ -411,6 +554,10 @@ class RemoteSlurm(RemoteTask, Slurm):
             globusendpoint=globusendpoint,
         )
 
+    def context_key(self) -> Tuple[Any, ...]:
+        """Tasks of the same partition of the same remote machine share one context probe"""
+        return RemoteTask.context_key(self) + Slurm.context_key(self)
+
     def on_execute(self, script: str, script_name: str) -> ExecutionResult:
         """
         Execute a script using slurm
@@ -432,5 +579,18 @@ class RemoteSlurm(RemoteTask, Slurm):
 
         command = self.generate_command(script_name)
         # Execute the bash command
-        result = self.ssh_connection.execute_command(command)
+        result = self.ssh_connection.execute_command(command, self.open_output(script_name))
+        self.trace_queue(result)
         return result
+
+    def query_command(self, command: str) -> ExecutionResult:
+        """
+        Execute a Slurm command (``sacct``, ``scancel``) on the remote machine
+
+        :param command: command to be executed
+        :type command: str
+
+        :return: execution result
+        :rtype: dict() with the execution output (str) and code (int)
+        """
+        return self.ssh_connection.execute_command(command)
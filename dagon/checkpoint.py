@@ -1,10 +1,11 @@
-from typing import Any, Optional
+from typing import Any, Optional, Tuple
 
+from dagon import output
+from dagon.output import OutputCapture
 from dagon.task import ExecutionResult, Task
 from dagon.remote import  RemoteTask
 from subprocess import Popen, PIPE, STDOUT
 import shutil
-import json
 import shlex
 from dagon.shell import join_command, quote
 
@@ -71,15 +72,19 @@ class Checkpoint(Task):
             return super().__new__(cls)
 
     @staticmethod
-    def execute_command(command: str) -> ExecutionResult:
+    def execute_command(command: str, capture: Optional[OutputCapture] = None) -> ExecutionResult:
         """
         Executes a local command
 
         :param command: command to be executed
         :type command: str
+        :param capture: receives the output as it arrives; the result then holds only its tails
+        :type capture: :class:`dagon.output.OutputCapture`
         :return: execution result
         :rtype: dict() with the execution output (str), code (int) and error (str)
         """
+        if capture is not None:
+            return output.run(shlex.split(command), capture)
 
         # Implement here the code for the checkpoint saving
         # ...
@@ -140,7 +145,12 @@ chmod +x checkpoint.sh
 
         # Invoke the base method
         super(Checkpoint, self).on_execute(script, script_name)
-        return Checkpoint.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)))
+        return Checkpoint.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)),
+                                          self.open_output(script_name))
+
+    def context_key(self) -> Tuple[Any, ...]:
+        """Tasks of the local machine share one context probe"""
+        return ("local",)
 
     # returns public key
     def get_public_key(self) -> str:
@@ -150,7 +160,7 @@ chmod +x checkpoint.sh
         :return: public key
         :rtype: str with the public key
         """
-        command = join_command(("cat", self.working_dir + "/.dagon/ssh_key.pub"))
+        command = self.public_key_command()
         result = Checkpoint.execute_command(command)
         return result['output']
 
@@ -182,11 +192,8 @@ chmod +x checkpoint.sh
         self.working_dir = self.working_dir + "-checkpoint"
 
         # Update the checkpoint
-        self.workflow.checkpoints[self.workflow.name + "." + self.getName()]["working_dir"] = self.working_dir
-
-        fp = open(self.name+".json", 'w')
-        fp.write(json.dumps(self.workflow.checkpoints, sort_keys=True, indent=4))
-        fp.close()
+        self.workflow.checkpoints.record(self.checkpoint_key(), working_dir=self.working_dir)
+        self.workflow.checkpoints.dump(self.name + ".json")
         
 
 class RemoteCheckpoint(RemoteTask, Checkpoint):
@@ -248,11 +255,8 @@ class RemoteCheckpoint(RemoteTask, Checkpoint):
         self.working_dir = self.working_dir + "-checkpoint"
 
         # Update the checkpoint
-        self.workflow.checkpoints[self.workflow.name + "." + self.getName()]["working_dir"] = self.working_dir
-
-        fp = open(self.name+".json", 'w')
-        fp.write(json.dumps(self.workflow.checkpoints, sort_keys=True, indent=4))
-        fp.close()
+        self.workflow.checkpoints.record(self.checkpoint_key(), working_dir=self.working_dir)
+        self.workflow.checkpoints.dump(self.name + ".json")
         
     def on_execute(self, launcher_script: str, script_name: str) -> ExecutionResult:
         """
@@ -293,5 +297,6 @@ chmod +x checkpoint.sh
         
         # Invoke the base method
         RemoteTask.on_execute(self, launcher_script, script_name)
-        result = self.ssh_connection.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)))
+        result = self.ssh_connection.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)),
+                                                     self.open_output(script_name))
         return result
@@ -0,0 +1,290 @@
+"""SQLite backend of workflow checkpoints.
+
+Keeps the records of :class:`dagon.journal.CheckpointStore` in a SQLite
+database in WAL mode, so the state of a run can be queried while it is in
+flight and several controller processes can share one file::
+
+    python -m dagon.checkpoint_db status run.sqlite --workflow Experiment
+    python -m dagon.checkpoint_db migrate checkpoint.json run.sqlite
+
+Rows are keyed by workflow and checkpoint key and indexed by workflow and
+task.  A writer thread commits the changes queued by all task threads in one
+transaction; a record changed several times between two commits is written
+once.  Resuming a SQLite-backed workflow from a JSON checkpoint file
+(``run(resume_checkpoint_file="checkpoint.json")``) also migrates it.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from dagon import journal
+
+# Seconds a writer waits for another controller holding the database
+BUSY_TIMEOUT = 30.0
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS checkpoints (
+        workflow TEXT NOT NULL,
+        key TEXT NOT NULL,
+        task TEXT,
+        working_dir TEXT,
+        code INTEGER,
+        record TEXT NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (workflow, key))""",
+    "CREATE INDEX IF NOT EXISTS checkpoints_task ON checkpoints (workflow, task)",
+)
+
+_UPSERT = ("INSERT OR REPLACE INTO checkpoints (workflow, key, task, working_dir, code, record, updated) "
+           "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open *path* in WAL mode, creating the schema if needed."""
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for statement in _SCHEMA:
+        connection.execute(statement)
+    return connection
+
+
+def _row(workflow: str, key: str, record: Any) -> Tuple[Any, ...]:
+    task = key[len(workflow) + 1:] if key.startswith(workflow + ".") else None
+    fields = record if isinstance(record, Mapping) else {}
+    code = fields.get("code")
+    return (workflow, key, task, fields.get("working_dir"), code if isinstance(code, int) else None,
+            json.dumps(record, sort_keys=True), time.time())
+
+
+def _write(connection: sqlite3.Connection, workflow: str, upserts: Sequence[Tuple[Any, ...]],
+           deletes: Sequence[str], replace: bool = False) -> None:
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        if replace:
+            connection.execute("DELETE FROM checkpoints WHERE workflow = ?", (workflow,))
+        connection.executemany("DELETE FROM checkpoints WHERE workflow = ? AND key = ?",
+                               [(workflow, key) for key in deletes])
+        connection.executemany(_UPSERT, upserts)
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def load(path: str, workflow: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read the checkpoint records of a SQLite checkpoint
+
+    :param path: database file
+    :type path: str
+
+    :param workflow: read only the records of this workflow
+    :type workflow: str
+
+    :return: records by checkpoint key, empty when the file does not exist
+    :rtype: dict(str, object)
+    """
+    # Reading must not create the database
+    if not os.path.exists(path):
+        return {}
+    connection = connect(path)
+    try:
+        if workflow is None:
+            rows = connection.execute("SELECT key, record FROM checkpoints ORDER BY workflow, key")
+        else:
+            rows = connection.execute("SELECT key, record FROM checkpoints WHERE workflow = ? ORDER BY key",
+                                      (workflow,))
+        return {key: json.loads(record) for key, record in rows}
+    finally:
+        connection.close()
+
+
+def status(path: str, workflow: Optional[str] = None, task: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Return the task rows of a SQLite checkpoint, readable while the workflow runs
+
+    :param path: database file
+    :type path: str
+
+    :param workflow: only this workflow
+    :type workflow: str
+
+    :param task: only this task
+    :type task: str
+
+    :return: workflow, task, working_dir, code and updated (epoch seconds) of each task, none when the file
+        does not exist
+    :rtype: list(dict(str, object))
+    """
+    # Reading must not create the database
+    if not os.path.exists(path):
+        return []
+    query = "SELECT workflow, task, working_dir, code, updated FROM checkpoints WHERE task IS NOT NULL"
+    arguments: List[Any] = []
+    if workflow is not None:
+        query += " AND workflow = ?"
+        arguments.append(workflow)
+    if task is not None:
+        query += " AND task = ?"
+        arguments.append(task)
+    connection = connect(path)
+    try:
+        rows = connection.execute(query + " ORDER BY workflow, task", arguments).fetchall()
+    finally:
+        connection.close()
+    return [dict(zip(("workflow", "task", "working_dir", "code", "updated"), row)) for row in rows]
+
+
+def migrate(source: str, destination: str, workflow: Optional[str] = None) -> int:
+    """
+    Copy a JSON checkpoint file (and its journal) into a SQLite checkpoint
+
+    :param source: JSON checkpoint file
+    :type source: str
+
+    :param destination: database file
+    :type destination: str
+
+    :param workflow: owner of the records, by default the ``workflow`` field of the task records
+    :type workflow: str
+
+    :return: number of records copied
+    :rtype: int
+    """
+    records = journal.load(source)
+    if workflow is None:
+        names = {record.get("workflow") for record in records.values() if isinstance(record, Mapping)}
+        names.discard(None)
+        if len(names) != 1:
+            raise ValueError("Cannot infer the workflow of %s; pass it explicitly" % source)
+        workflow = names.pop()
+    connection = connect(destination)
+    try:
+        _write(connection, workflow, [_row(workflow, key, record) for key, record in records.items()], ())
+    finally:
+        connection.close()
+    return len(records)
+
+
+class SQLiteCheckpointStore(journal.CheckpointStore):
+    """
+    **Checkpoint records of a workflow kept in SQLite**
+
+    Behaves as :class:`dagon.journal.CheckpointStore`; changes are committed
+    to the database by a writer thread instead of journaled to a file.
+    Opening the store replaces the rows of its workflow with its records.
+    """
+
+    def __init__(self, records: Optional[Mapping[str, Any]] = None) -> None:
+        journal.CheckpointStore.__init__(self, records)
+        self.workflow: Optional[str] = None
+        self._touched: Dict[str, None] = {}
+        self._replace = False
+
+    def _append(self, entry: Mapping[str, Any]) -> None:
+        if self.path is None:
+            return
+        self._touched[entry["key"]] = None
+        self._queued += 1
+        self._changed.notify_all()
+
+    def _request_compaction(self) -> None:
+        if self.path is None:
+            return
+        self._replace = True
+        self._queued += 1
+        self._changed.notify_all()
+
+    def open(self, path: str, workflow: Optional[str] = None) -> None:
+        """
+        Write the records to the database *path* and commit every later change
+
+        :param path: database file
+        :type path: str
+
+        :param workflow: name of the workflow owning the records
+        :type workflow: str
+        """
+        if workflow is None:
+            raise ValueError("A SQLite checkpoint is shared by workflows; the owning workflow is required")
+        self.close()
+        with self._lock:
+            self.path = path
+            self.workflow = workflow
+            self._closing = False
+            self._touched = {}
+            self._replace = True
+            self._queued += 1
+            self._writer = threading.Thread(target=self._write_loop, name="DAGonStar-checkpoint-db", daemon=True)
+            self._writer.start()
+        self.flush()
+
+    def close(self) -> None:
+        """Commit the pending changes and stop writing to the database."""
+        with self._lock:
+            writer = self._writer
+            if writer is None:
+                return
+            self._closing = True
+            self._changed.notify_all()
+        writer.join()
+        with self._lock:
+            self._writer = None
+            self.path = None
+
+    def _write_loop(self) -> None:
+        connection = connect(self.path)
+        try:
+            while True:
+                with self._lock:
+                    while not self._touched and not self._replace and not self._closing:
+                        self._changed.wait()
+                    if not self._touched and not self._replace:
+                        return
+                    replace, self._replace = self._replace, False
+                    keys = list(self) if replace else list(self._touched)
+                    self._touched = {}
+                    upserts = [_row(self.workflow, key, dict.get(self, key)) for key in keys if key in self]
+                    deletes = [key for key in keys if key not in self]
+                    queued = self._queued
+                start_time = time.monotonic()
+                _write(connection, self.workflow, upserts, deletes, replace)
+                if self.write_latency is not None:
+                    self.write_latency.observe(time.monotonic() - start_time)
+                with self._lock:
+                    self._written = queued
+                    self._changed.notify_all()
+        finally:
+            connection.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect or create SQLite workflow checkpoints")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("status", help="print the task rows as JSON lines")
+    show.add_argument("database")
+    show.add_argument("--workflow")
+    show.add_argument("--task")
+    copy = commands.add_parser("migrate", help="copy a JSON checkpoint file into a database")
+    copy.add_argument("source")
+    copy.add_argument("database")
+    copy.add_argument("--workflow")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        for row in status(args.database, args.workflow, args.task):
+            print(json.dumps(row, sort_keys=True))
+    else:
+        print("%d records copied" % migrate(args.source, args.database, args.workflow))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 import logging
 import secrets
+import select
+import weakref
 
 import paramiko
 from paramiko import SSHClient
@@ -7,6 +9,22 @@ from paramiko import SSHClient
 from dagon.communication import is_port_open
 from dagon.shell import join_command, quote
 
+# Bytes received from a channel at a time
+_CHUNK = 64 * 1024
+
+# Managers created by this process, counted by open_connections()
+_managers = weakref.WeakSet()
+
+
+def open_connections():
+    """Return the number of SSH connections of this process whose transport is active."""
+    count = 0
+    for manager in list(_managers):
+        transport = manager.connection.get_transport()
+        if transport is not None and transport.is_active():
+            count += 1
+    return count
+
 
 def _heredoc_delimiter(content):
     """Return a delimiter that cannot terminate the generated heredoc."""
@@ -62,6 +80,7 @@ class SSHManager:
         self.port = port
         self.connection = self.get_ssh_connection()
         self.logger = logging.getLogger()
+        _managers.add(self)
 
     def get_connection(self):
         """
@@ -122,20 +141,48 @@ class SSHManager:
             ssh.connect(self.host, port=self.port, username=self.username, key_filename=self.keypath)
         return ssh
 
-    def execute_command(self, command):
+    def execute_command(self, command, capture=None):
         """
         execute command in remothe machine over SSH
 
         :param command: command to execute on the remote machine
         :type command: str
 
+        :param capture: receives the output as it arrives instead of reading it all at the end
+        :type capture: :class:`dagon.output.OutputCapture`
+
         :return: execution results
         :rtype: dict(str, object)
         """
         _, stdout, stderr = self.connection.exec_command(command)
+        if capture is not None:
+            return self._stream(stdout.channel, capture)
         code = stdout.channel.recv_exit_status()
         stdout = "\n".join(stdout.readlines())
         stderr = "\n".join(stderr.readlines())
 
         message = stderr if stderr else (stdout if code else "")
         return {"code": code, "message": message, "output": stdout, "error": stderr}
+
+    @staticmethod
+    def _stream(channel, capture):
+        channel.settimeout(1.0)
+        capture.on_cancel(lambda: channel.close())
+        while True:
+            received = False
+            if channel.recv_ready():
+                capture.feed("stdout", channel.recv(_CHUNK))
+                received = True
+            if channel.recv_stderr_ready():
+                capture.feed("stderr", channel.recv_stderr(_CHUNK))
+                received = True
+            if not received:
+                if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+                if channel.closed:
+                    break
+                select.select([channel], [], [], 1.0)
+        # A cancelled command closes the channel before its exit status arrives
+        result = capture.result(channel.recv_exit_status() if channel.exit_status_ready() else -1)
+        result["error"] = capture.tail("stderr")
+        return result
@@ -0,0 +1,82 @@
+"""Cache of the execution context probed before each command task.
+
+Command tasks run ``context.sh`` before staging in to learn where they run:
+public and private IP, user and the transfer services that are active.  Tasks
+on the same execution target (the local machine, an SSH host, a Slurm
+partition, a container image) get the same answer, so the workflow keeps one
+probe result per target for ``ttl`` seconds.  Tasks that need a target while
+its first probe is running wait for it instead of probing again.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+#: Seconds a probed context stays valid when the configuration does not set ``[context] ttl``.
+DEFAULT_TTL = 3600.0
+
+
+class ContextCache(object):
+    """Probe results of execution targets, shared by the tasks of a workflow."""
+
+    def __init__(self, ttl: Any = DEFAULT_TTL, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param ttl: seconds a probe result is reused; 0 probes for every task
+        :type ttl: float
+
+        :param clock: monotonic time source
+        :type clock: callable
+        """
+        ttl = float(ttl)
+        if ttl < 0:
+            raise ValueError("Context ttl must not be negative")
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[float, Dict[str, Any]]] = {}
+        self._probing: Dict[Hashable, threading.Lock] = {}
+
+    def _lookup(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._clock() - entry[0] >= self.ttl:
+                return None
+            return dict(entry[1])
+
+    def get(self, key: Optional[Hashable], probe: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return the context of an execution target, probing it when missing or expired
+
+        :param key: execution target, see :meth:`dagon.task.Task.context_key`; None is never cached
+        :type key: tuple
+
+        :param probe: returns the context of the target
+        :type probe: callable
+
+        :return: a copy of the context, the caller may change it
+        :rtype: dict(str, object)
+        """
+        if key is None:
+            return probe()
+        with self._lock:
+            probing = self._probing.setdefault(key, threading.Lock())
+        with probing:
+            info = self._lookup(key)
+            if info is not None:
+                return info
+            info = probe()
+            with self._lock:
+                self._entries[key] = (self._clock(), dict(info))
+            return info
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Forget the context of *key*, or of every target when it is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -73,7 +73,7 @@ class DAG_TPS(object):
         # Check if the workflow is the current one
         for wf in self.workflows:
             if workflow_name == wf.name:
-                wf.find_task_by_name(wf.name,task_name)
+                return wf.find_task_by_name(wf.name,task_name)
         return None
 
     def find_workflow_task(self,task_name):
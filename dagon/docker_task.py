@@ -1,4 +1,4 @@
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from dagon.batch import Batch
 from dagon.remote import RemoteTask
@@ -26,6 +26,8 @@ class DockerTask(Batch):
 
     """
 
+    pool = "container"
+
     def __init__(
             self,
             name: str,
@@ -103,6 +105,17 @@ class DockerTask(Batch):
         body = join_command(("cd", self.working_dir)) + ";" + body
         return join_command(("docker", "exec", "-t", self.container.id, "sh", "-c", body.strip())) + "\n"
 
+    def context_key(self) -> Tuple[Any, ...]:
+        """Tasks of the same image share one context probe"""
+        return ("container", self.image)
+
+    def result_spec(self) -> Optional[Dict[str, Any]]:
+        """The container image is part of what determines the output"""
+        spec = super().result_spec()
+        if spec is not None:
+            spec["image"] = self.image
+        return spec
+
     def pre_process_command(self, command: str) -> str:
         """
         Add some post process commands after the task execution. Also creates the docker container.
@@ -147,7 +160,8 @@ class DockerTask(Batch):
         """
         # ← MODIFICADO: Solo hacer pull si self.pull == True
         if self.pull:
-            self.pull_image(self.image)
+            with self.trace("image_pull", image=self.image):
+                self.pull_image(self.image)
 
         volumes = {}
         
@@ -182,7 +196,8 @@ class DockerTask(Batch):
             if self.devices:
                 container_kwargs["devices"] = self.devices
             
-            container = self.docker_client2.containers.run(**container_kwargs)
+            with self.trace("container_create", image=self.image):
+                container = self.docker_client2.containers.run(**container_kwargs)
             self.workflow.logger.info("%s: Container created with %s", self.name, container.id)
             return container
         except Exception as e:
@@ -221,7 +236,8 @@ class DockerTask(Batch):
 
         # Invoke the base method
         Task.on_execute(self, script, script_name)
-        return Batch.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)))
+        command = join_command(("bash", self.working_dir + "/.dagon/" + script_name))
+        return Batch.execute_command(command, self.open_output(script_name))
         # return self.docker_client.exec_command(self.working_dir + "/.dagon/" + script_name)"""
 
     def on_garbage(self) -> None:
@@ -241,6 +257,8 @@ class DockerRemoteTask(RemoteTask, DockerTask):
     :vartype docker_client: :class:`dagon.dockercontainer.DockerRemoteClient`
     """
 
+    pool = "container"
+
     def __init__(
             self,
             name: str,
@@ -308,6 +326,10 @@ class DockerRemoteTask(RemoteTask, DockerTask):
             
         self.docker_client2 = docker.DockerClient(base_url=base_url, timeout=300)
 
+    def context_key(self) -> Tuple[Any, ...]:
+        """Tasks of the same image on the same remote machine share one context probe"""
+        return RemoteTask.context_key(self) + DockerTask.context_key(self)
+
     def on_execute(self, launcher_script: str, script_name: str) -> ExecutionResult:
         """
         Execute the task script
@@ -324,7 +346,8 @@ class DockerRemoteTask(RemoteTask, DockerTask):
         """
 
         RemoteTask.on_execute(self, launcher_script, script_name)
-        return self.ssh_connection.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)))
+        command = join_command(("bash", self.working_dir + "/.dagon/" + script_name))
+        return self.ssh_connection.execute_command(command, self.open_output(script_name))
 
     def on_garbage(self) -> None:
         """
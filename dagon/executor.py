@@ -0,0 +1,137 @@
+"""Bounded execution slots for workflow tasks.
+
+The workflow scheduler decides *when* a task may run (all its producers have
+ended); the :class:`Executor` decides *whether* it may run now.  It holds at
+most ``max_workers`` tasks in execution and, optionally, a smaller number per
+backend sub-pool, so a fan-out of hundreds of local tasks does not start
+hundreds of processes on a login node at once.
+"""
+
+import heapq
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+#: Sub-pool used by tasks that do not declare one.
+DEFAULT_POOL = "local"
+
+#: Sub-pools declared by the task classes shipped with DAGonStar.
+POOLS = ("local", "ssh", "slurm", "container", "service")
+
+
+def task_pool(task: Any) -> str:
+    """Return the name of the sub-pool *task* runs in."""
+    return getattr(task, "pool", None) or DEFAULT_POOL
+
+
+class Executor(object):
+    """Admit ready tasks into a bounded number of execution slots.
+
+    Ready tasks wait in one queue per sub-pool, ordered by the priority key of
+    the scheduling policy and then by release order.  A pool that reached its
+    own limit does not block tasks of other pools while global slots remain.
+    """
+
+    def __init__(self, max_workers: int, limits: Optional[Mapping[str, Any]] = None,
+                 priority: Optional[Callable[[Any], Any]] = None) -> None:
+        """
+        :param max_workers: maximum number of tasks executing at the same time
+        :type max_workers: int
+
+        :param limits: optional maximum number of running tasks per sub-pool
+        :type limits: dict(str, int)
+
+        :param priority: sort key of a queued task; lower keys start first
+        :type priority: callable
+        """
+        max_workers = int(max_workers)
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive integer")
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._limits: Dict[str, int] = {}
+        self._queues: Dict[str, List[Tuple[Any, int, Any]]] = {}
+        self._running: Dict[str, int] = {}
+        self._sequence = 0
+        self.priority = priority or (lambda task: 0)
+        for pool, limit in (limits or {}).items():
+            self.set_limit(pool, limit)
+
+    def set_limit(self, pool: str, limit: Optional[Any]) -> None:
+        """Limit the number of running tasks of *pool*; ``None`` removes it."""
+        with self._lock:
+            if limit is None:
+                self._limits.pop(pool, None)
+                return
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError("Limit of pool %s must be a positive integer" % pool)
+            self._limits[pool] = limit
+
+    def get_limit(self, pool: str) -> int:
+        """Return the effective number of slots of *pool*."""
+        with self._lock:
+            return min(self._limits.get(pool, self.max_workers), self.max_workers)
+
+    def get_limits(self) -> Dict[str, int]:
+        """Return the configured limit of each sub-pool, not capped by ``max_workers``."""
+        with self._lock:
+            return dict(self._limits)
+
+    def submit(self, task: Any) -> None:
+        """Queue a task whose producers have all ended."""
+        with self._lock:
+            self._sequence += 1
+            entry = (self.priority(task), self._sequence, task)
+            heapq.heappush(self._queues.setdefault(task_pool(task), []), entry)
+
+    def acquire(self) -> List[Any]:
+        """Reserve slots for queued tasks and return the tasks to start."""
+        admitted = []
+        with self._lock:
+            running = sum(self._running.values())
+            while running < self.max_workers:
+                candidate = None
+                for pool, queue in self._queues.items():
+                    if not queue:
+                        continue
+                    if self._running.get(pool, 0) >= self._limits.get(pool, self.max_workers):
+                        continue
+                    if candidate is None or queue[0][:2] < candidate[0][:2]:
+                        candidate = queue
+                if candidate is None:
+                    break
+                task = heapq.heappop(candidate)[2]
+                pool = task_pool(task)
+                self._running[pool] = self._running.get(pool, 0) + 1
+                running += 1
+                admitted.append(task)
+        return admitted
+
+    def release(self, task: Any) -> None:
+        """Free the slot held by an ended task."""
+        with self._lock:
+            pool = task_pool(task)
+            if self._running.get(pool, 0) > 0:
+                self._running[pool] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and utilisation counters, globally and per pool."""
+        with self._lock:
+            pools = {}
+            for pool in sorted(set(POOLS) | set(self._queues) | set(self._running) | set(self._limits)):
+                limit = min(self._limits.get(pool, self.max_workers), self.max_workers)
+                running = self._running.get(pool, 0)
+                pools[pool] = {
+                    "limit": limit,
+                    "running": running,
+                    "queued": len(self._queues.get(pool, ())),
+                    "utilisation": running / float(limit),
+                }
+            running = sum(self._running.values())
+            return {
+                "max_workers": self.max_workers,
+                "running": running,
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "utilisation": running / float(self.max_workers),
+                "pools": pools,
+            }
@@ -1,4 +1,5 @@
 """First-class provider-neutral Function-as-a-Service workflow tasks."""
+import asyncio
 import copy
 import hashlib
 import json
@@ -7,13 +8,14 @@ import os
 import shutil
 import time
 from pathlib import Path
-from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+from typing import Any, Dict, Mapping, Optional, Tuple
 
 import dagon
+from dagon import incremental
 from dagon.faas_models import FaaSInvocation, RetryPolicy
-from dagon.faas_providers import FaaSError, get_provider
+from dagon.faas_providers import FaaSError, FaaSProvider, get_provider
+from dagon.references import WorkflowReference, parse_reference, scan_value
 from dagon.task import Task
-from dagon.web.schema import references
 
 
 _TOP_LEVEL = {"provider", "profile", "function", "inputs", "outputs", "invocation", "timeout", "retry",
@@ -66,6 +68,8 @@ def _retry_policy(value: Optional[Mapping[str, Any]]) -> RetryPolicy:
 class FaaSTask(Task):
     """Invoke an already-deployed function through a provider adapter."""
 
+    pool = "service"
+
     def __init__(self, name: str, specification: Optional[Mapping[str, Any]] = None, **kwargs: Any) -> None:
         common = {key: kwargs.pop(key) for key in list(kwargs) if key in ("working_dir", "transversal_workflow", "globusendpoint")}
         spec = dict(specification or {})
@@ -147,27 +151,22 @@ class FaaSTask(Task):
         task.update({"type": "faas"}, **self._portable_spec())
         return task
 
-    def _references(self) -> Iterable[str]:
-        seen = set()
-        for reference in references(self.inputs):
-            if reference not in seen:
-                seen.add(reference)
-                yield reference
-
     @staticmethod
-    def _parse_reference(reference: str) -> Tuple[str, str, str]:
-        pieces = reference[len(dagon.Workflow.SCHEMA):].split("/")
-        if len(pieces) < 3 or not pieces[1] or not "/".join(pieces[2:]):
+    def _parse_reference(reference: str) -> WorkflowReference:
+        parsed = parse_reference(reference)
+        if not parsed.task or not parsed.path:
             raise ValueError("Invalid FaaS workflow input reference: %s" % reference)
-        return pieces[0], pieces[1], _safe_path("/".join(pieces[2:]))
+        return parsed._replace(path=_safe_path(parsed.path))
+
+    def _scan_references(self) -> Tuple[WorkflowReference, ...]:
+        return tuple(self._parse_reference(reference.raw) for reference in scan_value(self.inputs))
 
     def pre_run(self) -> None:
-        for reference in self._references():
-            workflow_name, task_name, _ = self._parse_reference(reference)
-            workflow_name = workflow_name or self.workflow.name
-            producer = self.workflow.find_task_by_name(workflow_name, task_name)
+        for reference in self.get_references():
+            workflow_name = reference.workflow_name(self.workflow.name)
+            producer = self.resolve_reference(reference)
             if producer is None:
-                raise ValueError("FaaS input producer was not found: %s" % reference)
+                raise ValueError("FaaS input producer was not found: %s" % reference.raw)
             if workflow_name == self.workflow.name:
                 self.add_dependency_to(producer)
             else:
@@ -176,20 +175,19 @@ class FaaSTask(Task):
 
     def _stage_inputs(self) -> Dict[str, Dict[str, Any]]:
         descriptors = {}
-        for reference in self._references():
-            workflow_name, task_name, relative = self._parse_reference(reference)
-            workflow_name = workflow_name or self.workflow.name
-            producer = self.workflow.find_task_by_name(workflow_name, task_name)
+        for reference in self.get_references():
+            workflow_name = reference.workflow_name(self.workflow.name)
+            producer = self.resolve_reference(reference)
             if producer is None or producer.working_dir is None:
-                raise ValueError("FaaS input producer is unavailable: %s" % reference)
-            source = Path(producer.working_dir, relative)
+                raise ValueError("FaaS input producer is unavailable: %s" % reference.raw)
+            source = Path(producer.working_dir, reference.path)
             if not source.is_file():
                 raise FileNotFoundError("FaaS input file does not exist: %s" % source)
-            destination = Path(self.working_dir, "inputs", workflow_name, task_name, relative)
+            destination = Path(self.working_dir, "inputs", workflow_name, reference.task, reference.path)
             destination.parent.mkdir(parents=True, exist_ok=True)
             shutil.copy2(str(source), str(destination))
             digest = hashlib.sha256(destination.read_bytes()).hexdigest()
-            descriptors[reference] = {"kind": "artifact", "reference": reference,
+            descriptors[reference.raw] = {"kind": "artifact", "reference": reference.raw,
                 "path": destination.relative_to(self.working_dir).as_posix(),
                 "media_type": mimetypes.guess_type(str(destination))[0], "size_bytes": destination.stat().st_size,
                 "checksum": {"algorithm": "sha256", "value": digest},
@@ -259,17 +257,18 @@ class FaaSTask(Task):
                     raise FaaSError("FaaS output checksum mismatch: %s" % name, "output_checksum_mismatch")
             os.replace(str(temporary), str(destination))
 
-    def execute(self) -> None:
+    def _prepare_invocation(self) -> Optional[Tuple[str, Any]]:
         key = self.workflow.name + "." + self.name
         checkpoint = self.workflow.checkpoints.get(key, {})
         if checkpoint.get("code") == 0 and checkpoint.get("spec_sha256") == hashlib.sha256(self.command.encode()).hexdigest() \
                 and Path(checkpoint.get("working_dir", "")).is_dir():
             self.working_dir, self.fair_checkpoint_reused = checkpoint["working_dir"], True
-            return
+            return None
         self.create_working_dir()
         spec_hash = hashlib.sha256(self.command.encode()).hexdigest()
         self.workflow.checkpoints[key] = {"working_dir": self.working_dir, "workflow": self.workflow.name,
-                                          "name": self.name, "spec_sha256": spec_hash}
+                                          "name": self.name, "spec_sha256": spec_hash,
+                                          "fingerprint": incremental.fingerprint(self)}
         metadata_dir = Path(self.working_dir, ".dagon")
         metadata_dir.mkdir(parents=True, exist_ok=True)
         self.workflow._fire_event("on_task_staging_in_start", self)
@@ -280,50 +279,85 @@ class FaaSTask(Task):
         finally:
             self.workflow._fire_event("on_task_staging_in_end", self)
         self.workflow._fire_event("on_task_execute_start", self)
-        if not self.workflow.dry:
-            provider = get_provider("mock" if self.workflow.is_portable_emulation() is True else self.provider)
-            capabilities = provider.capabilities()
-            if self.invocation == "async" and not capabilities.supports_async:
-                raise FaaSError("Provider does not support asynchronous invocation", "unsupported_capability")
-            options = {} if self.workflow.is_portable_emulation() is True else self._profile_options()
-            last_error = None
-            for attempt in range(1, self.retry.max_attempts + 1):
-                envelope = self._envelope(resolved_inputs, attempt)
-                metadata_dir.joinpath("faas_request.json").write_text(json.dumps(envelope, indent=2, sort_keys=True) + "\n", encoding="utf-8")
-                invocation = FaaSInvocation(self.provider, self.function, self.invocation, envelope, self.timeout,
-                                            envelope["id"], attempt, options)
-                try:
-                    self.invocation_result = provider.invoke(invocation)
-                    self.attempt_records.append({"attempt": attempt, "status": self.invocation_result.status,
-                                                 "request_id": self.invocation_result.request_id})
-                    break
-                except FaaSError as exc:
-                    last_error = exc
-                    self.attempt_records.append({"attempt": attempt, "status": "failed", "error": exc.code})
-                    if not exc.transient or exc.code not in self.retry.retry_on or attempt == self.retry.max_attempts:
-                        raise
-                    time.sleep(self._delay(attempt))
-            if self.invocation_result is None:
-                raise last_error or FaaSError("FaaS invocation failed")
-            response = self.invocation_result.payload or {}
-            safe_response = provider.sanitize_metadata(response)
-            metadata_dir.joinpath("faas_response.json").write_text(json.dumps(safe_response, indent=2, sort_keys=True) + "\n", encoding="utf-8")
-            sanitized = provider.sanitize_metadata(self.invocation_result.metadata)
-            self.sanitized_provider_metadata = dict(sanitized)
-            metadata_dir.joinpath("faas_provider_metadata.json").write_text(json.dumps(sanitized, indent=2, sort_keys=True) + "\n", encoding="utf-8")
-            if self.invocation == "sync":
-                self._materialize_outputs(response)
-            self.workflow.checkpoints[key]["code"] = 0
+        return key, resolved_inputs
+
+    def _provider(self) -> Tuple[FaaSProvider, Dict[str, Any]]:
+        provider = get_provider("mock" if self.workflow.is_portable_emulation() is True else self.provider)
+        capabilities = provider.capabilities()
+        if self.invocation == "async" and not capabilities.supports_async:
+            raise FaaSError("Provider does not support asynchronous invocation", "unsupported_capability")
+        options = {} if self.workflow.is_portable_emulation() is True else self._profile_options()
+        return provider, options
+
+    def _attempt(self, provider: FaaSProvider, resolved_inputs: Any, options: Dict[str, Any], attempt: int) -> Optional[float]:
+        """Invoke the function once; return the delay before the next attempt, or ``None`` on success."""
+        envelope = self._envelope(resolved_inputs, attempt)
+        Path(self.working_dir, ".dagon", "faas_request.json").write_text(json.dumps(envelope, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        invocation = FaaSInvocation(self.provider, self.function, self.invocation, envelope, self.timeout,
+                                    envelope["id"], attempt, options)
+        try:
+            self.invocation_result = provider.invoke(invocation)
+            self.attempt_records.append({"attempt": attempt, "status": self.invocation_result.status,
+                                         "request_id": self.invocation_result.request_id})
+            return None
+        except FaaSError as exc:
+            self.attempt_records.append({"attempt": attempt, "status": "failed", "error": exc.code})
+            if not exc.transient or exc.code not in self.retry.retry_on or attempt == self.retry.max_attempts:
+                raise
+            return self._delay(attempt)
+
+    def _complete_invocation(self, key: str, provider: FaaSProvider) -> None:
+        if self.invocation_result is None:
+            raise FaaSError("FaaS invocation failed")
+        metadata_dir = Path(self.working_dir, ".dagon")
+        response = self.invocation_result.payload or {}
+        safe_response = provider.sanitize_metadata(response)
+        metadata_dir.joinpath("faas_response.json").write_text(json.dumps(safe_response, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        sanitized = provider.sanitize_metadata(self.invocation_result.metadata)
+        self.sanitized_provider_metadata = dict(sanitized)
+        metadata_dir.joinpath("faas_provider_metadata.json").write_text(json.dumps(sanitized, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        if self.invocation == "sync":
+            self._materialize_outputs(response)
+        self.workflow.checkpoints.record(key, code=0)
+
+    def _stage_out(self) -> None:
         self.workflow._fire_event("on_task_staging_out_start", self)
         try:
-            for reference in self._references():
-                workflow_name, task_name, _ = self._parse_reference(reference)
-                producer = self.workflow.find_task_by_name(workflow_name or self.workflow.name, task_name)
-                if producer:
-                    producer.decrement_reference_count()
+            self.release_references()
         finally:
             self.workflow._fire_event("on_task_staging_out_end", self)
 
+    def execute(self) -> None:
+        prepared = self._prepare_invocation()
+        if prepared is None:
+            return
+        key, resolved_inputs = prepared
+        if not self.workflow.dry:
+            provider, options = self._provider()
+            for attempt in range(1, self.retry.max_attempts + 1):
+                delay = self._attempt(provider, resolved_inputs, options, attempt)
+                if delay is None:
+                    break
+                time.sleep(delay)
+            self._complete_invocation(key, provider)
+        self._stage_out()
+
+    async def execute_async(self) -> None:
+        prepared = await self.run_blocking(self._prepare_invocation)
+        if prepared is None:
+            return
+        key, resolved_inputs = prepared
+        if not self.workflow.dry:
+            provider, options = self._provider()
+            for attempt in range(1, self.retry.max_attempts + 1):
+                delay = await self.run_blocking(self._attempt, provider, resolved_inputs, options, attempt)
+                if delay is None:
+                    break
+                # Back off without holding a thread
+                await asyncio.sleep(delay)
+            await self.run_blocking(self._complete_invocation, key, provider)
+        await self.run_blocking(self._stage_out)
+
     def get_execution_metadata(self) -> Dict[str, Any]:
         metadata = {"model": "faas", "provider": self.provider, "function": self.function,
             "invocation_mode": self.invocation, "timeout_seconds": self.timeout, "attempts": len(self.attempt_records),
@@ -0,0 +1,116 @@
+"""Topological ordering and cycle detection over task graphs.
+
+Edges follow the ``nexts`` list of each task and are restricted to the given
+tasks, so producers and consumers in other workflows are ignored.  Both
+algorithms are iterative and run in linear time; long chains do not hit the
+interpreter recursion limit.
+"""
+
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+
+def topological_sort(tasks: Sequence[Any]) -> Tuple[List[Any], Dict[Any, int], List[Any]]:
+    """Sort *tasks* so every producer comes before its consumers (Kahn's algorithm).
+
+    Tasks without producers keep their relative order at the front, and each
+    consumer follows as soon as its last producer was placed.
+
+    :param tasks: tasks of one workflow
+    :return: the sorted tasks, the depth level of each sorted task (0 for
+        tasks without producers, otherwise one more than its deepest producer)
+        and the tasks left out because they are in or after a cycle
+    """
+    members = set(tasks)
+    indegree = dict.fromkeys(tasks, 0)
+    for task in tasks:
+        for consumer in task.nexts:
+            if consumer in members:
+                indegree[consumer] += 1
+    levels = {task: 0 for task in tasks if indegree[task] == 0}
+    queue = deque(levels)
+    order = []
+    while queue:
+        task = queue.popleft()
+        order.append(task)
+        for consumer in task.nexts:
+            if consumer not in members:
+                continue
+            levels[consumer] = max(levels.get(consumer, 0), levels[task] + 1)
+            indegree[consumer] -= 1
+            if indegree[consumer] == 0:
+                queue.append(consumer)
+    blocked = [task for task in tasks if indegree[task] > 0]
+    for task in blocked:
+        levels.pop(task, None)
+    return order, levels, blocked
+
+
+def cycle_members(tasks: Sequence[Any]) -> List[Any]:
+    """Return the tasks that lie on a cycle, in the order of *tasks*.
+
+    Uses an iterative version of Tarjan's strongly connected components: a task
+    is on a cycle when its component has more than one task or it consumes its
+    own output.
+    """
+    members = set(tasks)
+    index: Dict[Any, int] = {}
+    lowlink: Dict[Any, int] = {}
+    stack: List[Any] = []
+    on_stack = set()
+    cyclic = set()
+    for root in tasks:
+        if root in index:
+            continue
+        work = [(root, iter(root.nexts))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            task, consumers = work[-1]
+            advanced = False
+            for consumer in consumers:
+                if consumer not in members:
+                    continue
+                if consumer not in index:
+                    index[consumer] = lowlink[consumer] = len(index)
+                    stack.append(consumer)
+                    on_stack.add(consumer)
+                    work.append((consumer, iter(consumer.nexts)))
+                    advanced = True
+                    break
+                if consumer in on_stack:
+                    lowlink[task] = min(lowlink[task], index[consumer])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[task])
+            if lowlink[task] == index[task]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member is task:
+                        break
+                if len(component) > 1 or task in task.nexts:
+                    cyclic.update(component)
+    return [task for task in tasks if task in cyclic]
+
+
+def reachable(roots: Iterable[Any], neighbours: Callable[[Any], Iterable[Any]]) -> List[Any]:
+    """Return *roots* and every task reached from them through *neighbours*, in visit order.
+
+    :param roots: tasks the search starts from
+    :param neighbours: returns the tasks one step away from a task, for example its ``nexts``
+    """
+    seen = dict.fromkeys(roots)
+    queue = deque(seen)
+    while queue:
+        for neighbour in neighbours(queue.popleft()):
+            if neighbour not in seen:
+                seen[neighbour] = None
+                queue.append(neighbour)
+    return list(seen)
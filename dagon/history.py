@@ -0,0 +1,200 @@
+"""Run history of tasks, and estimates of the end of a run in progress.
+
+A :class:`HistoryStore` is a SQLite table of task executions keyed by
+workflow name, task name and the SHA-256 of the command, holding the
+duration, the time spent waiting for an execution slot, the bytes staged in
+from local sources and the exit code of each execution.  Setting
+``[history] path`` makes every workflow using that file record its tasks when
+they end; tasks reused from a checkpoint or never started are not recorded.
+
+:meth:`dagon.Workflow.eta` uses the recorded durations to simulate the rest of
+a run (see :mod:`dagon.simulation`) and predict when each task and the whole
+run will end::
+
+    python -m dagon.history show history.sqlite --workflow Forecast
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import statistics
+import sys
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from dagon.checkpoint_db import BUSY_TIMEOUT
+
+#: Successful executions of a task averaged by :meth:`HistoryStore.estimates`.
+DEFAULT_WINDOW = 10
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS task_runs (
+        workflow TEXT NOT NULL,
+        task TEXT NOT NULL,
+        command TEXT NOT NULL,
+        finished REAL NOT NULL,
+        duration REAL NOT NULL,
+        queue_wait REAL,
+        staged_bytes INTEGER,
+        code INTEGER)""",
+    "CREATE INDEX IF NOT EXISTS task_runs_task ON task_runs (workflow, task, finished)",
+)
+
+_COLUMNS = ("workflow", "task", "command", "finished", "duration", "queue_wait", "staged_bytes", "code")
+
+
+def command_hash(task: Any) -> str:
+    """Return the SHA-256 of the command of *task*, as recorded in its checkpoint fingerprint."""
+    command = task.command if isinstance(task.command, str) else repr(task.command)
+    return hashlib.sha256(command.encode()).hexdigest()
+
+
+class HistoryStore(object):
+    """Executions of the tasks of every workflow recorded in one SQLite file."""
+
+    def __init__(self, path: str, window: Any = DEFAULT_WINDOW) -> None:
+        """
+        :param path: database file, created if needed; it may be a SQLite checkpoint file
+        :type path: str
+
+        :param window: latest successful executions whose median estimates a task
+        :type window: int
+        """
+        self.path = path
+        self.window = int(window)
+        with closing(self._connect()):
+            pass
+
+    @classmethod
+    def from_config(cls, section: Optional[Mapping[str, Any]]) -> Optional["HistoryStore"]:
+        """Return the store described by a ``[history]`` section, None when it sets no ``path``."""
+        if not section or not section.get("path"):
+            return None
+        return cls(section["path"], section.get("window", DEFAULT_WINDOW))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    def record(self, workflow: str, task: str, command: str, duration: float, queue_wait: Optional[float] = None,
+               staged_bytes: Optional[int] = None, code: int = 0,
+               finished: Optional[float] = None) -> None:
+        """
+        Append an execution of a task
+
+        :param command: command hash, see :func:`command_hash`
+        :type command: str
+
+        :param duration: seconds from the start of the execution to its end
+        :type duration: float
+
+        :param queue_wait: seconds the task waited for an execution slot
+        :type queue_wait: float
+
+        :param code: exit code, 0 on success
+        :type code: int
+        """
+        row = (workflow, task, command, time.time() if finished is None else finished, duration, queue_wait,
+               staged_bytes, code)
+        with closing(self._connect()) as connection:
+            connection.execute("INSERT INTO task_runs (%s) VALUES (%s)" % (", ".join(_COLUMNS),
+                                                                           ", ".join("?" * len(_COLUMNS))), row)
+
+    def record_task(self, task: Any) -> None:
+        """Record a task that just ended; tasks that did not execute are ignored."""
+        if task.execution_start is None or task.fair_checkpoint_reused:
+            return
+        result = task.result if isinstance(task.result, Mapping) else {}
+        code = result.get("code") if isinstance(result.get("code"), int) else 0
+        if task.status.name != "FINISHED" and not code:
+            code = 1
+        queue_wait = None
+        if task.release_time is not None:
+            queue_wait = max(0.0, task.execution_start - task.release_time)
+        self.record(task.workflow.name, task.name, command_hash(task), time.time() - task.execution_start,
+                    queue_wait, task.staged_bytes, code)
+
+    def runs(self, workflow: str, task: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return the recorded executions of a workflow, latest first
+
+        :param task: only the executions of this task
+        :type task: str
+
+        :param limit: maximum number of executions returned
+        :type limit: int
+
+        :return: one dict per execution, with the columns of the table
+        :rtype: list(dict(str, object))
+        """
+        query = "SELECT %s FROM task_runs WHERE workflow = ?" % ", ".join(_COLUMNS)
+        parameters: List[Any] = [workflow]
+        if task is not None:
+            query += " AND task = ?"
+            parameters.append(task)
+        query += " ORDER BY finished DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(int(limit))
+        with closing(self._connect()) as connection:
+            return [dict(zip(_COLUMNS, row)) for row in connection.execute(query, parameters)]
+
+    def estimates(self, workflow: str, commands: Optional[Mapping[str, str]] = None) -> Dict[str, float]:
+        """
+        Return the estimated duration of the tasks of a workflow
+
+        The estimate of a task is the median duration of its latest ``window``
+        successful executions with the same command, or with any command when it
+        never ran with this one.
+
+        :param commands: command hash of each task, by task name
+        :type commands: dict(str, str)
+
+        :return: seconds per task name
+        :rtype: dict(str, float)
+        """
+        commands = commands or {}
+        durations: Dict[str, Dict[bool, List[float]]] = {}
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT task, command, duration FROM task_runs WHERE workflow = ? AND code = 0 "
+                                      "ORDER BY finished DESC", (workflow,))
+            for task, command, duration in rows:
+                same = durations.setdefault(task, {True: [], False: []})[commands.get(task) == command]
+                if len(same) < self.window:
+                    same.append(duration)
+        estimates = {}
+        for task, values in durations.items():
+            samples = values[True] or values[False]
+            if samples:
+                estimates[task] = statistics.median(samples)
+        return estimates
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect the run history of workflow tasks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="print the executions as JSON lines, latest first")
+    show.add_argument("path")
+    show.add_argument("--workflow", required=True)
+    show.add_argument("--task")
+    show.add_argument("--limit", type=int)
+    estimate = commands.add_parser("estimate", help="print the estimated duration of each task as JSON")
+    estimate.add_argument("path")
+    estimate.add_argument("--workflow", required=True)
+    arguments = parser.parse_args(argv)
+    store = HistoryStore(arguments.path)
+    if arguments.command == "show":
+        for run in store.runs(arguments.workflow, arguments.task, arguments.limit):
+            sys.stdout.write(json.dumps(run, sort_keys=True) + "\n")
+    else:
+        sys.stdout.write(json.dumps(store.estimates(arguments.workflow), sort_keys=True, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Make-style selection of the tasks an incremental run executes again.
+
+Every task records a fingerprint in its checkpoint when it starts executing:
+the SHA-256 of its command and the size and modification time of each input,
+that is each ``workflow://`` reference of the command and each local path
+declared with :meth:`dagon.task.Task.declare_inputs`.  ``run(incremental=True)``
+computes the fingerprints again from the previous checkpoint.  A task is dirty
+when it did not succeed, when its fingerprint changed or when one of its
+producers is dirty; the checkpoint records of dirty tasks are dropped so they
+execute again, while clean tasks reuse their working directory.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from dagon.references import parse_reference
+from dagon.result_cache import DAGON_DIR
+
+
+def signature(target: str) -> Optional[List[int]]:
+    """
+    Return the size and latest modification time of a file or directory tree
+
+    :param target: input path
+    :type target: str
+
+    :return: ``[size, mtime_ns, files]``, None when *target* does not exist
+    :rtype: list(int)
+    """
+    try:
+        stat = os.stat(target)
+    except OSError:
+        return None
+    if not os.path.isdir(target):
+        return [stat.st_size, stat.st_mtime_ns, 1]
+    size, latest, count = 0, stat.st_mtime_ns, 0
+    for directory, directories, files in os.walk(target):
+        directories[:] = [name for name in directories if name != DAGON_DIR]
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            size, latest, count = size + stat.st_size, max(latest, stat.st_mtime_ns), count + 1
+    return [size, latest, count]
+
+
+def _declared_path(artifact: Any) -> Optional[str]:
+    value = getattr(artifact, "path", artifact)
+    return value if isinstance(value, str) else None
+
+
+def declared_inputs(task: Any) -> Tuple[List[Any], List[str]]:
+    """
+    Return the inputs declared with :meth:`dagon.task.Task.declare_inputs` that name a path
+
+    :param task: task of a workflow
+    :type task: :class:`dagon.task.Task`
+
+    :return: the ``workflow://`` references and the local paths
+    :rtype: tuple(list(:class:`dagon.references.WorkflowReference`), list(str))
+    """
+    references, paths = [], []
+    for artifact in task.fair_inputs:
+        path = _declared_path(artifact)
+        if path is None:
+            continue
+        if path.startswith(task.workflow.SCHEMA):
+            references.append(parse_reference(path))
+        else:
+            paths.append(path)
+    return references, paths
+
+
+def fingerprint(task: Any, working_dirs: Optional[Mapping[Any, Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    Return the command hash and input signatures of a task
+
+    :param task: task of a workflow
+    :type task: :class:`dagon.task.Task`
+
+    :param working_dirs: working directory of producers that did not run yet, by producer
+    :type working_dirs: dict(:class:`dagon.task.Task`, str)
+
+    :return: ``{"command": sha256, "inputs": {input: signature}}``
+    :rtype: dict(str, object)
+    """
+    working_dirs = working_dirs or {}
+    declared_references, local_paths = declared_inputs(task)
+    references = list(task.get_references()) + declared_references
+    declared = {path: signature(path) for path in local_paths}
+    inputs: Dict[str, Any] = {}
+    for reference in references:
+        producer = task.resolve_reference(reference)
+        working_dir = None
+        if producer is not None:
+            working_dir = working_dirs.get(producer, producer.working_dir)
+        inputs[reference.raw] = signature(os.path.join(working_dir, reference.path)) if working_dir else None
+    inputs.update(declared)
+    command = task.command if isinstance(task.command, str) else repr(task.command)
+    return {"command": hashlib.sha256(command.encode()).hexdigest(), "inputs": inputs}
+
+
+def dirty_tasks(workflow: Any, records: Mapping[str, Any]) -> List[Any]:
+    """
+    Return the tasks of *workflow* that must execute again after the run of *records*
+
+    :param workflow: workflow with its dependencies made
+    :type workflow: :class:`dagon.Workflow`
+
+    :param records: checkpoint records of the previous run
+    :type records: dict(str, object)
+
+    :return: dirty tasks in topological order
+    :rtype: list(:class:`dagon.task.Task`)
+    """
+    dirty: List[Any] = []
+    dirty_set = set()
+    working_dirs: Dict[Any, Optional[str]] = {}
+    for task in workflow.topological_order():
+        record = records.get(task.checkpoint_key())
+        clean = isinstance(record, dict) and record.get("code") == 0 and "fingerprint" in record \
+            and not any(producer in dirty_set for producer in task.prevs) \
+            and record["fingerprint"] == fingerprint(task, working_dirs)
+        if clean:
+            working_dirs[task] = record.get("working_dir")
+        else:
+            dirty.append(task)
+            dirty_set.add(task)
+    return dirty
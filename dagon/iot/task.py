@@ -7,9 +7,11 @@ from pathlib import Path
 from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
 
 import dagon
-from dagon.iot.references import references, replace_references
+from dagon import incremental
+from dagon.iot.references import replace_references
 from dagon.iot.registry import get_provider, provider_exists
 from dagon.iot.security import json_copy, redact
+from dagon.references import WorkflowReference, parse_reference, scan_value
 from dagon.task import Task, TaskType
 
 
@@ -50,6 +52,7 @@ def _safe_path(value: str) -> str:
 class IoTTask(Task):
     """Execute one bounded observe, configure, actuate, or edge-compute operation."""
     task_type = TaskType.IOT
+    pool = "service"
 
     def __init__(self, name: str, *, operation: str, provider: str = "mock", endpoint: Optional[str] = None,
                  endpoint_ref: Optional[str] = None, target: Any = None, resource: Optional[str] = None,
@@ -116,33 +119,30 @@ class IoTTask(Task):
         task.pop("working_dir", None)
         return task
 
-    def _references(self) -> Iterable[str]:
-        seen = set()
-        for reference in references(self.iot_spec):
-            if reference not in seen:
-                seen.add(reference)
-                yield reference
-
     @staticmethod
-    def _parse_reference(reference: str) -> Tuple[str, str, str]:
-        pieces = reference[len(dagon.Workflow.SCHEMA):].split("/")
-        if len(pieces) < 3 or not pieces[1] or not "/".join(pieces[2:]):
+    def _parse_reference(reference: str) -> WorkflowReference:
+        parsed = parse_reference(reference)
+        if not parsed.task or not parsed.path:
             raise IoTValidationError("Invalid IoT workflow reference: %s" % reference)
-        return pieces[0], pieces[1], _safe_path("/".join(pieces[2:]))
+        return parsed._replace(path=_safe_path(parsed.path))
 
-    def pre_run(self) -> None:
+    def _scan_references(self) -> Tuple[WorkflowReference, ...]:
+        return tuple(self._parse_reference(reference.raw) for reference in scan_value(self.iot_spec, ".;:|)&"))
+
+    def _producers(self) -> Iterable[Tuple[WorkflowReference, Optional[Task]]]:
+        """Yield each referenced producer once, with the reference that names it first."""
         producers = set()
-        for reference in self._references():
-            workflow_name, task_name, _ = self._parse_reference(reference)
-            workflow_name = workflow_name or self.workflow.name
-            producer = self.workflow.find_task_by_name(workflow_name, task_name)
+        for reference in self.get_references():
+            key = (reference.workflow_name(self.workflow.name), reference.task)
+            if key not in producers:
+                producers.add(key)
+                yield reference, self.resolve_reference(reference)
+
+    def pre_run(self) -> None:
+        for reference, producer in self._producers():
             if producer is None:
-                raise IoTValidationError("IoT input producer was not found: %s" % reference)
-            key = (workflow_name, task_name)
-            if key in producers:
-                continue
-            producers.add(key)
-            if workflow_name == self.workflow.name:
+                raise IoTValidationError("IoT input producer was not found: %s" % reference.raw)
+            if reference.workflow_name(self.workflow.name) == self.workflow.name:
                 self.add_dependency_to(producer)
             else:
                 self.add_transversal_point(producer)
@@ -150,18 +150,19 @@ class IoTTask(Task):
 
     def _resolve_and_stage(self) -> Dict[str, Any]:
         staged = {}
+        table = {reference.raw: reference for reference in self.get_references()}
         def resolve(reference: str) -> str:
             if reference in staged:
                 return staged[reference]
-            workflow_name, task_name, relative = self._parse_reference(reference)
-            workflow_name = workflow_name or self.workflow.name
-            producer = self.workflow.find_task_by_name(workflow_name, task_name)
+            parsed = table.get(reference) or self._parse_reference(reference)
+            producer = self.resolve_reference(parsed)
             if producer is None or producer.working_dir is None:
                 raise IoTValidationError("IoT input producer is unavailable: %s" % reference)
-            source = Path(producer.working_dir, relative)
+            source = Path(producer.working_dir, parsed.path)
             if not source.is_file():
                 raise FileNotFoundError("IoT input file does not exist: %s" % source)
-            destination = Path(self.working_dir, ".dagon", "inputs", workflow_name, task_name, relative)
+            destination = Path(self.working_dir, ".dagon", "inputs", parsed.workflow_name(self.workflow.name),
+                               parsed.task, parsed.path)
             destination.parent.mkdir(parents=True, exist_ok=True)
             shutil.copy2(str(source), str(destination))
             staged[reference] = str(destination)
@@ -206,7 +207,7 @@ class IoTTask(Task):
 
     def execute(self) -> None:
         if self.reuse_checkpoint():
-            self._release_references()
+            self.release_references()
             return
         self.create_working_dir()
         key = self.checkpoint_key()
@@ -231,34 +232,28 @@ class IoTTask(Task):
                       "name": self.name, "working_dir": self.working_dir, "status": "WAITING",
                       "provider": self.provider, "operation": self.operation,
                       "invocation_id": invocation.invocation_id, "progress": invocation.progress,
-                      "delivery": redact(self.delivery), "outcome_certainty": "known", "outputs": []}
+                      "delivery": redact(self.delivery), "outcome_certainty": "known", "outputs": [],
+                      "fingerprint": incremental.fingerprint(self)}
         self.workflow.checkpoints[key] = checkpoint
         result = provider.poll(invocation, context)
         self.invocation_result = result.as_dict()
         if self.operation == "actuate" and result.outcome_certainty == "unknown":
-            checkpoint["outcome_certainty"] = "unknown"
+            self.workflow.checkpoints.record(key, outcome_certainty="unknown")
             raise IoTUnknownOutcomeError("Physical actuation outcome is unknown; automatic replay is disabled")
         outputs = self._materialize(self.invocation_result)
         self._write_json(".dagon/iot_result.json", self.invocation_result)
         self._write_json(".dagon/iot_provenance.json", {key: self.invocation_result.get(key) for key in
             ("requested_target", "selected_target", "placement", "migration_history", "protocol_metadata", "outcome_certainty")})
-        checkpoint.update({"status": "SUCCEEDED", "code": 0, "outputs": outputs,
-                           "outcome_certainty": result.outcome_certainty})
+        self.workflow.checkpoints.record(key, status="SUCCEEDED", code=0, outputs=outputs,
+                                         outcome_certainty=result.outcome_certainty)
         self.workflow._fire_event("on_task_staging_out_start", self)
         try:
-            self._release_references()
+            self.release_references()
         finally:
             self.workflow._fire_event("on_task_staging_out_end", self)
 
-    def _release_references(self) -> None:
-        released = set()
-        for reference in self._references():
-            workflow_name, task_name, _ = self._parse_reference(reference)
-            key = (workflow_name or self.workflow.name, task_name)
-            if key in released:
-                continue
-            released.add(key)
-            producer = self.workflow.find_task_by_name(key[0], key[1])
+    def release_references(self) -> None:
+        for _, producer in self._producers():
             if producer:
                 producer.decrement_reference_count()
 
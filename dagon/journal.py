@@ -0,0 +1,326 @@
+"""Append-only journal behind ``Workflow.checkpoints``.
+
+The checkpoint of a workflow maps ``<workflow>.<task>`` keys to the record of
+each task.  Instead of rewriting the whole JSON file after every change, each
+change is appended as one JSON line to ``<checkpoint_file>.journal``.  A writer
+thread takes every line queued since its last write, appends them in one write
+and calls ``fsync`` once, so concurrent tasks share the cost of a flush.
+
+When the journal holds more lines than the snapshot has records, the writer
+compacts it: the records are written to ``<checkpoint_file>`` (a temporary file
+renamed over the old one) and the journal starts again.  The snapshot keeps the
+JSON layout of earlier releases plus a ``_journal`` generation number; a
+journal is replayed only on top of the snapshot of its own generation, so a
+crash between the rename and the truncation does not apply old lines twice.
+A last line torn by a crash is ignored.  Keys starting with ``_``, such as the
+generation or ``_scratch_dir``, hold metadata and are skipped by the readers of
+task records, see :func:`is_metadata`.
+
+Checkpoint files named ``*.db``, ``*.sqlite`` or ``*.sqlite3`` (or any file
+when ``[checkpoint] backend=sqlite``) are kept in SQLite instead, see
+:mod:`dagon.checkpoint_db`.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional
+
+#: Snapshot key holding the generation of the journal written after it.
+GENERATION = "_journal"
+
+# Journals shorter than this are not compacted, whatever the snapshot size
+_MIN_COMPACT = 1000
+
+
+#: File extensions that select the SQLite backend.
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+_SQLITE_MAGIC = b"SQLite format 3\x00"
+
+
+def is_sqlite(path: str, backend: Optional[str] = None) -> bool:
+    """Return True if the checkpoint *path* is kept in SQLite."""
+    if backend:
+        if backend not in ("json", "sqlite"):
+            raise ValueError("Unknown checkpoint backend %s" % backend)
+        return backend == "sqlite"
+    if os.path.isfile(path):
+        with open(path, "rb") as fp:
+            header = fp.read(len(_SQLITE_MAGIC))
+        if header:
+            return header == _SQLITE_MAGIC
+    return path.lower().endswith(SQLITE_EXTENSIONS)
+
+
+def store_for(path: Optional[str], backend: Optional[str] = None) -> "CheckpointStore":
+    """
+    Return an empty store of the backend of the checkpoint file *path*
+
+    :param path: checkpoint file, None for a store that is never persisted
+    :type path: str
+
+    :param backend: ``json`` or ``sqlite``; by default chosen from *path*
+    :type backend: str
+    """
+    if path is not None and is_sqlite(path, backend):
+        from dagon.checkpoint_db import SQLiteCheckpointStore
+        return SQLiteCheckpointStore()
+    return CheckpointStore()
+
+
+def is_metadata(key: str) -> bool:
+    """Return True if the checkpoint *key* holds metadata, such as :data:`GENERATION`, rather than a task record."""
+    return key.startswith("_")
+
+
+def journal_path(path: str) -> str:
+    """Return the journal file that goes with the snapshot *path*."""
+    return path + ".journal"
+
+
+def _write_atomic(path: str, text: str) -> None:
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, "w") as fp:
+        fp.write(text)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temporary, path)
+
+
+def _apply(records: Dict[str, Any], entry: Mapping[str, Any]) -> None:
+    key = entry["key"]
+    if "set" in entry:
+        records[key] = entry["set"]
+    elif "update" in entry:
+        record = records.get(key)
+        if not isinstance(record, dict):
+            record = records[key] = {}
+        record.update(entry["update"])
+    elif entry.get("delete"):
+        records.pop(key, None)
+
+
+def load(path: str, workflow: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read a checkpoint snapshot and replay its journal
+
+    :param path: checkpoint file
+    :type path: str
+
+    :param workflow: in a SQLite checkpoint shared by several workflows, read only this one
+    :type workflow: str
+
+    :return: checkpoint records, empty when neither file exists
+    :rtype: dict(str, object)
+    """
+    if is_sqlite(path):
+        from dagon.checkpoint_db import load as load_sqlite
+        return load_sqlite(path, workflow)
+    records: Dict[str, Any] = {}
+    if os.path.isfile(path) and os.stat(path).st_size > 0:
+        with open(path, "r") as fp:
+            records = json.load(fp)
+    generation = records.pop(GENERATION, 0)
+    journal = journal_path(path)
+    if not os.path.isfile(journal):
+        return records
+    with open(journal, "r") as fp:
+        lines = fp.read().splitlines()
+    if not lines:
+        return records
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        return records
+    if header.get("generation") != generation:
+        # The snapshot was compacted after this journal was written
+        return records
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            break
+        _apply(records, entry)
+    return records
+
+
+class CheckpointStore(dict):
+    """
+    **Checkpoint records of a workflow**
+
+    A dict from checkpoint keys to task records. Assigning a key, deleting it
+    or calling :meth:`record` is journaled once the store was attached to a
+    file with :meth:`open`; changing a nested record in place is not, use
+    :meth:`record` for that.
+    """
+
+    def __init__(self, records: Optional[Mapping[str, Any]] = None) -> None:
+        """
+        :param records: initial records
+        :type records: dict(str, object)
+        """
+        dict.__init__(self, records or {})
+        self.path: Optional[str] = None
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._pending: List[str] = []
+        self._queued = 0
+        self._written = 0
+        self._lines = 0
+        self._generation = 0
+        self._compact = False
+        self._compacting = False
+        self._closing = False
+        self._writer: Optional[threading.Thread] = None
+        # Histogram observing the seconds each write takes, see dagon.metrics
+        self.write_latency: Optional[Any] = None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        with self._lock:
+            dict.__setitem__(self, key, value)
+            self._append({"key": key, "set": value})
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            dict.__delitem__(self, key)
+            self._append({"key": key, "delete": True})
+
+    def record(self, key: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Merge *fields* into the record of *key*, creating it if needed
+
+        :param key: checkpoint key, ``<workflow>.<task>``
+        :type key: str
+
+        :return: the updated record
+        :rtype: dict(str, object)
+        """
+        with self._lock:
+            record = dict.get(self, key)
+            if not isinstance(record, dict):
+                record = {}
+                dict.__setitem__(self, key, record)
+            record.update(fields)
+            self._append({"key": key, "update": fields})
+            return record
+
+    def reset(self, records: Mapping[str, Any]) -> None:
+        """Replace every record, for example with the ones of a resumed checkpoint."""
+        with self._lock:
+            dict.clear(self)
+            dict.update(self, records)
+            self._request_compaction()
+
+    def _append(self, entry: Mapping[str, Any]) -> None:
+        if self.path is None:
+            return
+        self._pending.append(json.dumps(entry, sort_keys=True))
+        self._queued += 1
+        self._changed.notify_all()
+
+    def _request_compaction(self) -> None:
+        if self.path is None:
+            return
+        self._compact = True
+        self._changed.notify_all()
+
+    def open(self, path: str, workflow: Optional[str] = None) -> None:
+        """
+        Persist the records to *path* and journal every later change
+
+        The current records are written as the first snapshot.
+
+        :param path: checkpoint file
+        :type path: str
+
+        :param workflow: name of the workflow owning the records
+        :type workflow: str
+        """
+        self.close()
+        with self._lock:
+            self.path = path
+            self._closing = False
+            self._generation = 0
+            self._write_snapshot(*self._snapshot())
+            self._writer = threading.Thread(target=self._write_loop, name="DAGonStar-checkpoint-journal",
+                                            daemon=True)
+            self._writer.start()
+
+    def flush(self) -> None:
+        """Block until every change made so far is on disk and due compactions ended."""
+        with self._lock:
+            target = self._queued
+            while self._writer is not None and self._writer.is_alive() and \
+                    (self._written < target or self._compact or self._compacting):
+                self._changed.wait(0.5)
+
+    def close(self) -> None:
+        """Flush, compact the journal into the snapshot and stop journaling."""
+        with self._lock:
+            writer = self._writer
+            if writer is None:
+                return
+            self._closing = True
+            self._changed.notify_all()
+        writer.join()
+        with self._lock:
+            self._write_snapshot(*self._snapshot())
+            self._writer = None
+            self.path = None
+
+    def dump(self, path: str) -> None:
+        """Write a copy of the records to *path* as indented JSON."""
+        with self._lock:
+            text = json.dumps(self, sort_keys=True, indent=4)
+        _write_atomic(path, text)
+
+    def _snapshot(self) -> Any:
+        # Called with the lock held: the pending lines are part of the snapshot
+        self._generation += 1
+        snapshot = dict(self)
+        snapshot[GENERATION] = self._generation
+        self._pending = []
+        self._compact = False
+        self._compacting = True
+        return json.dumps(snapshot, sort_keys=True, indent=4), self._generation, self._queued
+
+    def _write_snapshot(self, text: str, generation: int, queued: int) -> None:
+        _write_atomic(self.path, text)
+        _write_atomic(journal_path(self.path), json.dumps({"generation": generation}) + "\n")
+        with self._lock:
+            self._written = queued
+            self._lines = 0
+            self._compacting = False
+            self._changed.notify_all()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending and not self._compact and not self._closing:
+                    self._changed.wait()
+                if self._compact:
+                    snapshot = self._snapshot()
+                else:
+                    snapshot = None
+                    lines, self._pending = self._pending, []
+                    queued = self._queued
+                    if not lines and self._closing:
+                        return
+            if snapshot is not None:
+                self._write_snapshot(*snapshot)
+                continue
+            start_time = time.monotonic()
+            with open(journal_path(self.path), "a") as fp:
+                fp.write("\n".join(lines) + "\n")
+                fp.flush()
+                os.fsync(fp.fileno())
+            if self.write_latency is not None:
+                self.write_latency.observe(time.monotonic() - start_time)
+            with self._lock:
+                self._written = queued
+                self._lines += len(lines)
+                if self._lines > max(_MIN_COMPACT, len(self)):
+                    self._compact = True
+                self._changed.notify_all()
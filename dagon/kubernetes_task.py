@@ -20,6 +20,8 @@ class KubernetesTask(Batch):
     Inherits from Batch to integrate with Dagon's task workflow.
     """
 
+    pool = "container"
+
     def __new__(cls, *args, **kwargs):
         """
         Factory method to create RemoteKubernetesTask if 'ip' is provided.
@@ -164,30 +166,31 @@ class KubernetesTask(Batch):
         if volumes:
             pod_manifest["spec"]["volumes"] = volumes
 
-        try:
-            self.v1.create_namespaced_pod(namespace=self.namespace, body=pod_manifest)
-            print(f"Pod created: {self.pod_name}")
-        except Exception as e:
-            print(f"Error creating pod {self.pod_name}: {e}")
-
-        # Wait for the pod to be in 'Running' state and get IP
-        print(f"Waiting for pod {self.pod_name} to be ready...")
-        while True:
-            pod = self.v1.read_namespaced_pod(name=self.pod_name, namespace=self.namespace)
-            if pod.status.phase == "Running":
-                pod_ip = pod.status.pod_ip
-                print(f"Pod {self.pod_name} ready with IP: {pod_ip}")
-                # Configure pod information that Dagon needs
-                self.info = {
-                    'name': self.name,
-                    'ip': pod_ip,
-                    'pod_name': self.pod_name,
-                    'namespace': self.namespace
-                }
-                break
-            elif pod.status.phase == "Failed":
-                raise Exception(f"Pod {self.pod_name} failed: {pod.status.message}")
-            time.sleep(0.5)
+        with self.trace("pod_create", namespace=self.namespace):
+            try:
+                self.v1.create_namespaced_pod(namespace=self.namespace, body=pod_manifest)
+                print(f"Pod created: {self.pod_name}")
+            except Exception as e:
+                print(f"Error creating pod {self.pod_name}: {e}")
+
+            # Wait for the pod to be in 'Running' state and get IP
+            print(f"Waiting for pod {self.pod_name} to be ready...")
+            while True:
+                pod = self.v1.read_namespaced_pod(name=self.pod_name, namespace=self.namespace)
+                if pod.status.phase == "Running":
+                    pod_ip = pod.status.pod_ip
+                    print(f"Pod {self.pod_name} ready with IP: {pod_ip}")
+                    # Configure pod information that Dagon needs
+                    self.info = {
+                        'name': self.name,
+                        'ip': pod_ip,
+                        'pod_name': self.pod_name,
+                        'namespace': self.namespace
+                    }
+                    break
+                elif pod.status.phase == "Failed":
+                    raise Exception(f"Pod {self.pod_name} failed: {pod.status.message}")
+                time.sleep(0.5)
 
     def exec_in_pod(self, command):
         """
@@ -418,6 +421,8 @@ class RemoteKubernetesTask(RemoteTask, KubernetesTask):
     pod execution on remote Kubernetes clusters.
     """
 
+    pool = "container"
+
     def __init__(self, name, command, image="ubuntu:20.04", namespace="default",
                  ip=None, ssh_username=None, keypath=None, ssh_port=22,
                  working_dir=None, remove=False, transversal_workflow=None,
@@ -581,40 +586,41 @@ class RemoteKubernetesTask(RemoteTask, KubernetesTask):
             write_cmd = f"cat > {manifest_path} << 'EOF'\n{escaped_json}\nEOF"
             self.ssh_connection.execute_command(write_cmd)
 
-            # Create pod using kubectl
-            create_cmd = f"kubectl apply -f {manifest_path} -n {self.namespace}"
-            self._run_kubectl_command(create_cmd)
+            with self.trace("pod_create", namespace=self.namespace):
+                # Create pod using kubectl
+                create_cmd = f"kubectl apply -f {manifest_path} -n {self.namespace}"
+                self._run_kubectl_command(create_cmd)
 
-            # Clean up manifest file
-            self.ssh_connection.execute_command(f"rm -f {manifest_path}")
+                # Clean up manifest file
+                self.ssh_connection.execute_command(f"rm -f {manifest_path}")
 
-            # Wait for pod to be ready
-            print(f"Waiting for remote pod {self.pod_name} to be ready...")
-            max_wait = 300
-            for _ in range(max_wait):
-                check_cmd = f"kubectl get pod {self.pod_name} -n {self.namespace} -o jsonpath='{{.status.phase}}'"
-                phase = self._run_kubectl_command(check_cmd).strip()
+                # Wait for pod to be ready
+                print(f"Waiting for remote pod {self.pod_name} to be ready...")
+                max_wait = 300
+                for _ in range(max_wait):
+                    check_cmd = f"kubectl get pod {self.pod_name} -n {self.namespace} -o jsonpath='{{.status.phase}}'"
+                    phase = self._run_kubectl_command(check_cmd).strip()
                 
-                if phase == "Running":
-                    # Get pod IP
-                    ip_cmd = f"kubectl get pod {self.pod_name} -n {self.namespace} -o jsonpath='{{.status.podIP}}'"
-                    pod_ip = self._run_kubectl_command(ip_cmd).strip()
-                    print(f"Remote pod {self.pod_name} ready with IP: {pod_ip}")
+                    if phase == "Running":
+                        # Get pod IP
+                        ip_cmd = f"kubectl get pod {self.pod_name} -n {self.namespace} -o jsonpath='{{.status.podIP}}'"
+                        pod_ip = self._run_kubectl_command(ip_cmd).strip()
+                        print(f"Remote pod {self.pod_name} ready with IP: {pod_ip}")
                     
-                    self.info = {
-                        'name': self.name,
-                        'ip': pod_ip,
-                        'pod_name': self.pod_name,
-                        'namespace': self.namespace,
-                        'remote_ip': self.ip
-                    }
-                    break
-                elif phase == "Failed":
-                    raise Exception(f"Remote pod {self.pod_name} failed")
+                        self.info = {
+                            'name': self.name,
+                            'ip': pod_ip,
+                            'pod_name': self.pod_name,
+                            'namespace': self.namespace,
+                            'remote_ip': self.ip
+                        }
+                        break
+                    elif phase == "Failed":
+                        raise Exception(f"Remote pod {self.pod_name} failed")
                 
-                time.sleep(1)
-            else:
-                raise Exception(f"Timeout waiting for pod {self.pod_name} to be ready")
+                    time.sleep(1)
+                else:
+                    raise Exception(f"Timeout waiting for pod {self.pod_name} to be ready")
 
     def exec_in_pod(self, command):
         """
@@ -2,19 +2,18 @@
 
 import json
 import os
-import re
 import shutil
 from pathlib import Path
-from typing import Any, Dict, Iterable, Mapping, Optional, Tuple, Union
+from typing import Any, Dict, Mapping, Optional, Tuple, Union
 from urllib.error import HTTPError, URLError
 from urllib.request import Request, urlopen
 
 import dagon
+from dagon.references import WorkflowReference, parse_reference, scan_value
 from dagon.task import ExecutionResult, Task
 
 
 JsonValue = Union[Dict[str, Any], list, str, int, float, bool, None]
-_WORKFLOW_REFERENCE = re.compile(r"workflow://[^\s\"'\],}]+")
 
 
 class _PromptValues(dict):
@@ -33,6 +32,8 @@ class LLMTask(Task):
     the staged UTF-8 file content is made available to that placeholder.
     """
 
+    pool = "service"
+
     def __init__(
             self,
             name: str,
@@ -66,7 +67,6 @@ class LLMTask(Task):
         self.input_files = dict(input_files or {})
         self.output_file = output_file
         self.timeout = timeout
-        self.result: Optional[Dict[str, Any]] = None
 
     def as_json(self) -> Dict[str, Any]:
         """Return a workflow-schema representation that can recreate this task."""
@@ -80,34 +80,26 @@ class LLMTask(Task):
         })
         return task
 
-    def _references(self) -> Iterable[str]:
-        values = list(self.input_files.values()) + [json.dumps(self.prompt)]
-        seen = set()
-        for value in values:
-            for reference in _WORKFLOW_REFERENCE.findall(value):
-                if reference not in seen:
-                    seen.add(reference)
-                    yield reference
-
     @staticmethod
-    def _parse_reference(reference: str) -> Tuple[str, str, str]:
-        value = reference[len(dagon.Workflow.SCHEMA):]
-        pieces = value.split("/")
-        if len(pieces) < 3 or not pieces[1] or not "/".join(pieces[2:]):
+    def _parse_reference(reference: str) -> WorkflowReference:
+        parsed = parse_reference(reference)
+        if not parsed.task or not parsed.path:
             raise ValueError("Invalid workflow input reference: %s" % reference)
-        relative_path = "/".join(pieces[2:])
-        if Path(relative_path).is_absolute() or ".." in Path(relative_path).parts:
+        if Path(parsed.path).is_absolute() or ".." in Path(parsed.path).parts:
             raise ValueError("LLM input reference must stay inside the producer directory: %s" % reference)
-        return pieces[0], pieces[1], relative_path
+        return parsed
+
+    def _scan_references(self) -> Tuple[WorkflowReference, ...]:
+        values = list(self.input_files.values()) + [json.dumps(self.prompt)]
+        return tuple(self._parse_reference(reference.raw) for reference in scan_value(values))
 
     def pre_run(self) -> None:
         """Infer dependencies from declared LLM input-file references."""
-        for reference in self._references():
-            workflow_name, task_name, _ = self._parse_reference(reference)
-            workflow_name = workflow_name or self.workflow.name
-            task = self.workflow.find_task_by_name(workflow_name, task_name)
+        for reference in self.get_references():
+            workflow_name = reference.workflow_name(self.workflow.name)
+            task = self.resolve_reference(reference)
             if task is None:
-                raise ValueError("LLM input producer was not found: %s" % reference)
+                raise ValueError("LLM input producer was not found: %s" % reference.raw)
             if workflow_name == self.workflow.name:
                 self.add_dependency_to(task)
             else:
@@ -119,16 +111,16 @@ class LLMTask(Task):
         values: Dict[str, str] = {}
         reference_values: Dict[str, str] = {}
         parameter_by_reference = {reference: parameter for parameter, reference in self.input_files.items()}
-        for reference in self._references():
-            workflow_name, task_name, relative_path = self._parse_reference(reference)
-            workflow_name = workflow_name or self.workflow.name
-            producer = self.workflow.find_task_by_name(workflow_name, task_name)
+        for parsed in self.get_references():
+            reference = parsed.raw
+            producer = self.resolve_reference(parsed)
             if producer is None or producer.working_dir is None:
                 raise ValueError("LLM input producer is unavailable: %s" % reference)
-            source = Path(producer.working_dir, relative_path)
+            source = Path(producer.working_dir, parsed.path)
             if not source.is_file():
                 raise FileNotFoundError("LLM input file does not exist: %s" % source)
-            destination = Path(self.working_dir, ".dagon", "inputs", workflow_name, task_name, relative_path)
+            destination = Path(self.working_dir, ".dagon", "inputs", parsed.workflow_name(self.workflow.name),
+                               parsed.task, parsed.path)
             destination.parent.mkdir(parents=True, exist_ok=True)
             shutil.copy2(str(source), str(destination))
             try:
@@ -213,7 +205,7 @@ class LLMTask(Task):
                 output = Path(self.working_dir, self.output_file)
                 output.parent.mkdir(parents=True, exist_ok=True)
                 output.write_text(json.dumps(self.result, indent=2, sort_keys=True) + "\n", encoding="utf-8")
-                self.workflow.checkpoints[key]["code"] = 0
+                self.workflow.checkpoints.record(key, code=0)
         self.workflow._fire_event("on_task_staging_out_start", self)
         try:
             self.remove_reference_workflow()
@@ -0,0 +1,258 @@
+"""Live engine metrics in the Prometheus text exposition format.
+
+Every workflow owns a :class:`Metrics` registry (``workflow.metrics``) updated
+from the task lifecycle: tasks by status, per-phase latency histograms, bytes
+staged per :class:`dagon.DataMover` and checkpoint write latency.  Queue depth
+and running tasks per backend pool come from the workflow executor, and open
+SSH connections from :mod:`dagon.communication.ssh`, when :meth:`Metrics.render`
+is called.  :class:`dagon.api.server.WorkflowServer` serves it at ``/metrics``.
+
+Updates are lock-free: each thread changes only its own shard of a metric, and
+a scrape adds the shards up.  Shards of threads that ended are folded into
+one when the next scrape finds them, so task threads do not accumulate.
+"""
+
+import bisect
+import glob
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dagon.incremental import signature
+
+Labels = Tuple[str, ...]
+
+#: Upper bounds, in seconds, of the buckets of task phase latencies.
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 10800.0)
+
+#: Upper bounds, in seconds, of the buckets of checkpoint write latencies.
+WRITE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+#: Content type of :meth:`Metrics.render`.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Sharded(object):
+    """Values by label tuple, kept in one shard per writing thread."""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, Dict[Labels, Any]]] = []
+        self._retired: Dict[Labels, Any] = {}
+
+    def _shard(self) -> Dict[Labels, Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _merge(self, total: Dict[Labels, Any], values: Dict[Labels, Any]) -> None:
+        raise NotImplementedError
+
+    def collect(self) -> Dict[Labels, Any]:
+        """Return the values of every thread added up, by label tuple."""
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = alive
+            total: Dict[Labels, Any] = {}
+            self._merge(total, self._retired)
+            for _, shard in alive:
+                self._merge(total, shard.copy())
+            return total
+
+
+class Counter(_Sharded):
+    """Sum of the amounts added by every thread; negative amounts make it a gauge."""
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, total: Dict[Labels, Any], values: Dict[Labels, Any]) -> None:
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+
+class Histogram(_Sharded):
+    """Observations counted in cumulative ``le`` buckets, with their sum and count."""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (),
+                 buckets: Iterable[float] = PHASE_BUCKETS) -> None:
+        _Sharded.__init__(self, name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        shard = self._shard()
+        cells = shard.get(labels)
+        if cells is None:
+            # One cell per bucket, then +Inf, sum and count
+            cells = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        cells[bisect.bisect_left(self.buckets, value)] += 1
+        cells[-2] += value
+        cells[-1] += 1
+
+    def _merge(self, total: Dict[Labels, Any], values: Dict[Labels, Any]) -> None:
+        for labels, cells in values.items():
+            cells = list(cells)
+            current = total.get(labels)
+            total[labels] = cells if current is None else [a + b for a, b in zip(current, cells)]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[Any]) -> str:
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_family(lines: List[str], metric_type: str, name: str, help_text: str,
+                   samples: Iterable[Tuple[str, Dict[str, Any], float]]) -> None:
+    lines.append("# HELP %s %s" % (name, help_text))
+    lines.append("# TYPE %s %s" % (name, metric_type))
+    for suffix, labels, value in samples:
+        lines.append("%s%s%s %s" % (name, suffix, _labels(labels.keys(), labels.values()), _number(value)))
+
+
+def _render(lines: List[str], metric: _Sharded, metric_type: str) -> None:
+    samples = []
+    for labels, value in sorted(metric.collect().items()):
+        named = dict(zip(metric.labels, labels))
+        if not isinstance(metric, Histogram):
+            samples.append(("", named, value))
+            continue
+        cumulative = 0
+        for bound, count in zip(metric.buckets + (float("inf"),), value):
+            cumulative += count
+            samples.append(("_bucket", dict(named, le="+Inf" if bound == float("inf") else repr(bound)), cumulative))
+        samples.append(("_sum", named, value[-2]))
+        samples.append(("_count", named, value[-1]))
+    _render_family(lines, metric_type, metric.name, metric.help, samples)
+
+
+def open_ssh_connections() -> int:
+    """Return the SSH connections of this process that are open; 0 when SSH was never used."""
+    ssh = sys.modules.get("dagon.communication.ssh")
+    return ssh.open_connections() if ssh is not None else 0
+
+
+def staged_size(source: str) -> Optional[int]:
+    """Return the bytes under a local staging source, which may be a glob pattern; None when nothing matches."""
+    sizes = [signature(match) for match in glob.glob(source)] if glob.has_magic(source) else [signature(source)]
+    sizes = [size[0] for size in sizes if size is not None]
+    return sum(sizes) if sizes else None
+
+
+class Metrics(object):
+    """Metrics of one workflow."""
+
+    def __init__(self, workflow: Any) -> None:
+        """
+        :param workflow: observed workflow
+        :type workflow: :class:`dagon.Workflow`
+        """
+        self.workflow = workflow
+        self.tasks = Counter("dagon_tasks", "Tasks of the workflow by status.", ("status",))
+        self.phases = Histogram("dagon_task_phase_seconds", "Duration of task execution phases.", ("phase",))
+        self.staged_bytes = Counter("dagon_staged_bytes_total",
+                                    "Bytes of local sources staged in, by data mover.", ("mover",))
+        self.transfers = Counter("dagon_staging_transfers_total", "Staging transfers generated, by data mover.",
+                                 ("mover",))
+        self.checkpoint_writes = Histogram("dagon_checkpoint_write_seconds",
+                                           "Duration of checkpoint journal appends and commits.",
+                                           buckets=WRITE_BUCKETS)
+        self.speculations = Counter("dagon_speculative_attempts_total",
+                                    "Duplicate attempts of straggling tasks, by outcome.", ("outcome",))
+        self._started: Dict[Tuple[Any, str], float] = {}
+        # Bytes of the sources measured during the current run
+        self._sizes: Dict[str, Optional[int]] = {}
+        for event_name, listener in self._listeners().items():
+            workflow.add_listener(event_name, listener)
+
+    def _listeners(self) -> Dict[str, Any]:
+        return {
+            "on_workflow_start": lambda workflow: self._sizes.clear(),
+            "on_task_start": lambda task: self._begin(task, "task"),
+            "on_task_end": lambda task: self._end(task, "task"),
+            "on_task_staging_in_start": lambda task: self._begin(task, "stage_in"),
+            "on_task_staging_in_end": lambda task: self._end(task, "stage_in"),
+            "on_task_staging_out_start": lambda task: self._begin(task, "stage_out"),
+            "on_task_staging_out_end": lambda task: self._end(task, "stage_out"),
+        }
+
+    def _begin(self, task: Any, phase: str) -> None:
+        self._started[(task, phase)] = time.monotonic()
+
+    def _end(self, task: Any, phase: str) -> None:
+        started = self._started.pop((task, phase), None)
+        if started is not None:
+            self.phases.observe(time.monotonic() - started, (phase,))
+
+    def status_changed(self, old: Any, new: Any) -> None:
+        """Move a task from status *old* (None for a new task) to *new*."""
+        if old is not None:
+            self.tasks.inc((old.name,), -1)
+        self.tasks.inc((new.name,))
+
+    def source_size(self, source: str) -> Optional[int]:
+        """
+        Return the bytes of the local staging *source*, see :func:`staged_size`
+
+        Each source is measured once per run, however many consumers stage it in.
+        """
+        if source not in self._sizes:
+            self._sizes[source] = staged_size(source)
+        return self._sizes[source]
+
+    def staged(self, data_mover: Any, size: Optional[int]) -> None:
+        """
+        Count a staging transfer generated with *data_mover*
+
+        :param size: bytes of the source, see :func:`staged_size`; None when they are unknown
+        :type size: int
+        """
+        mover = getattr(data_mover, "name", str(data_mover))
+        self.transfers.inc((mover,))
+        if size is not None:
+            self.staged_bytes.inc((mover,), size)
+
+    def render(self) -> str:
+        """
+        Return the metrics in the Prometheus text exposition format
+
+        :return: exposition text, see :data:`CONTENT_TYPE`
+        :rtype: str
+        """
+        lines: List[str] = []
+        _render(lines, self.tasks, "gauge")
+        stats = self.workflow.executor.stats()
+        _render_family(lines, "gauge", "dagon_ready_tasks",
+                       "Tasks whose producers ended, waiting for an execution slot.",
+                       [("", {}, stats["queued"])])
+        _render_family(lines, "gauge", "dagon_running_tasks", "Running tasks by backend pool.",
+                       [("", {"pool": pool}, values["running"]) for pool, values in stats["pools"].items()])
+        _render(lines, self.phases, "histogram")
+        _render(lines, self.staged_bytes, "counter")
+        _render(lines, self.transfers, "counter")
+        _render_family(lines, "gauge", "dagon_ssh_connections_open", "Open SSH connections of the process.",
+                       [("", {}, open_ssh_connections())])
+        _render(lines, self.checkpoint_writes, "histogram")
+        _render(lines, self.speculations, "counter")
+        return "\n".join(lines) + "\n"
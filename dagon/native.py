@@ -12,6 +12,7 @@ from typing import Any, Dict, Iterable, Mapping, Optional, Tuple, Union
 
 import dagon
 from dagon.batch import Slurm
+from dagon.references import WorkflowReference, parse_reference, unique
 from dagon.shell import join_command
 from dagon.task import Task
 
@@ -98,29 +99,30 @@ class NativeTask(Task):
                     raise ValueError("Native scalar input %r must be JSON-serializable" % name) from exc
 
     @staticmethod
-    def _parse_reference(reference: str) -> Tuple[str, str, str]:
-        value = reference[len(dagon.Workflow.SCHEMA):]
-        pieces = value.split("/")
-        if len(pieces) < 3 or not pieces[1] or not "/".join(pieces[2:]):
+    def _parse_reference(reference: str) -> WorkflowReference:
+        parsed = parse_reference(reference)
+        if not parsed.task or not parsed.path:
             raise ValueError("Invalid native workflow input reference: %s" % reference)
-        return pieces[0], pieces[1], NativeTask._relative("/".join(pieces[2:]), "input")
+        return parsed._replace(path=NativeTask._relative(parsed.path, "input"))
 
-    def _file_inputs(self) -> Iterable[Tuple[str, str, Optional[Tuple[str, str, str]]]]:
+    def _scan_references(self) -> Tuple[WorkflowReference, ...]:
+        return unique(self._parse_reference(value) for value in self.inputs.values()
+                      if isinstance(value, str) and value.startswith(dagon.Workflow.SCHEMA))
+
+    def _file_inputs(self) -> Iterable[Tuple[str, str, Optional[WorkflowReference]]]:
+        parsed = {reference.raw: reference for reference in self.get_references()}
         for name, value in self.inputs.items():
-            if isinstance(value, str) and value.startswith(dagon.Workflow.SCHEMA):
-                yield name, value, self._parse_reference(value)
+            if isinstance(value, str) and value in parsed:
+                yield name, value, parsed[value]
             elif isinstance(value, str) and Path(value).is_file():
                 yield name, value, None
 
     def pre_run(self) -> None:
-        for _, reference, parsed in self._file_inputs():
-            if parsed is None:
-                continue
-            workflow_name, task_name, _ = parsed
-            workflow_name = workflow_name or self.workflow.name
-            task = self.workflow.find_task_by_name(workflow_name, task_name)
+        for reference in self.get_references():
+            workflow_name = reference.workflow_name(self.workflow.name)
+            task = self.resolve_reference(reference)
             if task is None:
-                raise ValueError("Native input producer was not found: %s" % reference)
+                raise ValueError("Native input producer was not found: %s" % reference.raw)
             if workflow_name == self.workflow.name:
                 self.add_dependency_to(task)
             else:
@@ -138,7 +140,7 @@ class NativeTask(Task):
     def _spec(self) -> Dict[str, Any]:
         bindings: Dict[str, Any] = {}
         for name, value, parsed in self._file_inputs():
-            filename = Path(parsed[2] if parsed else value).name
+            filename = Path(parsed.path if parsed else value).name
             bindings[name] = {"kind": "file", "path": "inputs/%s/%s" % (name, filename)}
         for name, value in self.inputs.items():
             if name not in bindings:
@@ -151,12 +153,10 @@ class NativeTask(Task):
     def _stage_files(self, spec: Mapping[str, Any]) -> None:
         for name, value, parsed in self._file_inputs():
             if parsed:
-                workflow_name, task_name, relative = parsed
-                workflow_name = workflow_name or self.workflow.name
-                producer = self.workflow.find_task_by_name(workflow_name, task_name)
+                producer = self.resolve_reference(parsed)
                 if producer is None or producer.working_dir is None:
                     raise ValueError("Native input producer is unavailable: %s" % value)
-                source = Path(producer.working_dir, relative)
+                source = Path(producer.working_dir, parsed.path)
             else:
                 source = Path(value)
             if not source.is_file():
@@ -173,7 +173,7 @@ class NativeTask(Task):
 
     def execute(self) -> None:
         if self.reuse_checkpoint():
-            self._release_references()
+            self.release_references()
             return
         self.create_working_dir()
         key = self.checkpoint_key()
@@ -203,22 +203,9 @@ class NativeTask(Task):
                                            text=True, capture_output=True)
                 if completed.returncode:
                     raise RuntimeError("Native Slurm function failed: " + completed.stderr)
-            self.workflow.checkpoints[key]["code"] = 0
+            self.workflow.checkpoints.record(key, code=0)
         self.workflow._fire_event("on_task_staging_out_start", self)
         try:
-            for _, _, parsed in self._file_inputs():
-                if parsed:
-                    workflow_name, task_name, _ = parsed
-                    producer = self.workflow.find_task_by_name(workflow_name or self.workflow.name, task_name)
-                    if producer:
-                        producer.decrement_reference_count()
+            self.release_references()
         finally:
             self.workflow._fire_event("on_task_staging_out_end", self)
-
-    def _release_references(self) -> None:
-        for _, _, parsed in self._file_inputs():
-            if parsed:
-                workflow_name, task_name, _ = parsed
-                producer = self.workflow.find_task_by_name(workflow_name or self.workflow.name, task_name)
-                if producer:
-                    producer.decrement_reference_count()
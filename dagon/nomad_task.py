@@ -3,6 +3,7 @@ Nomad Task Module for Dagon Framework
 Provides integration with HashiCorp Nomad for container orchestration
 """
 
+import asyncio
 import os
 import json
 import time
@@ -31,6 +32,8 @@ class NomadTask(Batch):
     :vartype allocation_id: str
     """
 
+    pool = "container"
+
     def __init__(self, name, command, image="ubuntu:22.04", nomad_address="http://localhost:4646",
                  working_dir=None, volume=None, cpu=100, memory=256, 
                  transversal_workflow=None, globusendpoint=None, network_mode="bridge",
@@ -194,6 +197,73 @@ class NomadTask(Batch):
             self.workflow.logger.error(f"{self.name}: Failed to submit job to Nomad: {e}")
             raise Exception(f"Failed to submit Nomad job: {e}")
 
+    def _poll_job(self):
+        """
+        Check the job status once
+
+        :return: Job completion status, or None while the job is still running
+        :rtype: dict
+        """
+
+        # Get job status
+        url = f"{self.nomad_address}/v1/job/{self.job_id}"
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+
+        job_status = response.json()
+        status = job_status.get('Status', 'unknown')
+
+        self.workflow.logger.debug(f"{self.name}: Job status: {status}")
+
+        if status == 'dead':
+            # Job finished, check if successful
+            # Get allocations to check task status
+            allocs_url = f"{self.nomad_address}/v1/job/{self.job_id}/allocations"
+            allocs_response = requests.get(allocs_url, timeout=10)
+            allocs_response.raise_for_status()
+
+            allocations = allocs_response.json()
+
+            if allocations:
+                alloc = allocations[0]
+                self.allocation_id = alloc.get('ID')
+                task_states = alloc.get('TaskStates', {})
+
+                if self.task_name in task_states:
+                    task_state = task_states[self.task_name]
+                    state = task_state.get('State')
+
+                    if state == 'dead':
+                        events = task_state.get('Events', [])
+                        # Check last event
+                        if events:
+                            last_event = events[-1]
+                            event_type = last_event.get('Type')
+
+                            if event_type == 'Terminated':
+                                exit_code = last_event.get('ExitCode', 1)
+
+                                if exit_code == 0:
+                                    self.workflow.logger.info(
+                                        f"{self.name}: Job completed successfully"
+                                    )
+                                    return {'code': 0, 'output': 'Job completed', 'message': 'Success'}
+                                else:
+                                    self.workflow.logger.error(
+                                        f"{self.name}: Job failed with exit code {exit_code}"
+                                    )
+                                    return {'code': exit_code, 'output': 'Job failed',
+                                           'message': f'Job failed with exit code {exit_code}'}
+
+            # If we get here, something went wrong
+            self.workflow.logger.error(f"{self.name}: Job died without proper completion")
+            return {'code': 1, 'output': 'Job died', 'message': 'Job died without proper completion'}
+
+        elif status == 'running':
+            self.workflow.logger.debug(f"{self.name}: Job is running...")
+
+        return None
+
     def _wait_for_completion(self, timeout=3600):
         """
         Wait for job to complete
@@ -212,63 +282,9 @@ class NomadTask(Batch):
         
         while time.time() - start_time < timeout:
             try:
-                # Get job status
-                url = f"{self.nomad_address}/v1/job/{self.job_id}"
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                
-                job_status = response.json()
-                status = job_status.get('Status', 'unknown')
-                
-                self.workflow.logger.debug(f"{self.name}: Job status: {status}")
-                
-                if status == 'dead':
-                    # Job finished, check if successful
-                    # Get allocations to check task status
-                    allocs_url = f"{self.nomad_address}/v1/job/{self.job_id}/allocations"
-                    allocs_response = requests.get(allocs_url, timeout=10)
-                    allocs_response.raise_for_status()
-                    
-                    allocations = allocs_response.json()
-                    
-                    if allocations:
-                        alloc = allocations[0]
-                        self.allocation_id = alloc.get('ID')
-                        task_states = alloc.get('TaskStates', {})
-                        
-                        if self.task_name in task_states:
-                            task_state = task_states[self.task_name]
-                            state = task_state.get('State')
-                            
-                            if state == 'dead':
-                                events = task_state.get('Events', [])
-                                # Check last event
-                                if events:
-                                    last_event = events[-1]
-                                    event_type = last_event.get('Type')
-                                    
-                                    if event_type == 'Terminated':
-                                        exit_code = last_event.get('ExitCode', 1)
-                                        
-                                        if exit_code == 0:
-                                            self.workflow.logger.info(
-                                                f"{self.name}: Job completed successfully"
-                                            )
-                                            return {'code': 0, 'output': 'Job completed', 'message': 'Success'}
-                                        else:
-                                            self.workflow.logger.error(
-                                                f"{self.name}: Job failed with exit code {exit_code}"
-                                            )
-                                            return {'code': exit_code, 'output': 'Job failed', 
-                                                   'message': f'Job failed with exit code {exit_code}'}
-                    
-                    # If we get here, something went wrong
-                    self.workflow.logger.error(f"{self.name}: Job died without proper completion")
-                    return {'code': 1, 'output': 'Job died', 'message': 'Job died without proper completion'}
-                
-                elif status == 'running':
-                    self.workflow.logger.debug(f"{self.name}: Job is running...")
-                
+                result = self._poll_job()
+                if result is not None:
+                    return result
                 time.sleep(check_interval)
                 
             except requests.exceptions.RequestException as e:
@@ -279,6 +295,36 @@ class NomadTask(Batch):
         self.workflow.logger.error(f"{self.name}: Job timeout reached")
         return {'code': 1, 'output': 'Timeout', 'message': 'Job execution timeout'}
 
+    async def _wait_for_completion_async(self, timeout=3600):
+        """
+        Wait for job to complete without holding a thread between status checks
+        
+        :param timeout: Maximum time to wait in seconds
+        :type timeout: int
+        
+        :return: Job completion status
+        :rtype: dict
+        """
+        
+        start_time = time.time()
+        check_interval = 2  # Check every 2 seconds
+        
+        self.workflow.logger.info(f"{self.name}: Waiting for job completion...")
+        
+        while time.time() - start_time < timeout:
+            try:
+                result = await self.run_blocking(self._poll_job)
+                if result is not None:
+                    return result
+                
+            except requests.exceptions.RequestException as e:
+                self.workflow.logger.error(f"{self.name}: Error checking job status: {e}")
+            await asyncio.sleep(check_interval)
+        
+        # Timeout reached
+        self.workflow.logger.error(f"{self.name}: Job timeout reached")
+        return {'code': 1, 'output': 'Timeout', 'message': 'Job execution timeout'}
+
     def _get_logs(self):
         """
         Retrieve logs from completed job
@@ -385,18 +431,51 @@ class NomadTask(Batch):
         
         # Get logs
         if result['code'] == 0:
-            logs = self._get_logs()
-            result['output'] = logs
-            
-            # Save logs to file
-            if self.working_dir:
-                log_file = os.path.join(self.working_dir, ".dagon", "stdout.txt")
-                os.makedirs(os.path.dirname(log_file), exist_ok=True)
-                with open(log_file, 'w') as f:
-                    f.write(logs)
+            self._save_logs(result)
         
         return result
 
+    async def on_execute_async(self, script, script_name):
+        """
+        Execute the task via Nomad, polling the job from the event loop
+        
+        :param script: script content
+        :type script: str
+        
+        :param script_name: script name
+        :type script_name: str
+        
+        :return: execution result
+        :rtype: dict with the execution output (str) and code (int)
+        """
+        
+        os.makedirs(os.path.join(self.working_dir, ".dagon"), exist_ok=True)
+        Task.on_execute(self, script, script_name)
+        
+        result = await self._wait_for_completion_async()
+        
+        if result['code'] == 0:
+            await self.run_blocking(self._save_logs, result)
+        
+        return result
+
+    def _save_logs(self, result):
+        """
+        Retrieve the job logs into the result and save them to the working directory
+        
+        :param result: execution result to update
+        :type result: dict
+        """
+        logs = self._get_logs()
+        result['output'] = logs
+        
+        # Save logs to file
+        if self.working_dir:
+            log_file = os.path.join(self.working_dir, ".dagon", "stdout.txt")
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            with open(log_file, 'w') as f:
+                f.write(logs)
+
     def on_garbage(self):
         """
         Call garbage collector, cleaning up Nomad jobs
@@ -410,6 +489,8 @@ class RemoteNomadTask(RemoteTask, NomadTask):
     Represents a Nomad task running on a remote machine
     """
 
+    pool = "container"
+
     def __init__(self, name, command, image="ubuntu:22.04", nomad_address=None,
                  ip=None, ssh_username=None, keypath=None, working_dir=None,
                  volume=None, cpu=100, memory=256, globusendpoint=None,
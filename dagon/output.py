@@ -0,0 +1,210 @@
+"""Streaming, bounded-memory capture of the output of task launchers.
+
+Model runs can print gigabytes.  Instead of collecting the whole stdout and
+stderr of a launcher with ``communicate()`` or ``readlines()``, an
+:class:`OutputCapture` receives each chunk as it arrives, appends it to the
+stream's file when it has one and keeps only the last ``tail_size`` characters
+of each stream in memory.  The execution result of the task holds those tails,
+which is what error messages need, and :meth:`dagon.task.Task.tail` reads them
+while the task runs.
+
+The launcher itself pipes the command's stdout into ``.dagon/stdout.txt`` on
+the machine that runs it; the capture of a local launcher writes its stderr to
+``.dagon/stderr.txt``.
+
+:meth:`OutputCapture.cancel` stops the command while it runs.  Local commands
+of an ``isolated`` capture run in their own session, so cancelling them stops
+every process the launcher started, not only the shell.
+"""
+
+import asyncio
+import codecs
+import os
+import signal
+import threading
+from subprocess import PIPE, Popen
+from typing import Any, Callable, Dict, IO, List, Mapping, Optional, Sequence
+
+#: Characters of each stream kept in memory when the configuration does not set ``[output] tail_size``.
+DEFAULT_TAIL = 64 * 1024
+
+#: Files of the ``.dagon`` directory that receive the launcher output, by stream.
+STREAM_FILES = {"stdout": "stdout.txt", "stderr": "stderr.txt"}
+
+# Bytes read from a pipe at a time
+_CHUNK = 64 * 1024
+
+
+def read_tail(file_path: str, size: int = DEFAULT_TAIL) -> str:
+    """Return the last *size* bytes of a text file, decoded; empty when it does not exist."""
+    try:
+        with open(file_path, "rb") as fp:
+            fp.seek(0, os.SEEK_END)
+            fp.seek(max(0, fp.tell() - size))
+            return fp.read().decode(errors="replace")
+    except OSError:
+        return ""
+
+
+class _Stream(object):
+    __slots__ = ("file", "decoder", "chunks", "length", "dropped")
+
+    def __init__(self, file: Optional[IO[str]]) -> None:
+        self.file = file
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.chunks: List[str] = []
+        self.length = 0
+        self.dropped = 0
+
+
+class OutputCapture(object):
+    """stdout and stderr of one command: written to files as they arrive, with a bounded tail in memory."""
+
+    def __init__(self, files: Optional[Mapping[str, str]] = None, tail_size: Any = DEFAULT_TAIL) -> None:
+        """
+        :param files: file written with each stream as it arrives, by stream (``stdout`` or ``stderr``)
+        :type files: dict(str, str)
+
+        :param tail_size: characters of each stream kept in memory
+        :type tail_size: int
+        """
+        self.files = dict(files or {})
+        self.tail_size = int(tail_size)
+        # Run local commands in their own session so cancel() reaches all their processes
+        self.isolated = False
+        self.cancelled = False
+        self._cancel: Optional[Callable[[], None]] = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._streams: Dict[str, _Stream] = {}
+        for stream in STREAM_FILES:
+            file = open(self.files[stream], "w") if stream in self.files else None
+            self._streams[stream] = _Stream(file)
+
+    def feed(self, stream: str, data: bytes) -> None:
+        """Add raw bytes read from *stream*; multi-byte characters may span calls."""
+        self.write(stream, self._streams[stream].decoder.decode(data))
+
+    def write(self, stream: str, text: str) -> None:
+        """Add decoded text to *stream*."""
+        if not text:
+            return
+        with self._lock:
+            state = self._streams[stream]
+            if state.file is not None:
+                state.file.write(text)
+                state.file.flush()
+            state.chunks.append(text)
+            state.length += len(text)
+            # Drop whole chunks first, then cut the oldest one
+            while state.chunks and state.length - len(state.chunks[0]) >= self.tail_size:
+                state.length -= len(state.chunks[0])
+                state.dropped += len(state.chunks.pop(0))
+            if state.length > self.tail_size:
+                excess = state.length - self.tail_size
+                state.chunks[0] = state.chunks[0][excess:]
+                state.length -= excess
+                state.dropped += excess
+
+    def tail(self, stream: str = "stdout", size: Optional[int] = None) -> str:
+        """Return the last *size* characters (at most ``tail_size``) of *stream* received so far."""
+        with self._lock:
+            text = "".join(self._streams[stream].chunks)
+        return text if size is None else text[-size:] if size > 0 else ""
+
+    def truncated(self, stream: str = "stdout") -> bool:
+        """Return True if the memory tail of *stream* no longer holds all of it."""
+        return self._streams[stream].dropped > 0
+
+    def on_cancel(self, cancel: Callable[[], None]) -> None:
+        """Set how the running command is stopped, called by the function that runs it."""
+        self._cancel = cancel
+        if self.cancelled:
+            cancel()
+
+    def cancel(self) -> None:
+        """Stop the command if it still runs; its result then holds the output received so far."""
+        self.cancelled = True
+        if self._cancel is not None and not self._closed:
+            self._cancel()
+
+    def close(self) -> None:
+        """Flush the decoders and close the files."""
+        self._closed = True
+        for stream, state in self._streams.items():
+            self.write(stream, state.decoder.decode(b"", final=True))
+            with self._lock:
+                if state.file is not None:
+                    state.file.close()
+                    state.file = None
+
+    def result(self, code: int) -> Dict[str, Any]:
+        """
+        Close the capture and return the execution result of the command
+
+        :param code: exit code of the command
+        :type code: int
+
+        :return: the tails as output and message
+        :rtype: dict() with the execution output (str), code (int) and message (str)
+        """
+        self.close()
+        out, err = self.tail("stdout"), self.tail("stderr")
+        return {"code": code, "message": err if err else (out if code else ""), "output": out}
+
+    def _pump(self, pipe: IO[bytes], stream: str) -> None:
+        with pipe:
+            for data in iter(lambda: pipe.read1(_CHUNK), b""):
+                self.feed(stream, data)
+
+
+def _terminate(pid: int, group: bool) -> None:
+    try:
+        if group:
+            os.killpg(pid, signal.SIGTERM)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run(argv: Sequence[str], capture: OutputCapture) -> Dict[str, Any]:
+    """
+    Run a local command, streaming its output into *capture*
+
+    :param argv: command and arguments
+    :type argv: list(str)
+
+    :param capture: receives stdout and stderr
+    :type capture: :class:`OutputCapture`
+
+    :return: execution result, see :meth:`OutputCapture.result`
+    :rtype: dict(str, object)
+    """
+    process = Popen(argv, stdin=PIPE, stdout=PIPE, stderr=PIPE, close_fds=True, start_new_session=capture.isolated)
+    process.stdin.close()
+    capture.on_cancel(lambda: _terminate(process.pid, capture.isolated))
+    reader = threading.Thread(target=capture._pump, args=(process.stderr, "stderr"), daemon=True)
+    reader.start()
+    capture._pump(process.stdout, "stdout")
+    reader.join()
+    return capture.result(process.wait())
+
+
+async def run_async(argv: Sequence[str], capture: OutputCapture) -> Dict[str, Any]:
+    """Coroutine counterpart of :func:`run` that does not block the event loop."""
+    process = await asyncio.create_subprocess_exec(*argv, stdin=asyncio.subprocess.DEVNULL,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE, close_fds=True,
+                                                   start_new_session=capture.isolated)
+    capture.on_cancel(lambda: _terminate(process.pid, capture.isolated))
+
+    async def pump(reader: asyncio.StreamReader, stream: str) -> None:
+        while True:
+            data = await reader.read(_CHUNK)
+            if not data:
+                return
+            capture.feed(stream, data)
+
+    await asyncio.gather(pump(process.stdout, "stdout"), pump(process.stderr, "stderr"))
+    return capture.result(await process.wait())
@@ -0,0 +1,199 @@
+"""Prefetch of producer outputs to the hosts of their consumers.
+
+Staging normally happens in the launcher of the consumer, after it was
+scheduled, so moving the data between machines sits on the critical path.
+With a :class:`Prefetcher`, the stage-out phase of a producer
+(:meth:`dagon.task.Task.stage_out`) starts pushing the ``workflow://`` paths
+read by each of its consumers whose host differs from its own, as soon as the
+producer ends.  The copies go to the cache ``<scratch_dir_base>/.dagon-prefetch/
+<workflow>/<producer>/`` of the consumer host, once per host and path, through
+the SSH connections of the tasks; a transfer between two remote hosts is
+relayed by the controller.  When the consumer builds its launcher it waits for
+the prefetch of each of its inputs, still running or long done, and stages
+the cached copy with a local ``cp``; a failed prefetch falls back to the
+regular stage-in.
+
+Hosts are only known for batch tasks: the controller for local ``Batch`` and
+``Slurm`` tasks, and the SSH target of remote ones once they are connected.
+Glob patterns are not prefetched.  The caches are removed when the run ends.
+"""
+
+import glob
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from dagon.batch import Batch
+from dagon.remote import RemoteTask
+from dagon.shell import join_command
+from dagon.task import Task
+
+#: Directory of the scratch base of each host where prefetched outputs are cached, by workflow name.
+PREFETCH_CACHE = ".dagon-prefetch"
+#: Transfers running at once.
+DEFAULT_THREADS = 4
+
+#: Host of the tasks that run on the controller or on a file system it shares.
+LOCAL = ("local",)
+
+
+def host(task: Any) -> Optional[Tuple[Any, ...]]:
+    """
+    Return the host whose file system *task* stages its inputs on
+
+    :return: :data:`LOCAL`, the SSH target of a remote task, or None when it is not known
+    :rtype: tuple
+    """
+    # Other task types stage their inputs in their own way
+    if not isinstance(task, Batch) or type(task).pre_process_command is not Task.pre_process_command:
+        return None
+    if isinstance(task, RemoteTask):
+        if task.ssh_connection is None:
+            return None
+        return ("ssh", task.ssh_username, task.ip, task.ssh_port)
+    return LOCAL
+
+
+def _scp(task: Any) -> Any:
+    from dagon.communication.scp import SCPClient
+    return SCPClient(task.ssh_connection.get_connection().get_transport())
+
+
+class Prefetcher(object):
+    """Pushes the outputs of the producers of a workflow to the hosts of their consumers."""
+
+    def __init__(self, workflow: Any, threads: Any = DEFAULT_THREADS) -> None:
+        """
+        :param workflow: workflow whose producers are prefetched
+        :type workflow: :class:`dagon.Workflow`
+
+        :param threads: transfers running at once
+        :type threads: int
+        """
+        self.workflow = workflow
+        self.threads = int(threads)
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._entries: Dict[Tuple[Any, ...], "Future[None]"] = {}
+        # A connected task of each remote host with a cache
+        self._hosts: Dict[Tuple[Any, ...], Any] = {}
+        self._hooks = {"on_workflow_start": self._start, "on_workflow_end": self._end}
+        for event_name, listener in self._hooks.items():
+            workflow.add_listener(event_name, listener)
+
+    def close(self) -> None:
+        """Stop prefetching for the workflow."""
+        self._end(self.workflow)
+        for event_name, listener in self._hooks.items():
+            self.workflow.remove_listener(event_name, listener)
+
+    def _start(self, workflow: Any) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hosts.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="prefetch")
+
+    def _end(self, workflow: Any) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+            hosts = list(self._hosts.values())
+        if pool is None:
+            return
+        pool.shutdown(wait=True)
+        shutil.rmtree(self.cache_dir(), ignore_errors=True)
+        for task in hosts:
+            task.ssh_connection.execute_command(join_command(("rm", "-rf", self.cache_dir())))
+
+    def cache_dir(self) -> str:
+        """Return the cache directory of the workflow, the same path on every host."""
+        return "/".join((self.workflow.get_scratch_dir_base(), PREFETCH_CACHE, self.workflow.name))
+
+    def target(self, producer: Any, path: str) -> str:
+        """Return where the output *path* of *producer* is cached on the consumer hosts."""
+        return "/".join((self.cache_dir(), producer.name, path.strip("/")))
+
+    def push(self, producer: Any) -> List["Future[None]"]:
+        """
+        Start prefetching the outputs of *producer* read by its consumers on other hosts
+
+        :param producer: task that just ended
+        :type producer: :class:`dagon.task.Task`
+
+        :return: the transfers started, which run in the background
+        :rtype: list(:class:`concurrent.futures.Future`)
+        """
+        source = host(producer)
+        if source is None or self.workflow.dry:
+            return []
+        started = []
+        for consumer in list(producer.nexts):
+            destination = host(consumer)
+            if destination is None or destination == source:
+                continue
+            for reference in consumer.get_references():
+                path = reference.path.strip("/")
+                if not path or glob.has_magic(path) or consumer.resolve_reference(reference) is not producer:
+                    continue
+                key = (destination, producer, path)
+                with self._lock:
+                    if self._pool is None or key in self._entries:
+                        continue
+                    future = self._pool.submit(self._copy, producer, consumer, path)
+                    self._entries[key] = future
+                    if destination != LOCAL:
+                        self._hosts.setdefault(destination, consumer)
+                started.append(future)
+        return started
+
+    def claim(self, consumer: Any, producer: Any, path: str) -> Optional[str]:
+        """
+        Wait for the prefetch of the output *path* of *producer* to the host of *consumer*
+
+        :return: the cached copy on the consumer host, None when it was not prefetched or the prefetch failed
+        :rtype: str
+        """
+        path = path.strip("/")
+        with self._lock:
+            future = self._entries.get((host(consumer), producer, path))
+        if future is None:
+            return None
+        try:
+            future.result()
+        except Exception as exc:
+            self.workflow.logger.warning("%s: prefetch of %s from %s failed, staging it in: %s", consumer.name, path,
+                                         producer.name, exc)
+            return None
+        return self.target(producer, path)
+
+    def _copy(self, producer: Any, consumer: Any, path: str) -> None:
+        source = producer.working_dir + "/" + path
+        target = self.target(producer, path)
+        folder = posixpath.dirname(target)
+        with producer.trace("prefetch", consumer=consumer.name):
+            if isinstance(producer, RemoteTask) and isinstance(consumer, RemoteTask):
+                # Relayed by the controller, which reaches both hosts
+                os.makedirs(self.cache_dir(), exist_ok=True)
+                relay = tempfile.mkdtemp(prefix=".relay-", dir=self.cache_dir())
+                try:
+                    _scp(producer).get(source, relay, recursive=True)
+                    self._put(consumer, os.path.join(relay, posixpath.basename(path)), folder)
+                finally:
+                    shutil.rmtree(relay, ignore_errors=True)
+            elif isinstance(producer, RemoteTask):
+                os.makedirs(folder, exist_ok=True)
+                _scp(producer).get(source, folder, recursive=True)
+            else:
+                # Hosts differ, so the consumer is remote
+                self._put(consumer, source, folder)
+        self.workflow.logger.debug("%s: prefetched %s for %s", producer.name, path, consumer.name)
+
+    @staticmethod
+    def _put(consumer: Any, source: str, folder: str) -> None:
+        result = consumer.ssh_connection.execute_command(join_command(("mkdir", "-p", folder)))
+        if result["code"]:
+            raise IOError("Cannot create %s: %s" % (folder, result["message"]))
+        _scp(consumer).put(source, folder, recursive=True)
@@ -0,0 +1,97 @@
+"""Parsing of ``workflow://`` references.
+
+A reference ``workflow://<workflow>/<task>/<path>`` names a file produced by
+another task; an empty workflow name means the workflow of the referencing
+task.  Tasks parse their references once into an immutable table
+(:meth:`dagon.task.Task.get_references`) that dependency resolution, staging
+and reference counting share instead of re-scanning the command each time.
+"""
+
+import re
+from typing import Any, Callable, Iterable, NamedTuple, Tuple
+
+SCHEMA = "workflow://"
+
+# References embedded in structured values (JSON specifications, prompts)
+_STRUCTURED_REFERENCE = re.compile(r"workflow://[^\s\"'\],}]+")
+
+
+class WorkflowReference(NamedTuple):
+    """One parsed ``workflow://`` reference."""
+
+    #: the reference exactly as written, including the schema
+    raw: str
+    #: name of the producer's workflow; empty for the referencing workflow
+    workflow: str
+    #: name of the producer task
+    task: str
+    #: path inside the producer working directory, without leading slash
+    path: str
+
+    def workflow_name(self, default: str) -> str:
+        """Return the producer's workflow name, *default* when it is implicit."""
+        return self.workflow or default
+
+
+def parse_reference(raw: str) -> WorkflowReference:
+    """Split a ``workflow://`` string into its workflow, task and path parts."""
+    elements = raw[len(SCHEMA):].split("/") if raw.startswith(SCHEMA) else raw.split("/")
+    return WorkflowReference(raw, elements[0], elements[1] if len(elements) > 1 else "", "/".join(elements[2:]))
+
+
+def unique(references: Iterable[WorkflowReference]) -> Tuple[WorkflowReference, ...]:
+    """Return *references* without repeated raw strings, keeping first occurrences."""
+    seen = set()
+    table = []
+    for reference in references:
+        if reference.raw not in seen:
+            seen.add(reference.raw)
+            table.append(reference)
+    return tuple(table)
+
+
+def scan_command(command: Any) -> Tuple[WorkflowReference, ...]:
+    """Return the references of a shell command.
+
+    A reference spans from the schema to the next whitespace or the end of the
+    command, as in the generated launcher scripts.
+    """
+    if not isinstance(command, str):
+        return ()
+    found = []
+    pos = command.find(SCHEMA)
+    while pos != -1:
+        end = pos
+        while end < len(command) and not command[end].isspace():
+            end += 1
+        found.append(parse_reference(command[pos:end]))
+        pos = command.find(SCHEMA, end)
+    return unique(found)
+
+
+def scan_value(value: Any, strip: str = "") -> Tuple[WorkflowReference, ...]:
+    """Return the references found in strings nested in dicts, lists and tuples.
+
+    :param strip: trailing punctuation that does not belong to a reference
+    """
+    found = []
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            found.extend(parse_reference(match.rstrip(strip)) for match in _STRUCTURED_REFERENCE.findall(item))
+        elif isinstance(item, dict):
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, (list, tuple)):
+            stack.extend(reversed(item))
+    return unique(found)
+
+
+def substitute(command: str, resolver: Callable[[WorkflowReference], str], terminators: str = "") -> str:
+    """Replace every reference of *command* in one pass.
+
+    :param resolver: returns the replacement text of a parsed reference
+    :param terminators: characters besides whitespace that end a reference
+    """
+    pattern = re.compile(re.escape(SCHEMA) + r"[^\s" + re.escape(terminators) + r"]*")
+    return pattern.sub(lambda match: resolver(parse_reference(match.group(0))), command)
@@ -1,5 +1,5 @@
 from os.path import abspath
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from dagon.communication.ssh import SSHManager
 from dagon.task import ExecutionResult, Task
@@ -27,6 +27,8 @@ class RemoteTask(Task):
     :vartype ssh_connection: :class:`dagon.communication.ssh.SSHManager`
     """
 
+    pool = "ssh"
+
     def __init__(
             self,
             name: str,
@@ -78,6 +80,10 @@ class RemoteTask(Task):
             self.ssh_connection = SSHManager(self.ssh_username, self.ip, 
                                             self.keypath, port=self.ssh_port)
 
+    def context_key(self) -> Tuple[Any, ...]:
+        """Tasks of the same remote machine and user share one context probe"""
+        return ("ssh", self.ssh_username, self.ip, self.ssh_port)
+
     def add_public_key(self, key: str) -> ExecutionResult:
         """
         Add a SSH public key on the remote machine
@@ -135,8 +141,15 @@ class RemoteTask(Task):
         self.working_dir = self.working_dir + "-removed"
         
         # Update the checkpoint
-        self.workflow.checkpoints[self.workflow.name + "." + self.name]["working_dir"] = self.working_dir
+        self.workflow.checkpoints.record(self.checkpoint_key(), working_dir=self.working_dir)
         
+    def discard_working_dir(self) -> None:
+        """
+        Remove the scratch directory of an unused attempt on the remote machine
+        """
+        if self.working_dir is not None:
+            self.ssh_connection.execute_command(join_command(("rm", "-rf", self.working_dir)))
+
     def get_public_key(self) -> str:
         """
         Return the temporal public key to this machine
@@ -144,7 +157,7 @@ class RemoteTask(Task):
         :return: Public ke
         :rtype: str with the public key
         """
-        command = join_command(("cat", self.working_dir + "/.dagon/ssh_key.pub"))
+        command = self.public_key_command()
         result = self.ssh_connection.execute_command(command)
         return result['output']
     
@@ -252,7 +265,8 @@ class CloudTask(RemoteTask):
         """
 
         RemoteTask.on_execute(self, script, script_name)
-        return self.ssh_connection.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)))
+        return self.ssh_connection.execute_command(join_command(("bash", self.working_dir + "/.dagon/" + script_name)),
+                                                   self.open_output(script_name))
 
     def execute(self) -> None:
         """
@@ -0,0 +1,244 @@
+"""Content-addressed cache of task outputs shared across runs and workflows.
+
+A checkpoint only tells a workflow that *its own* task finished before.  The
+result cache stores the working directory of every successful command task
+under a key hashed from what determines its output: the task type, the command,
+the container image and the digests of the files it reads through
+``workflow://`` references.  A later task with the same key, in this or any
+other workflow, gets the stored output hardlinked (or copied) into its working
+directory instead of running again, so changing one input only recomputes the
+tasks downstream of it.
+
+The cache is opt-in through the ``[result_cache]`` configuration section.
+Entries live in ``<path>/<key[:2]>/<key>/``; when their total size exceeds
+``max_size`` the least recently used ones are evicted.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+#: Total size of the entries when the configuration does not set ``[result_cache] max_size``.
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+
+#: Directory of a working directory that is never cached nor digested.
+DAGON_DIR = ".dagon"
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+_ENTRY = "entry.json"
+_OUTPUT = "output"
+_CHUNK = 1024 * 1024
+
+
+def parse_size(size: Any) -> int:
+    """Return the bytes of a size given as a number or as a string such as ``500M`` or ``20G``."""
+    if isinstance(size, str):
+        text = size.strip().upper().rstrip("B")
+        if text and text[-1] in _UNITS:
+            return int(float(text[:-1]) * _UNITS[text[-1]])
+        return int(text)
+    return int(size)
+
+
+def _hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """Task outputs keyed by the digest of their specification and inputs."""
+
+    def __init__(self, root: str, max_size: Any = DEFAULT_MAX_SIZE, link: str = "hardlink") -> None:
+        """
+        :param root: directory of the cache entries, created if needed
+        :type root: str
+
+        :param max_size: total size of the entries kept, in bytes or with a K, M, G or T suffix
+        :type max_size: int
+
+        :param link: ``hardlink`` to materialise hits with hard links (copying across file systems) or ``copy``
+        :type link: str
+        """
+        if link not in ("hardlink", "copy"):
+            raise ValueError("Unknown result cache link mode %s" % link)
+        self.root = root
+        self.max_size = parse_size(max_size)
+        if self.max_size < 0:
+            raise ValueError("Result cache max_size must not be negative")
+        self.link = link
+        self._lock = threading.Lock()
+        # File digests by (path, inode, size, mtime)
+        self._digests: Dict[Tuple[str, int, int, int], str] = {}
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, section: Optional[Mapping[str, Any]]) -> Optional["ResultCache"]:
+        """Return the cache described by a ``[result_cache]`` section, None when it sets no ``path``."""
+        if not section or not section.get("path"):
+            return None
+        return cls(section["path"], section.get("max_size", DEFAULT_MAX_SIZE), section.get("link", "hardlink"))
+
+    @staticmethod
+    def key(spec: Mapping[str, Any]) -> str:
+        """Return the cache key of a task specification, see :meth:`dagon.task.Task.result_spec`."""
+        return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+    def digest(self, target: str) -> Optional[str]:
+        """
+        Return the content digest of a file or directory tree
+
+        Directories are hashed from the relative names and digests of their
+        files, skipping ``.dagon`` directories. Unchanged files are not read again.
+
+        :param target: file or directory
+        :type target: str
+
+        :return: hexadecimal SHA-256, None when *target* does not exist
+        :rtype: str
+        """
+        if os.path.isfile(target):
+            return self._file_digest(target)
+        if not os.path.isdir(target):
+            return None
+        digest = hashlib.sha256()
+        for directory, directories, files in os.walk(target):
+            directories[:] = sorted(name for name in directories if name != DAGON_DIR)
+            for name in sorted(files):
+                file_path = os.path.join(directory, name)
+                file_digest = self._file_digest(file_path) if os.path.isfile(file_path) else "-"
+                digest.update(("%s\0%s\n" % (os.path.relpath(file_path, target), file_digest)).encode())
+        return digest.hexdigest()
+
+    def _file_digest(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        memo = (os.path.abspath(file_path), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(memo)
+        if digest is None:
+            digest = self._digests[memo] = _hash_file(file_path)
+        return digest
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.isfile(os.path.join(self._entry(key), _ENTRY))
+
+    def fetch(self, key: str, destination: str) -> bool:
+        """
+        Materialise the output stored under *key* into *destination*
+
+        :param key: cache key
+        :type key: str
+
+        :param destination: working directory of the task
+        :type destination: str
+
+        :return: True on a hit
+        :rtype: bool
+        """
+        entry = self._entry(key)
+        with self._lock:
+            if key not in self:
+                return False
+            try:
+                output = os.path.join(entry, _OUTPUT)
+                shutil.copytree(output, destination, symlinks=True, copy_function=self._materialise,
+                                dirs_exist_ok=True)
+                # The modification time of the entry file orders evictions
+                os.utime(os.path.join(entry, _ENTRY))
+            except OSError:
+                return False
+        return True
+
+    def _materialise(self, source: str, destination: str) -> None:
+        if self.link == "hardlink":
+            try:
+                os.link(source, destination)
+                return
+            except OSError:
+                pass
+        shutil.copy2(source, destination)
+
+    def store(self, key: str, source: str, spec: Optional[Mapping[str, Any]] = None) -> bool:
+        """
+        Copy a working directory into the cache under *key*, then evict if it grew too large
+
+        :param key: cache key
+        :type key: str
+
+        :param source: working directory of the task, its ``.dagon`` directory is left out
+        :type source: str
+
+        :param spec: task specification recorded with the entry
+        :type spec: dict(str, object)
+
+        :return: True if the entry was stored, False when it already existed
+        :rtype: bool
+        """
+        entry = self._entry(key)
+        if key in self:
+            return False
+        staging = "%s.%d.%d.tmp" % (entry, os.getpid(), threading.get_ident())
+        shutil.rmtree(staging, ignore_errors=True)
+        output = os.path.join(staging, _OUTPUT)
+        shutil.copytree(source, output, symlinks=True,
+                        ignore=lambda directory, names: [DAGON_DIR] if directory == source else [])
+        size = sum(os.lstat(os.path.join(directory, name)).st_size
+                   for directory, _, files in os.walk(output) for name in files)
+        with open(os.path.join(staging, _ENTRY), "w") as fp:
+            json.dump({"size": size, "stored": time.time(), "spec": spec}, fp, sort_keys=True, default=str)
+        with self._lock:
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # Stored meanwhile by another task or process
+                shutil.rmtree(staging, ignore_errors=True)
+                return False
+        self.evict()
+        return True
+
+    def size(self) -> int:
+        """Return the total size of the stored outputs in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith(".tmp"):
+                    continue
+                entry_file = os.path.join(directory, name, _ENTRY)
+                try:
+                    with open(entry_file, "r") as fp:
+                        size = json.load(fp)["size"]
+                    used = os.stat(entry_file).st_mtime
+                except (OSError, ValueError, KeyError):
+                    continue
+                yield os.path.join(directory, name), size, used
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries until the cache fits in ``max_size``
+
+        :return: bytes freed
+        :rtype: int
+        """
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for entry, size, _ in entries:
+                if total - freed <= self.max_size:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                freed += size
+            return freed
@@ -0,0 +1,153 @@
+"""Policies that order ready tasks competing for execution slots.
+
+When more tasks are ready than the workflow executor has free slots, the
+policy decides which of them start first.  A policy assigns each task a
+priority key; lower keys start first and ties keep release order.
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+from dagon import journal
+from dagon.graph import reachable, topological_sort
+
+
+def load_estimates(checkpoint: Union[str, Mapping[str, Any]]) -> Dict[str, float]:
+    """Read task durations recorded as ``completetion_time`` in a checkpoint.
+
+    :param checkpoint: checkpoint file written by a previous run, its loaded records, or seconds by key
+    :return: seconds per checkpoint key (``<workflow>.<task>``) and per task name
+    """
+    if not isinstance(checkpoint, Mapping):
+        checkpoint = journal.load(checkpoint)
+    estimates = {}
+    for key, record in checkpoint.items():
+        if journal.is_metadata(key):
+            continue
+        if isinstance(record, (int, float)) and not isinstance(record, bool):
+            estimates[key] = float(record)
+            continue
+        if not isinstance(record, Mapping) or not isinstance(record.get("completetion_time"), (int, float)):
+            continue
+        estimates[key] = float(record["completetion_time"])
+        if isinstance(record.get("name"), str):
+            estimates.setdefault(record["name"], float(record["completetion_time"]))
+    return estimates
+
+
+class SchedulingPolicy(object):
+    """Base policy: ready tasks start in the order they were released (FIFO)."""
+
+    name = "fifo"
+
+    def prepare(self, workflow: Any) -> None:
+        """Compute priorities for the current graph of *workflow*.
+
+        Called when a run starts.
+        """
+
+    def update(self, workflow: Any, tasks: List[Any]) -> None:
+        """Update the priorities after the edges into *tasks* changed during the run.
+
+        Called when tasks are added during the run; by default the whole graph is prepared again.
+        """
+        self.prepare(workflow)
+
+    def priority(self, task: Any) -> Any:
+        """Return the sort key of *task*; lower keys start first."""
+        return 0
+
+
+class FIFOPolicy(SchedulingPolicy):
+    """Start ready tasks in release order."""
+
+
+class _RankedPolicy(SchedulingPolicy):
+    """Policy whose keys are precomputed per task by :meth:`rank`."""
+
+    def __init__(self) -> None:
+        self._keys: Dict[Any, float] = {}
+
+    def prepare(self, workflow: Any) -> None:
+        self._keys = self.rank(workflow)
+
+    def rank(self, workflow: Any) -> Dict[Any, float]:
+        raise NotImplementedError
+
+    def priority(self, task: Any) -> Any:
+        return -self._keys.get(task, 0.0)
+
+
+class CriticalPathPolicy(_RankedPolicy):
+    """Start first the tasks with the longest estimated path to the end (upward rank).
+
+    The upward rank of a task is its own estimated duration plus the largest
+    upward rank among its consumers, as in HEFT list scheduling.  Durations come
+    from the ``completetion_time`` recorded by previous runs.
+    """
+
+    name = "critical_path"
+
+    def __init__(self, estimates: Optional[Union[str, Mapping[str, Any]]] = None, default: float = 1.0) -> None:
+        """
+        :param estimates: seconds per task name or checkpoint key, or a previous checkpoint file;
+            by default the durations in the checkpoints of the workflow being run
+        :param default: duration assumed for tasks without a recorded duration
+        """
+        _RankedPolicy.__init__(self)
+        self.estimates = load_estimates(estimates) if isinstance(estimates, str) else dict(estimates or {})
+        self.default = float(default)
+        self._recorded: Dict[str, float] = {}
+
+    def estimate(self, workflow: Any, task: Any) -> float:
+        """Return the estimated duration of *task* in seconds."""
+        key = workflow.name + "." + task.name
+        for source in (self.estimates, self._recorded):
+            for name in (key, task.name):
+                if name in source:
+                    return float(source[name])
+        return self.default
+
+    def rank(self, workflow: Any) -> Dict[Any, float]:
+        self._recorded = load_estimates(workflow.checkpoints)
+        ranks: Dict[Any, float] = {}
+        # Visit consumers before producers
+        for task in reversed(workflow.topological_order()):
+            downstream = [ranks[consumer] for consumer in task.nexts if consumer in ranks]
+            ranks[task] = self.estimate(workflow, task) + max(downstream, default=0.0)
+        return ranks
+
+    def update(self, workflow: Any, tasks: List[Any]) -> None:
+        # Only the changed tasks and their producers have new paths to the end
+        affected = reachable(tasks, lambda task: [prev for prev in task.prevs if prev.workflow is workflow])
+        order, _, _ = topological_sort(affected)
+        for task in reversed(order):
+            downstream = [self._keys[consumer] for consumer in task.nexts if consumer in self._keys]
+            self._keys[task] = self.estimate(workflow, task) + max(downstream, default=0.0)
+
+
+class FanOutPolicy(_RankedPolicy):
+    """Start first the tasks that release the most consumers."""
+
+    name = "fan_out"
+
+    def rank(self, workflow: Any) -> Dict[Any, float]:
+        return {task: float(len(set(task.nexts))) for task in workflow.tasks}
+
+    def update(self, workflow: Any, tasks: List[Any]) -> None:
+        # Only the producers of the changed tasks gained or lost consumers
+        for task in tasks:
+            for prev in [task] + [prev for prev in task.prevs if prev.workflow is workflow]:
+                self._keys[prev] = float(len(set(prev.nexts)))
+
+
+POLICIES = {policy.name: policy for policy in (FIFOPolicy, CriticalPathPolicy, FanOutPolicy)}
+
+
+def get_policy(policy: Union[str, SchedulingPolicy]) -> SchedulingPolicy:
+    """Return a policy instance from an instance or a registered name."""
+    if isinstance(policy, SchedulingPolicy):
+        return policy
+    try:
+        return POLICIES[str(policy).lower()]()
+    except KeyError as exc:
+        raise ValueError("Unknown scheduling policy: %s" % policy) from exc
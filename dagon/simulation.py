@@ -0,0 +1,246 @@
+"""Discrete-event simulation of workflow runs for planning.
+
+:func:`simulate` plays a run of the workflow graph on a virtual clock with
+millisecond resolution, without creating scratch directories, probing
+contexts, staging data or touching checkpoints.  Ready tasks are admitted by
+a :class:`dagon.executor.Executor` with the slots, pool limits and scheduling
+policy of the run being planned, so the simulated order is the one the
+workflow scheduler would follow.
+
+Each task lasts its estimated duration, taken in this order from the
+``estimates`` argument (by task name or checkpoint key), from a ``duration``
+annotation (``task.annotate(duration=seconds)``), from the ``completetion_time``
+of a previous run (``history``, by default the workflow checkpoint) and
+finally from ``default``.  Backend pools may add a latency before each of
+their tasks (a Slurm queue wait, a container start), during which the task
+holds its slot.
+
+Tasks added while the workflow runs, such as parallel fan-out tasks, are not
+known to the simulation; simulate each candidate chunking as its own graph.
+
+A run in progress is simulated from its current state by passing the tasks
+that already ended (``completed``) and the seconds each running task has been
+executing (``running``); the running tasks keep their slots and last the rest
+of their estimate.  :meth:`dagon.Workflow.eta` does this for the current run.
+"""
+
+import heapq
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Union
+
+from dagon.executor import Executor, task_pool
+from dagon.scheduling import SchedulingPolicy, get_policy, load_estimates
+
+
+def _ms(seconds: Any) -> int:
+    return int(round(float(seconds) * 1000))
+
+
+class SimulatedTask(object):
+    """Times of one task in a simulated run, in seconds from its start."""
+
+    __slots__ = ("name", "pool", "duration", "ready", "start", "end", "producer")
+
+    def __init__(self, name: str, pool: str, duration: float) -> None:
+        self.name = name
+        self.pool = pool
+        self.duration = duration
+        self.ready = 0.0
+        self.start = 0.0
+        self.end = 0.0
+        # Producer that ended last, which released this task
+        self.producer: Optional[str] = None
+
+    @property
+    def queued(self) -> float:
+        """Seconds the task waited for an execution slot."""
+        return self.start - self.ready
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"pool": self.pool, "duration": self.duration, "ready": self.ready, "start": self.start,
+                "end": self.end, "queued": self.queued}
+
+
+class SimulationReport(object):
+    """Predicted makespan, critical path and utilisation of a simulated run."""
+
+    def __init__(self, tasks: Dict[str, SimulatedTask], makespan: float, max_workers: int,
+                 limits: Mapping[str, int]) -> None:
+        self.tasks = tasks
+        self.makespan = makespan
+        self.max_workers = max_workers
+        self.limits = dict(limits)
+
+    @property
+    def critical_path(self) -> List[str]:
+        """Tasks from a source to the last task to end, each released by the previous one."""
+        if not self.tasks:
+            return []
+        task = max(self.tasks.values(), key=lambda task: task.end)
+        path = [task.name]
+        while task.producer is not None:
+            task = self.tasks[task.producer]
+            path.append(task.name)
+        return path[::-1]
+
+    def busy(self, pool: Optional[str] = None) -> float:
+        """Slot-seconds spent running tasks (and their backend latency), of *pool* or of every pool."""
+        return sum(task.end - task.start for task in self.tasks.values() if pool is None or task.pool == pool)
+
+    def utilisation(self) -> Dict[str, Any]:
+        """
+        Return the share of the slots kept busy during the makespan
+
+        :return: overall utilisation and, per pool, its utilisation and peak of running tasks
+        :rtype: dict(str, object)
+        """
+        def share(busy: float, slots: int) -> float:
+            return busy / (slots * self.makespan) if self.makespan > 0 else 0.0
+
+        pools = {}
+        for pool in sorted({task.pool for task in self.tasks.values()}):
+            events = sorted([(task.start, 1) for task in self.tasks.values() if task.pool == pool] +
+                            [(task.end, -1) for task in self.tasks.values() if task.pool == pool])
+            running = peak = 0
+            for _, change in events:
+                running += change
+                peak = max(peak, running)
+            slots = min(self.limits.get(pool, self.max_workers), self.max_workers)
+            pools[pool] = {"slots": slots, "peak": peak, "utilisation": share(self.busy(pool), slots)}
+        return {"utilisation": share(self.busy(), self.max_workers), "pools": pools}
+
+    def as_dict(self) -> Dict[str, Any]:
+        report = {"makespan": self.makespan, "critical_path": self.critical_path, "max_workers": self.max_workers,
+                  "tasks": {name: task.as_dict() for name, task in self.tasks.items()}}
+        report.update(self.utilisation())
+        return report
+
+    def summary(self) -> str:
+        """Return a short human-readable report."""
+        utilisation = self.utilisation()
+        lines = ["Makespan: %.3f s" % self.makespan,
+                 "Critical path: %s" % " -> ".join(self.critical_path),
+                 "Utilisation: %.1f%% of %d slots" % (100 * utilisation["utilisation"], self.max_workers)]
+        for pool, values in utilisation["pools"].items():
+            lines.append("  %s: %.1f%% of %d slots, peak %d" % (pool, 100 * values["utilisation"], values["slots"],
+                                                                values["peak"]))
+        return "\n".join(lines)
+
+
+def estimate(task: Any, estimates: Mapping[str, Any], history: Mapping[str, float], default: float) -> float:
+    """Return the estimated duration of *task* in seconds, see the module documentation."""
+    key = task.checkpoint_key()
+    for name in (key, task.name):
+        if name in estimates:
+            return float(estimates[name])
+    annotations = getattr(task, "fair_annotations", None) or {}
+    if isinstance(annotations.get("duration"), (int, float)):
+        return float(annotations["duration"])
+    for name in (key, task.name):
+        if name in history:
+            return float(history[name])
+    return float(default)
+
+
+def simulate(workflow: Any, estimates: Optional[Mapping[str, Any]] = None,
+             history: Optional[Union[str, Mapping[str, Any]]] = None, default: float = 1.0,
+             max_threads: Optional[int] = None, pools: Optional[Mapping[str, Mapping[str, Any]]] = None,
+             policy: Optional[Union[str, SchedulingPolicy]] = None,
+             targets: Optional[Iterable[Any]] = None, completed: Optional[Iterable[Any]] = None,
+             running: Optional[Mapping[Any, float]] = None) -> SimulationReport:
+    """
+    Simulate a run of *workflow* and predict its makespan
+
+    :param workflow: workflow to plan; its dependencies are made if needed
+    :type workflow: :class:`dagon.Workflow`
+
+    :param estimates: seconds per task name or checkpoint key
+    :type estimates: dict(str, float)
+
+    :param history: checkpoint file of a previous run or its records, by default the workflow checkpoints
+    :type history: str
+
+    :param default: seconds assumed for tasks without an estimate
+    :type default: float
+
+    :param max_threads: execution slots, by default those of the workflow executor
+    :type max_threads: int
+
+    :param pools: model of each backend pool: ``limit`` (running tasks) and ``latency`` (seconds before
+        each task of the pool), for example ``{"slurm": {"limit": 8, "latency": 120}}``
+    :type pools: dict(str, dict)
+
+    :param policy: scheduling policy, by default the one of the workflow
+    :type policy: str or :class:`dagon.scheduling.SchedulingPolicy`
+
+    :param targets: simulate only these tasks and their producers, see :meth:`dagon.Workflow.select_tasks`
+    :type targets: list
+
+    :param completed: tasks that already ended, left out of the simulation
+    :type completed: list(:class:`dagon.task.Task`)
+
+    :param running: seconds each running task has been executing; they start first, without backend latency
+    :type running: dict(:class:`dagon.task.Task`, float)
+
+    :return: predicted times of the run
+    :rtype: :class:`SimulationReport`
+    """
+    if not workflow._dependencies_made:
+        workflow.make_dependencies()
+    policy = workflow.scheduling_policy if policy is None else get_policy(policy)
+    history = load_estimates(workflow.checkpoints if history is None else history)
+    estimates = dict(estimates or {})
+    pools = {pool: dict(model) for pool, model in (pools or {}).items()}
+    running = dict(running or {})
+    ended = set(completed or ())
+    order = workflow.topological_order() if targets is None else workflow.select_tasks(targets)
+    order = [task for task in order if task not in ended]
+    selected = set(order)
+
+    # Configured pool limits only: the simulated max_threads caps them, not the width of the workflow
+    limits: Dict[str, int] = workflow.executor.get_limits()
+    for pool, model in pools.items():
+        if model.get("limit") is not None:
+            limits[pool] = int(model["limit"])
+    policy.prepare(workflow)
+    executor = Executor(max_threads or workflow.executor.max_workers, limits,
+                        priority=lambda task: (0,) if task in running else (1, policy.priority(task)))
+
+    tasks = {task: SimulatedTask(task.name, task_pool(task), estimate(task, estimates, history, default))
+             for task in order}
+    for task, elapsed in running.items():
+        if task in tasks:
+            tasks[task].duration = max(0.0, tasks[task].duration - float(elapsed))
+    producers = {task: [prev for prev in dict.fromkeys(task.prevs) if prev.workflow is workflow and prev in selected]
+                 for task in order}
+    pending = {task: len(prevs) for task, prevs in producers.items()}
+    consumers: Dict[Any, List[Any]] = {task: [] for task in order}
+    for task, prevs in producers.items():
+        for prev in prevs:
+            consumers[prev].append(task)
+
+    now = 0
+    ends: List[Any] = []
+    sequence = 0
+    for task in order:
+        if pending[task] == 0:
+            executor.submit(task)
+    while True:
+        for task in executor.acquire():
+            record = tasks[task]
+            latency = 0 if task in running else _ms(pools.get(record.pool, {}).get("latency", 0))
+            end = now + latency + _ms(record.duration)
+            record.start, record.end = now / 1000.0, end / 1000.0
+            sequence += 1
+            heapq.heappush(ends, (end, sequence, task))
+        if not ends:
+            break
+        now, _, task = heapq.heappop(ends)
+        executor.release(task)
+        for consumer in consumers[task]:
+            pending[consumer] -= 1
+            if pending[consumer] == 0:
+                tasks[consumer].ready = now / 1000.0
+                tasks[consumer].producer = task.name
+                executor.submit(consumer)
+    return SimulationReport({record.name: record for record in tasks.values()}, now / 1000.0,
+                            executor.max_workers, limits)
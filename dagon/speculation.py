@@ -0,0 +1,277 @@
+"""Speculative re-execution of straggling tasks.
+
+In a fan-out of identical tasks, one slow node or hung mount holds up the
+fan-in.  A :class:`Speculator` watches the running tasks marked idempotent
+(:meth:`dagon.task.Task.set_idempotent`) and, when one of them runs longer
+than ``multiplier`` times its expected duration, launches a duplicate attempt
+in a fresh scratch directory, on the same backend or on the one built by the
+task's ``backup``.  The first attempt that succeeds wins: the task adopts its
+scratch directory and result, which are committed to the checkpoint, and the
+other attempt is cancelled and its scratch directory removed.
+
+The expected duration of a task is the median duration of its siblings (tasks
+of the same type with the same producers, such as the tasks of a fan-out) once
+a ``quantile`` of them finished; before that, its ``duration`` annotation or
+its median duration in the run history (:mod:`dagon.history`).  Tasks without
+an expected duration are not speculated.  Attempts run outside the execution
+slots of the workflow, at most ``max_attempts`` at once.
+"""
+
+import copy
+import statistics
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Set
+
+from dagon.batch import Batch
+from dagon.history import command_hash
+from dagon.task import Task
+
+#: Times its expected duration a task runs before it is speculated.
+DEFAULT_MULTIPLIER = 1.5
+#: Share of the siblings of a task that must have finished before their median is trusted.
+DEFAULT_QUANTILE = 0.75
+#: Seconds a task runs at least before it is speculated.
+DEFAULT_MIN_RUNTIME = 10.0
+#: Seconds between two checks of the running tasks.
+DEFAULT_INTERVAL = 1.0
+#: Duplicate attempts running at once.
+DEFAULT_MAX_ATTEMPTS = 4
+
+RUNNING, WON, LOST = "running", "won", "lost"
+
+
+class Attempt(object):
+    """Duplicate execution of a straggling task."""
+
+    def __init__(self, speculator: "Speculator", task: Any, replica: Any) -> None:
+        self.speculator = speculator
+        self.task = task
+        self.replica = replica
+        self.state = RUNNING
+        self.cancelled = False
+        self.result: Optional[Dict[str, Any]] = None
+        self.thread = threading.Thread(target=self.execute, name=replica.name, daemon=True)
+
+    def execute(self) -> None:
+        replica = self.replica
+        try:
+            with replica.trace("speculate", task=self.task.name):
+                replica.create_working_dir()
+                script = replica.post_process_command(replica.pre_process_command(replica.command))
+                if self.cancelled:
+                    result = {"code": 1, "message": "Cancelled", "output": ""}
+                else:
+                    result = replica.on_execute(script, "launcher.sh")
+        except Exception as exc:
+            replica.workflow.logger.exception("%s: speculative attempt failed", self.task.name)
+            result = {"code": 1, "message": str(exc), "output": ""}
+        self.result = result
+        self.speculator._ended(self)
+
+    def cancel(self) -> None:
+        """Stop the attempt and wait until its thread ends."""
+        self.cancelled = True
+        # The launcher may not have started yet when the attempt is cancelled
+        while self.thread.is_alive():
+            self.replica.cancel()
+            self.thread.join(0.1)
+
+
+def _producers(task: Any) -> FrozenSet[Any]:
+    return frozenset(prev for prev in task.prevs if prev.workflow is task.workflow)
+
+
+class Speculator(object):
+    """Watches the running tasks of a workflow and speculates the straggling ones."""
+
+    def __init__(self, workflow: Any, multiplier: Any = DEFAULT_MULTIPLIER, quantile: Any = DEFAULT_QUANTILE,
+                 min_runtime: Any = DEFAULT_MIN_RUNTIME, interval: Any = DEFAULT_INTERVAL,
+                 max_attempts: Any = DEFAULT_MAX_ATTEMPTS) -> None:
+        """
+        :param workflow: watched workflow
+        :type workflow: :class:`dagon.Workflow`
+
+        :param multiplier: times its expected duration a task runs before it is speculated
+        :type multiplier: float
+
+        :param quantile: share of the siblings of a task that finished before their median is used
+        :type quantile: float
+
+        :param min_runtime: seconds a task runs at least before it is speculated
+        :type min_runtime: float
+
+        :param interval: seconds between two checks of the running tasks
+        :type interval: float
+
+        :param max_attempts: duplicate attempts running at once
+        :type max_attempts: int
+        """
+        self.workflow = workflow
+        self.multiplier = float(multiplier)
+        self.quantile = float(quantile)
+        self.min_runtime = float(min_runtime)
+        self.interval = float(interval)
+        self.max_attempts = int(max_attempts)
+        self._lock = threading.Lock()
+        self._attempts: Dict[Any, Attempt] = {}
+        self._speculated: Set[Any] = set()
+        self._settled: Set[Any] = set()
+        self._history: Dict[str, float] = {}
+        self._stop: Optional[threading.Event] = None
+        self._hooks = {"on_workflow_start": self._start, "on_workflow_end": self._end}
+        for event_name, listener in self._hooks.items():
+            workflow.add_listener(event_name, listener)
+
+    def close(self) -> None:
+        """Stop watching the workflow."""
+        self._end(self.workflow)
+        for event_name, listener in self._hooks.items():
+            self.workflow.remove_listener(event_name, listener)
+
+    def _start(self, workflow: Any) -> None:
+        with self._lock:
+            self._speculated.clear()
+            self._settled.clear()
+        history = getattr(workflow, "history", None)
+        self._history = {}
+        if history is not None:
+            self._history = history.estimates(workflow.name, {task.name: command_hash(task)
+                                                              for task in workflow.tasks})
+        self._stop = threading.Event()
+        threading.Thread(target=self._watch, args=(self._stop,), name="speculation", daemon=True).start()
+
+    def _end(self, workflow: Any) -> None:
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    def _watch(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                self.workflow.logger.exception("Speculation check failed")
+
+    def eligible(self, task: Any) -> bool:
+        """Return True if *task* may get a duplicate attempt."""
+        return bool(task.idempotent) and task.mode != "parallel" and type(task).execute is Task.execute and \
+            (task.backup is not None or isinstance(task, Batch))
+
+    def expected(self, task: Any) -> Optional[float]:
+        """
+        Return the expected duration of *task*, see the module documentation
+
+        :return: seconds, None when nothing is known about the task
+        :rtype: float
+        """
+        producers = _producers(task)
+        siblings = [other for other in self.workflow.tasks
+                    if other is not task and type(other) is type(task) and _producers(other) == producers]
+        finished = [other.completetion_time for other in siblings if other.status.name == "FINISHED" and
+                    not other.fair_checkpoint_reused and other.completetion_time]
+        if finished and len(finished) >= self.quantile * (len(siblings) + 1):
+            return statistics.median(finished)
+        duration = task.fair_annotations.get("duration")
+        if isinstance(duration, (int, float)):
+            return float(duration)
+        return self._history.get(task.name)
+
+    def stragglers(self, now: Optional[float] = None) -> List[Any]:
+        """Return the running tasks that exceed their threshold and were not speculated yet."""
+        now = time.time() if now is None else now
+        if self.workflow.dry or self.workflow.is_portable_emulation():
+            return []
+        stragglers = []
+        for task in list(self.workflow.tasks):
+            runtime = task._runtime
+            # Only tasks whose launcher runs; staging is not speculated
+            if task.status.name != "RUNNING" or runtime is None or runtime.output is None or \
+                    runtime.execution_start is None or task in self._speculated or not self.eligible(task):
+                continue
+            expected = self.expected(task)
+            if expected is not None and now - runtime.execution_start > max(self.min_runtime,
+                                                                             self.multiplier * expected):
+                stragglers.append(task)
+        return stragglers
+
+    def check(self) -> None:
+        """Launch a duplicate attempt of each straggling task, within ``max_attempts``."""
+        for task in self.stragglers():
+            with self._lock:
+                if len(self._attempts) >= self.max_attempts:
+                    return
+                if task in self._speculated:
+                    continue
+                self._speculated.add(task)
+            replica = self.replica(task)
+            attempt = Attempt(self, task, replica)
+            with self._lock:
+                if task in self._settled:
+                    continue
+                self._attempts[task] = attempt
+                attempt.thread.start()
+            self.workflow.logger.info("%s: running longer than expected, speculating in %s", task.name,
+                                      replica.name)
+
+    def replica(self, task: Any) -> Any:
+        """Return the task that runs the duplicate attempt of *task*."""
+        if task.backup is not None:
+            replica = task.backup(task)
+        else:
+            replica = copy.copy(task)
+            replica.name = task.name + ".attempt"
+            replica._runtime = None
+        replica.working_dir = None
+        replica.set_workflow(self.workflow)
+        replica.mode = "sequential"
+        replica.data_mover = replica.data_mover or task.data_mover
+        replica.stager_mover = replica.stager_mover or task.stager_mover
+        # Isolated launchers can be cancelled with all their processes
+        replica.idempotent = True
+        replica.backup = None
+        return replica
+
+    def _ended(self, attempt: Attempt) -> None:
+        with self._lock:
+            won = self._attempts.get(attempt.task) is attempt and not attempt.cancelled and \
+                not attempt.result.get("code")
+            if won:
+                attempt.state = WON
+        if won:
+            self.workflow.logger.info("%s: speculative attempt finished first", attempt.task.name)
+            attempt.task.cancel()
+
+    def settle(self, task: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Decide which attempt of *task* wins, called when its own launcher returns
+
+        :param result: execution result of the launcher of the task
+        :type result: dict() with the execution output (str), code (int) and message (str)
+
+        :return: the result of the winning attempt
+        :rtype: dict() with the execution output (str), code (int) and message (str)
+        """
+        with self._lock:
+            self._settled.add(task)
+            attempt = self._attempts.pop(task, None)
+        if attempt is None:
+            return result
+        if attempt.state != WON and result.get("code"):
+            # The task failed: its attempt may still succeed
+            attempt.thread.join()
+            if attempt.result is not None and not attempt.result.get("code"):
+                attempt.state = WON
+        if attempt.state == WON:
+            attempt.thread.join()
+            task.discard_working_dir()
+            task.working_dir = attempt.replica.working_dir
+            task.get_runtime().output = attempt.replica.get_runtime().output
+            self.workflow.checkpoints.record(task.checkpoint_key(), working_dir=task.working_dir)
+            self.workflow.metrics.speculations.inc((WON,))
+            return attempt.result
+        attempt.state = LOST
+        attempt.cancel()
+        attempt.replica.discard_working_dir()
+        self.workflow.metrics.speculations.inc((LOST,))
+        return result
@@ -1,6 +1,8 @@
 from enum import Enum
+import hashlib
 import os
 import logging
+import re
 from typing import Dict, Any
 
 from dagon.batch import Batch
@@ -8,7 +10,8 @@ from dagon.batch import Slurm
 
 from dagon.remote import RemoteTask
 from dagon.communication.data_transfer import GlobusManager
-from dagon.shell import quote, remote_target
+from dagon.metrics import staged_size
+from dagon.shell import join_command, quote, remote_target
 
 
 class DataMover(Enum):
@@ -24,6 +27,8 @@ class DataMover(Enum):
     :cvar FTP: Using FTP
     :cvar SFTP: Using secure FTP
     :cvar GRIDFTP: Using Globus GridFTP
+    :cvar HARDLINK: Using hard links, or a copy materialised once per host across file systems
+    :cvar TAR: Streaming one tar archive, over one SSH channel between machines
     """
 
     DONTMOVE = 0
@@ -37,6 +42,30 @@ class DataMover(Enum):
     GRIDFTP = 8
     SKYCDS = 9
     DYNOSTORE = 10
+    HARDLINK = 11
+    TAR = 12
+
+
+#: Directory of the scratch base where HARDLINK materialises sources that cannot be linked, by workflow name.
+STAGING_CACHE = ".dagon-staged"
+
+# Links $1 into the directory $2.  When the source is on another file system,
+# it is copied (reflinked where supported) once into the cache directory $3 of
+# this host, under a lock, and every consumer links that copy.
+_LINK_FUNCTION = """
+dagon_link() {
+    if cp -rl "$1" "$2" 2>/dev/null; then return 0; fi
+    name=$(basename "$1")
+    mkdir -p "$3" || return 1
+    (
+        flock 9
+        if [ ! -e "$3/$name" ]; then
+            cp -r --reflink=auto "$1" "$3/.partial.$$" && mv "$3/.partial.$$" "$3/$name"
+        fi
+    ) 9>"$3/.lock" || return 1
+    cp -rlf "$3/$name" "$2" 2>/dev/null || cp -rf --reflink=auto "$3/$name" "$2"
+}
+"""
 
 
 class StagerMover(Enum):
@@ -46,10 +75,38 @@ class StagerMover(Enum):
     :cvar NORMAL: sequential
     :cvar PARALLEL: using threads
     :cvar SLURM: using Slurm
+    :cvar PYTHON: using the Python transfer engine of :mod:`dagon.stager.transfer` for COPY, LINK and HARDLINK
+        between tasks without SSH connection, sequential otherwise
     """
     NORMAL = 0
     PARALLEL = 1
     SLURM = 2
+    PYTHON = 3
+
+
+# Modes of the Python transfer engine by data mover
+_ENGINE_MODES = {DataMover.COPY: "copy", DataMover.LINK: "link", DataMover.HARDLINK: "hardlink"}
+
+
+def _staging_cache(dst_task: Any, src: str) -> str:
+    # Cache directory of this host where HARDLINK materialises the source src
+    return "/".join((dst_task.workflow.get_scratch_dir_base(), STAGING_CACHE, dst_task.workflow.name,
+                     hashlib.sha256(src.encode()).hexdigest()[:16]))
+
+
+_SSH_OPTIONS = ("-o", "LogLevel=ERROR", "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null")
+
+
+def _glob_quote(pattern: str) -> str:
+    # Quote a path pattern for the shell, leaving its glob characters to expand
+    return "".join(part if part in ("*", "?", "[", "]") else quote(part)
+                   for part in re.split(r"([*?\[\]])", pattern) if part)
+
+
+def _ssh(task: Any, key_path: str) -> str:
+    # SSH command line that runs one command on the machine of task
+    return join_command(("ssh",) + _SSH_OPTIONS + ("-i", key_path, "-p", getattr(task, "ssh_port", 22),
+                                                   "%s@%s" % (task.get_user(), task.get_ip())))
 
 
 class ProtocolStatus(Enum):
@@ -121,16 +178,31 @@ class Stager(object):
                             continue
 
                         break
+                # TAR runs over SSH as SCP does
+                if data_mover == DataMover.SCP and self.data_mover == DataMover.TAR:
+                    data_mover = DataMover.TAR
         else:  # best effort (SCP)
             data_mover = self.data_mover
 
 
         src = src_task.get_scratch_dir() + "/" + local_path
+        # Bytes staged, known without measuring the source when the Python transfer engine moves it
+        size = None
 
         dst = dst_path + "/" + os.path.dirname(os.path.abspath(local_path))
         
+        if StagerMover(self.stager_mover) == StagerMover.PYTHON and data_mover in _ENGINE_MODES and \
+                dst_task.ssh_connection is None and src_task.ssh_connection is None:
+            # Staged now by the controller: the launcher has nothing left to move
+            command = command + ": # Staged in by the Python transfer engine\n"
+            if not dst_task.workflow.dry:
+                report = self.transfer(dst_task, src, dst, data_mover)
+                # A linked directory counts as one entry, not as the tree under it
+                if data_mover != DataMover.LINK:
+                    size = report.bytes
+
         # Check if the symbolic link have to be used...
-        if data_mover == DataMover.GRIDFTP:
+        elif data_mover == DataMover.GRIDFTP:
             from dagon.communication.data_transfer import GlobusManager
 
             # data could be copy using globus sdk
@@ -165,6 +237,12 @@ class Stager(object):
                 cmd = "ln -sf {} \"$dst\""
             command = command + self.generate_command(src, dst, cmd, self.stager_mover.value)
 
+        elif data_mover == DataMover.HARDLINK:
+            # Links are metadata operations: they are always made sequentially
+            command = command + "# Add the hard link command\n" + _LINK_FUNCTION
+            cmd = "dagon_link \"$file\" \"$dst\" " + quote(_staging_cache(dst_task, src))
+            command = command + self.generate_command(src, dst, cmd, StagerMover.NORMAL.value)
+
         # Check if the copy have to be used...
         elif data_mover == DataMover.COPY:
             # Add the copy command
@@ -174,6 +252,10 @@ class Stager(object):
                 cmd = "cp -r {} \"$dst\""
             command = command + self.generate_command(src, dst, cmd, self.stager_mover.value)
 
+        elif data_mover == DataMover.TAR:
+            # One archive stream for all the files, whatever the stager mover
+            command = command + "# Add the tar stream command\n" + self.tar_stream(dst_task, src_task, dst, local_path)
+
         # Check if the secure copy have to be used...
         elif data_mover == DataMover.SCP:
             # Add the copy command
@@ -224,8 +306,133 @@ class Stager(object):
 
         command += "\nif [ $? -ne 0 ]; then code=1; fi"
 
+        if data_mover != DataMover.DONTMOVE:
+            metrics = getattr(dst_task.workflow, "metrics", None)
+            # Only sources on this machine can be measured
+            if size is None and src_task.ssh_connection is None:
+                size = metrics.source_size(src) if metrics is not None else staged_size(src)
+            if size is not None:
+                dst_task.staged_bytes += size
+            if metrics is not None:
+                metrics.staged(data_mover, size)
+
         return command
 
+    def tar_stream(self, dst_task: Any, src_task: Any, dst: str, local_path: str) -> str:
+        """
+        Move the files matched by *local_path* as a single tar stream, unpacked in *dst*
+
+        A remote source is read by the destination machine over one SSH channel; a local source
+        is pushed now to a remote destination, as SCP does; between two local tasks the stream
+        is a pipe.
+
+        :param dst_task: task where the data has to be put
+        :type dst_task: :class:`dagon.task.Task`
+
+        :param src_task: task from the data has to be taken
+        :type src_task: :class:`dagon.task.Task`
+
+        :param dst: directory where the files are unpacked
+        :type dst: str
+
+        :param local_path: path or glob pattern of the files on the source task
+        :type local_path: str
+
+        :return: command to move the data, empty when it was already moved
+        :rtype: str with the command
+
+        :raises Exception: the data could not be pushed to the destination
+        """
+        folder = src_task.get_scratch_dir() + "/" + os.path.dirname(local_path)
+        # The pattern expands in the source directory, so the archive holds the matches by name
+        pack = "cd %s && tar -cf - %s" % (quote(folder), _glob_quote(os.path.basename(local_path) or "."))
+        unpack = "tar -xf - -C " + quote(dst)
+        if isinstance(src_task, RemoteTask):  # if source is accessible from destiny machine
+            key = dst_task.get_public_key()
+            src_task.add_public_key(key)
+            key_path = dst_task.working_dir + "/.dagon/ssh_key"
+            return "(set -o pipefail; %s %s | %s)\n" % (_ssh(src_task, key_path), quote(pack), unpack)
+        if isinstance(dst_task, RemoteTask):  # if source is a local machine
+            key = src_task.get_public_key()
+            dst_task.add_public_key(key)
+            key_path = src_task.working_dir + "/.dagon/ssh_key"
+            script = "set -o pipefail; %s | %s %s" % (pack, _ssh(dst_task, key_path),
+                                                      quote("mkdir -p %s && %s" % (quote(dst), unpack)))
+            res = Batch.execute_command(join_command(("bash", "-c", script)))
+            if res['code']:
+                raise Exception("Couldn't stream data from %s to %s: %s" % (src_task.get_ip(), dst_task.get_ip(),
+                                                                           res['message']))
+            return ""
+        return "(set -o pipefail; %s | %s)\n" % (pack, unpack)
+
+    def stage_in_prefetched(self, dst_task: Any, cache: str, dst_path: str, local_path: str) -> str:
+        """
+        Return the command that stages a copy prefetched to the host of the task, see :mod:`dagon.prefetch`
+
+        COPY gives the task a private copy; other data movers link the cached copy where possible.
+
+        :param dst_task: task where the data has to be put
+        :type dst_task: :class:`dagon.task.Task`
+
+        :param cache: prefetched copy on the host of the task
+        :type cache: str
+
+        :param dst_path: path where the file is going to be save on the destiny directory
+        :type dst_path: str
+
+        :param local_path: path of the file on the source task
+        :type local_path: str
+
+        :return: comand to move the data
+        :rtype: str with the command
+        """
+        dst = dst_path + "/" + os.path.dirname(os.path.abspath(local_path))
+        command = "# Add the prefetched copy\n"
+        cmd = "cp -rl \"$file\" \"$dst\" 2>/dev/null || cp -r \"$file\" \"$dst\""
+        if dst_task.data_mover == DataMover.COPY:
+            cmd = "cp -r \"$file\" \"$dst\""
+        command = command + self.generate_command(cache, dst, cmd, StagerMover.NORMAL.value)
+        return command + "\nif [ $? -ne 0 ]; then code=1; fi"
+
+    def transfer(self, dst_task: Any, src: str, dst: str, data_mover: DataMover) -> Any:
+        """
+        Stage *src* into the directory *dst* with the Python transfer engine, ``[batch] threads`` files at once
+
+        :param dst_task: task where the data has to be put, whose :attr:`dagon.task.Task.transfers` receives
+            the result of each file
+        :type dst_task: :class:`dagon.task.Task`
+
+        :param src: source path or glob pattern
+        :type src: str
+
+        :param dst: destination directory
+        :type dst: str
+
+        :param data_mover: COPY, LINK or HARDLINK
+        :type data_mover: :class:`DataMover`
+
+        :return: per-file results
+        :rtype: :class:`dagon.stager.transfer.TransferReport`
+
+        :raises Exception: a file could not be staged
+        """
+        from dagon.stager.transfer import transfer
+
+        threads = int(self.cfg.get("batch", {}).get("threads") or 1)
+        cache = _staging_cache(dst_task, src) if data_mover == DataMover.HARDLINK else None
+
+        def progress(files: int, total_files: int, size: int, total_size: int) -> None:
+            self.logger.debug("%s: staged %d/%d files, %d/%d bytes of %s", dst_task.name, files, total_files,
+                              size, total_size, src)
+
+        report = transfer(src, dst, _ENGINE_MODES[data_mover], threads, cache, progress)
+        dst_task.transfers.extend(report.files)
+        if report.failed:
+            failed = report.failed[0]
+            raise Exception("Couldn't stage %s in %s: %s (%d files failed)" % (failed.source, failed.destination,
+                                                                             failed.error, len(report.failed)))
+        return report
+
     def generate_command(self, src: str, dst: str, cmd: str, mode: int) -> str:
         batch_cfg = self.cfg.get("batch", {})
         slurm_cfg = self.cfg.get("slurm", {})
@@ -0,0 +1,268 @@
+"""Python transfer engine for stage-ins between directories of this machine.
+
+With ``StagerMover.PYTHON`` the stager does not write a ``cp``/``ln`` loop
+into the launcher for sources and destinations the controller can reach: it
+stages them itself while the launcher is generated, with a pool of
+``[batch] threads`` threads.  Small files are grouped in batches so a tree of
+many small files does not cost one pool job per file, and large files are
+copied in the kernel with ``os.copy_file_range`` (which file systems may turn
+into a clone or a server-side copy), or ``os.sendfile`` where it is not
+supported.  Each file gets a :class:`FileTransfer` result instead of a shell
+exit code.
+"""
+
+import errno
+import glob
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+#: Files up to this size are transferred in batches.
+SMALL_FILE = 1024 * 1024
+#: Bytes of small files transferred by one pool job.
+BATCH_BYTES = 16 * 1024 * 1024
+#: Files transferred by one pool job at most.
+BATCH_FILES = 256
+
+COPY, LINK, HARDLINK = "copy", "link", "hardlink"
+
+# Bytes copied by one kernel call
+_CHUNK = 64 * 1024 * 1024
+
+# Locks of the cache entries materialised by this process
+_cache_locks: Dict[str, threading.Lock] = {}
+_cache_guard = threading.Lock()
+
+
+class FileTransfer(object):
+    """Outcome of the transfer of one file, link or directory."""
+
+    __slots__ = ("source", "destination", "size", "method", "seconds", "error")
+
+    def __init__(self, source: str, destination: str, size: int = 0) -> None:
+        self.source = source
+        self.destination = destination
+        self.size = size
+        # copy_file_range, sendfile, read, symlink, hardlink or mkdir
+        self.method: Optional[str] = None
+        self.seconds = 0.0
+        self.error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def as_dict(self) -> Dict[str, object]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class TransferReport(object):
+    """Results of the files of one stage-in."""
+
+    def __init__(self, files: List[FileTransfer]) -> None:
+        self.files = files
+
+    @property
+    def failed(self) -> List[FileTransfer]:
+        return [transfer for transfer in self.files if not transfer.ok]
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.files) and not self.failed
+
+    @property
+    def bytes(self) -> int:
+        return sum(transfer.size for transfer in self.files if transfer.ok)
+
+
+#: Called after each batch with the files and bytes done and the totals.
+Progress = Callable[[int, int, int, int], None]
+
+
+def _copy_data(source: str, destination: str) -> str:
+    with open(source, "rb") as fsrc, open(destination, "wb") as fdst:
+        for method in ("copy_file_range", "sendfile"):
+            function = getattr(os, method, None)
+            if function is None:
+                continue
+            offset = 0
+            try:
+                while True:
+                    if method == "copy_file_range":
+                        copied = function(fsrc.fileno(), fdst.fileno(), _CHUNK)
+                    else:
+                        copied = function(fdst.fileno(), fsrc.fileno(), offset, _CHUNK)
+                    if copied == 0:
+                        return method
+                    offset += copied
+            except OSError as exc:
+                # Not supported between these files; nothing was written yet
+                if offset or exc.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                                               errno.EBADF, errno.ENOTSUP):
+                    raise
+        shutil.copyfileobj(fsrc, fdst, _CHUNK)
+        return "read"
+
+
+def _copy_file(source: str, destination: str) -> str:
+    method = _copy_data(source, destination)
+    shutil.copymode(source, destination)
+    return method
+
+
+def _cached(source: str, cache: str) -> str:
+    # Materialise a source of another file system once per cache directory
+    target = os.path.join(cache, os.path.relpath(source, "/"))
+    with _cache_guard:
+        lock = _cache_locks.setdefault(target, threading.Lock())
+    with lock:
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            partial = "%s.partial.%d" % (target, threading.get_ident())
+            _copy_file(source, partial)
+            os.replace(partial, target)
+    return target
+
+
+def _transfer(transfer: FileTransfer, mode: str, cache: Optional[str]) -> None:
+    start = time.monotonic()
+    try:
+        if os.path.islink(transfer.source) or mode == LINK:
+            target = os.readlink(transfer.source) if os.path.islink(transfer.source) else transfer.source
+            if os.path.lexists(transfer.destination):
+                os.remove(transfer.destination)
+            os.symlink(target, transfer.destination)
+            transfer.method = "symlink"
+        elif mode == HARDLINK:
+            if os.path.lexists(transfer.destination):
+                os.remove(transfer.destination)
+            try:
+                os.link(transfer.source, transfer.destination)
+            except OSError as exc:
+                if exc.errno != errno.EXDEV or cache is None:
+                    raise
+                os.link(_cached(transfer.source, cache), transfer.destination)
+            transfer.method = "hardlink"
+        else:
+            transfer.method = _copy_file(transfer.source, transfer.destination)
+    except OSError as exc:
+        transfer.error = str(exc)
+    transfer.seconds = time.monotonic() - start
+
+
+def plan(source: str, destination: str, mode: str = COPY) -> List[FileTransfer]:
+    """
+    Return the files to transfer so *destination* receives *source* as ``cp -r`` would
+
+    Directories are walked and recreated; with ``LINK`` a directory is linked as a whole.
+
+    :param source: file, directory or glob pattern
+    :type source: str
+
+    :param destination: directory that receives the sources
+    :type destination: str
+
+    :return: one transfer per file, the created directories already done
+    :rtype: list(:class:`FileTransfer`)
+    """
+    transfers: List[FileTransfer] = []
+    paths = sorted(glob.glob(source))
+    if not paths:
+        missing = FileTransfer(source, destination)
+        missing.error = "No such file or directory"
+        return [missing]
+    for path in paths:
+        target = os.path.join(destination, os.path.basename(path.rstrip("/")))
+        if mode == LINK or not os.path.isdir(path) or os.path.islink(path):
+            transfers.append(FileTransfer(path, target, 0 if os.path.islink(path) else os.path.getsize(path)))
+            continue
+        for root, directories, files in os.walk(path):
+            relative = os.path.relpath(root, path)
+            folder = os.path.normpath(os.path.join(target, relative))
+            created = FileTransfer(root, folder)
+            try:
+                os.makedirs(folder, exist_ok=True)
+                created.method = "mkdir"
+            except OSError as exc:
+                created.error = str(exc)
+            transfers.append(created)
+            # Links to directories are recreated as links, not walked
+            for name in directories + files:
+                file_path = os.path.join(root, name)
+                if name in directories and not os.path.islink(file_path):
+                    continue
+                size = 0 if os.path.islink(file_path) else os.path.getsize(file_path)
+                transfers.append(FileTransfer(file_path, os.path.join(folder, name), size))
+    return transfers
+
+
+def _batches(transfers: List[FileTransfer]) -> Iterator[List[FileTransfer]]:
+    batch: List[FileTransfer] = []
+    size = 0
+    for transfer in transfers:
+        if transfer.size > SMALL_FILE:
+            yield [transfer]
+            continue
+        batch.append(transfer)
+        size += transfer.size
+        if size >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+def transfer(source: str, destination: str, mode: str = COPY, threads: int = 1, cache: Optional[str] = None,
+             progress: Optional[Progress] = None) -> TransferReport:
+    """
+    Transfer *source* into the directory *destination*
+
+    :param source: file, directory or glob pattern
+    :type source: str
+
+    :param destination: directory that receives the sources, created if needed
+    :type destination: str
+
+    :param mode: ``copy``, ``link`` (symbolic links) or ``hardlink``
+    :type mode: str
+
+    :param threads: width of the thread pool
+    :type threads: int
+
+    :param cache: with ``hardlink``, directory of this file system where sources of other file systems
+        are copied once and linked from
+    :type cache: str
+
+    :param progress: called after each batch with the files and bytes done and their totals
+    :type progress: callable(int, int, int, int)
+
+    :return: per-file results
+    :rtype: :class:`TransferReport`
+    """
+    os.makedirs(destination, exist_ok=True)
+    transfers = plan(source, destination, mode)
+    pending = [transfer for transfer in transfers if transfer.method is None and transfer.error is None]
+    total_files, total_bytes = len(pending), sum(transfer.size for transfer in pending)
+    done: List[Tuple[int, int]] = [(0, 0)]
+    lock = threading.Lock()
+
+    def run(batch: List[FileTransfer]) -> None:
+        for item in batch:
+            _transfer(item, mode, cache)
+        if progress is not None:
+            with lock:
+                files, size = done[0]
+                done[0] = files + len(batch), size + sum(item.size for item in batch)
+                progress(done[0][0], total_files, done[0][1], total_bytes)
+
+    batches = list(_batches(pending))
+    if len(batches) <= 1 or threads <= 1:
+        for batch in batches:
+            run(batch)
+    else:
+        with ThreadPoolExecutor(max_workers=min(threads, len(batches)), thread_name_prefix="stage-in") as pool:
+            list(pool.map(run, batches))
+    return TransferReport(transfers)
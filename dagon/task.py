@@ -1,10 +1,13 @@
+import asyncio
+import contextlib
+import functools
 import logging
 import shutil
 import glob
 import os
 import subprocess
 import shlex
-from json import loads, dumps
+from json import loads
 from threading import Thread
 from threading import Semaphore
 from os import makedirs, path, chmod
@@ -13,7 +16,10 @@ from enum import Enum
 from typing import Any, Dict, List, Optional, Tuple
 from dagon.ftp_publisher import FTP_API
 import dagon
-from dagon.shell import quote
+from dagon import incremental
+from dagon.output import DEFAULT_TAIL, STREAM_FILES, OutputCapture, read_tail
+from dagon.references import WorkflowReference, scan_command, substitute
+from dagon.shell import join_command, quote
 
 
 class TaskType(Enum):
@@ -97,13 +103,80 @@ class DagonTask(object):
         return class_(*args, **kwargs)
 
 
-class Task(Thread):
+def _runtime_field(field: str, doc: str) -> property:
+    """Expose an attribute of the execution record as a task attribute"""
+
+    def getter(task: "Task") -> Any:
+        return getattr(task._runtime if task._runtime is not None else _IDLE, field)
+
+    def setter(task: "Task", value: Any) -> None:
+        setattr(task.get_runtime(), field, value)
+
+    return property(getter, setter, doc=doc)
+
+
+class TaskRuntime(object):
+    """
+    **Execution state of a task**
+
+    Created when the task is released or started, so tasks that are only described,
+    linked, validated or exported do not carry threads, results or timings.
+
+    :ivar thread: thread started by :meth:`Task.start`, None when the task runs as a coroutine
+    :vartype thread: :class:`threading.Thread`
+
+    :ivar new_tasks: tasks created by the task in parallel mode
+    :vartype new_tasks: list[]
+
+    :ivar output: capture of the launcher output, None until the launcher starts
+    :vartype output: :class:`dagon.output.OutputCapture`
+
+    :ivar transfers: files staged in by the Python transfer engine
+    :vartype transfers: list[:class:`dagon.stager.transfer.FileTransfer`]
+    """
+
+    __slots__ = ("thread", "running", "result", "new_tasks", "completetion_time",
+                 "remove_scratch_dir", "checkpoint_reused", "result_key", "output",
+                 "release_time", "execution_start", "staged_bytes", "transfers")
+
+    def __init__(self) -> None:
+        self.thread: Optional[Thread] = None
+        self.running = False
+        self.result: Optional[Dict[str, Any]] = None
+        self.new_tasks: List[Any] = []
+        self.completetion_time = 0
+        self.remove_scratch_dir = False
+        self.checkpoint_reused = False
+        self.result_key: Optional[str] = None
+        self.output: Optional[OutputCapture] = None
+        self.release_time: Optional[float] = None
+        self.execution_start: Optional[float] = None
+        self.staged_bytes = 0
+        self.transfers: List[Any] = []
+
+
+# Defaults read by tasks that were not started yet
+_IDLE = TaskRuntime()
+
+
+class Task(object):
     task_type = None
+    pool = "local"
+    logger = logging.getLogger()
+    __slots__ = ("name", "_command", "_references", "working_dir", "nexts", "prevs", "derived_prevs",
+                 "reference_count", "ip", "ssh_connection", "workflow", "status", "info", "dag_tps",
+                 "transversal_workflow", "workflows", "data_mover", "stager_mover", "mode", "globusendpoint",
+                 "semaphore", "idempotent", "backup", "_runtime", "_fair", "__dict__", "__weakref__")
     """
     **Represents a task executed by DagOn**
 
     It can be executed on local machine, cloud instance, cluster or in a docker container
 
+    The graph, command and backend parameters are kept in slots; execution
+    state lives in a :class:`TaskRuntime` created when the task is started.
+    :meth:`start`, :meth:`join`, :meth:`is_alive` and :attr:`ident` behave as
+    the ones of :class:`threading.Thread`.
+
     :ivar name: unique name of the class
     :vartype name: str
 
@@ -119,6 +192,9 @@ class Task(Thread):
     :ivar prevs: tasks that has to be executed before of this task (dependencies to be resolved)
     :vartype prevs: list[]
 
+    :ivar derived_prevs: entries of ``prevs`` that were linked from the workflow:// references of this task
+    :vartype derived_prevs: list[]
+
     :ivar reference_count: number of references to this task
     :vartype reference_count: int
 
@@ -137,6 +213,12 @@ class Task(Thread):
     :ivar info: information of the enviroment where this task is going to be executed
     :vartype info: dict(str, object)
 
+    :ivar idempotent: True if the task may run several times at once, see :meth:`set_idempotent`
+    :vartype idempotent: bool
+
+    :cvar pool: executor sub-pool that bounds how many tasks of this kind run at once
+    :vartype pool: str
+
     """
 
     def __init__(
@@ -160,16 +242,16 @@ class Task(Thread):
         :type endpoint: str
 
         """
-        Thread.__init__(self)
         self.ssh_connection = None
         self.name = name
         self.nexts: List[Any] = []
         self.prevs: List[Any] = []
+        self.derived_prevs: List[Any] = []
         self.reference_count = 0
-        self.remove_scratch_dir = False
         self.ip = None
-        self.running = False
         self.workflow = None
+        self._runtime: Optional[TaskRuntime] = None
+        self._fair: Optional[Tuple[List[Any], List[Any], Dict[str, Any]]] = None
         self.set_status(dagon.Status.READY)
         self.working_dir = working_dir
         self.command = command
@@ -181,15 +263,153 @@ class Task(Thread):
         self.stager_mover = None
         self.mode = "sequential"
         self.globusendpoint = globusendpoint
-        self.new_tasks = []
-        self.completetion_time = 0
-        self.logger = logging.getLogger()
+        self.semaphore: Optional[Semaphore] = None
+        self.idempotent = False
+        self.backup: Optional[Any] = None
+
+    running = _runtime_field("running", "True if the task is in execution")
+    result = _runtime_field("result", "Execution result of the task, None until it was executed")
+    completetion_time = _runtime_field("completetion_time", "Seconds the task spent executing")
+    remove_scratch_dir = _runtime_field(
+        "remove_scratch_dir", "True if the sratch directory has to be removed after the execution of this task")
+    fair_checkpoint_reused = _runtime_field("checkpoint_reused", "True if the task reused a checkpointed result")
+    result_key = _runtime_field("result_key", "Result cache key of the running task, None when it is not cached")
+    release_time = _runtime_field("release_time", "Time when the producers of the task ended, None before")
+    execution_start = _runtime_field("execution_start", "Time when the task started executing, None before")
+    staged_bytes = _runtime_field("staged_bytes", "Bytes of local sources staged in for the task")
+
+    def get_runtime(self) -> "TaskRuntime":
+        """
+        Return the execution record of the task, created on first use
+
+        :return: execution state of the task
+        :rtype: :class:`dagon.task.TaskRuntime`
+        """
+        if self._runtime is None:
+            self._runtime = TaskRuntime()
+        return self._runtime
+
+    @property
+    def new_tasks(self) -> List[Any]:
+        """Tasks created by this task when it runs in parallel mode"""
+        return self.get_runtime().new_tasks
+
+    @property
+    def transfers(self) -> List[Any]:
+        """Files staged in for this task by the Python transfer engine, see :mod:`dagon.stager.transfer`"""
+        return self.get_runtime().transfers
+
+    def start(self) -> None:
+        """
+        Execute :meth:`run` in a new thread, as :meth:`threading.Thread.start` does
+
+        :raises RuntimeError: the task was already started
+        """
+        runtime = self.get_runtime()
+        if runtime.thread is not None:
+            raise RuntimeError("threads can only be started once")
+        runtime.thread = Thread(target=self.run, name=self.name)
+        runtime.thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait until the thread started by :meth:`start` ends
+
+        :param timeout: maximum number of seconds to wait
+        :type timeout: float
+
+        :raises RuntimeError: the task was not started
+        """
+        thread = self._runtime.thread if self._runtime is not None else None
+        if thread is None:
+            raise RuntimeError("cannot join thread before it is started")
+        thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        """Return True while the thread started by :meth:`start` is executing"""
+        return self._runtime is not None and self._runtime.thread is not None and self._runtime.thread.is_alive()
+
+    @property
+    def ident(self) -> Optional[int]:
+        """Identifier of the thread started by :meth:`start`, None if the task was not started"""
+        if self._runtime is None or self._runtime.thread is None:
+            return None
+        return self._runtime.thread.ident
+
+    def _fair_metadata(self) -> Tuple[List[Any], List[Any], Dict[str, Any]]:
         # Declarations are inert unless the owning workflow enables FAIR.
-        self.fair_inputs = []
-        self.fair_outputs = []
-        self.fair_annotations = {}
-        self.fair_checkpoint_reused = False
-        
+        if self._fair is None:
+            self._fair = ([], [], {})
+        return self._fair
+
+    @property
+    def fair_inputs(self) -> List[Any]:
+        """Input artifacts declared with :meth:`declare_inputs`"""
+        return self._fair_metadata()[0]
+
+    @property
+    def fair_outputs(self) -> List[Any]:
+        """Output artifacts declared with :meth:`declare_outputs`"""
+        return self._fair_metadata()[1]
+
+    @property
+    def fair_annotations(self) -> Dict[str, Any]:
+        """Annotations attached with :meth:`annotate`"""
+        return self._fair_metadata()[2]
+
+    @property
+    def command(self) -> Any:
+        """Command executed by the task; assigning it discards the parsed references and relinks them"""
+        return self._command
+
+    @command.setter
+    def command(self, command: Any) -> None:
+        self._command = command
+        self._references: Optional[Tuple[WorkflowReference, ...]] = None
+        workflow = getattr(self, "workflow", None)
+        if workflow is not None:
+            workflow._invalidate(self)
+
+    def get_references(self) -> Tuple[WorkflowReference, ...]:
+        """
+        Return the table of workflow:// references of this task, parsed once
+
+        :return: references in order of appearance, without repetitions
+        :rtype: tuple(:class:`dagon.references.WorkflowReference`)
+        """
+        if self._references is None:
+            self._references = self._scan_references()
+        return self._references
+
+    def _scan_references(self) -> Tuple[WorkflowReference, ...]:
+        """Parse the references of the task; tasks without a shell command override it"""
+        return scan_command(self.command)
+
+    def resolve_reference(self, reference: WorkflowReference) -> Optional[Any]:
+        """
+        Return the producer task named by a reference
+
+        :param reference: parsed reference of this task
+        :type reference: :class:`dagon.references.WorkflowReference`
+
+        :return: the producer, None when it is not part of the known workflows
+        :rtype: :class:`dagon.task.Task`
+        """
+        workflow_name = reference.workflow_name(self.workflow.name)
+        if self.workflows is None:
+            return self.workflow.find_task_by_name(workflow_name, reference.task)
+        for wf in self.workflows:
+            task = wf.find_task_by_name(workflow_name, reference.task)
+            if task is not None:
+                return task
+        return None
+
+    def release_references(self) -> None:
+        """Decrement the reference count of every producer referenced by this task"""
+        for reference in self.get_references():
+            task = self.resolve_reference(reference)
+            if task is not None:
+                task.decrement_reference_count()
 
     def declare_inputs(self, *artifacts: Any) -> "Task":
         """Attach intentional input artifact metadata and return this task."""
@@ -237,12 +457,77 @@ class Task(Thread):
         self.fair_checkpoint_reused = True
         return True
 
+    def result_spec(self) -> Optional[Dict[str, Any]]:
+        """Return what determines the output of the task, None when it must not be served from the result cache.
+
+        The specification holds the task type, the command and the digest of
+        every file or directory the command reads through ``workflow://``
+        references or that was declared with :meth:`declare_inputs`, as
+        :func:`dagon.incremental.fingerprint` sees them. Tasks whose working
+        directory is not on this machine are not cached.
+        """
+        if not isinstance(self.command, str) or \
+                (self.ssh_connection is not None and not self.workflow.is_portable_emulation()):
+            return None
+        cache = self.workflow.result_cache
+        declared_references, local_paths = incremental.declared_inputs(self)
+        inputs = {}
+        for reference in list(self.get_references()) + declared_references:
+            producer = self.resolve_reference(reference)
+            if producer is None or producer.working_dir is None:
+                return None
+            digest = cache.digest(os.path.join(producer.working_dir, reference.path))
+            if digest is None:
+                return None
+            inputs[reference.raw] = digest
+        for local_path in local_paths:
+            digest = cache.digest(local_path)
+            if digest is None:
+                return None
+            inputs[local_path] = digest
+        return {"type": type(self).__name__, "command": self.command, "inputs": inputs}
+
+    def reuse_result(self) -> bool:
+        """Materialise the output of an identical earlier execution from the workflow result cache.
+
+        On a miss the key is kept in :attr:`result_key` so :meth:`store_result`
+        can add the output once the task succeeds.
+        """
+        cache = self.workflow.result_cache
+        self.result_key = None
+        if cache is None:
+            return False
+        spec = self.result_spec()
+        if spec is None:
+            return False
+        key = cache.key(spec)
+        if not cache.fetch(key, self.working_dir):
+            self.result_key = key
+            return False
+        self.workflow.logger.debug("%s Reused from the result cache ---", self.name)
+        self.workflow.checkpoints.record(self.checkpoint_key(), code=0, result_key=key)
+        self.fair_checkpoint_reused = True
+        return True
+
+    def store_result(self) -> None:
+        """Add the working directory of a successful execution to the workflow result cache."""
+        key = self.result_key
+        if key is None or self.workflow.result_cache is None:
+            return
+        try:
+            self.workflow.result_cache.store(key, self.working_dir, self.result_spec())
+        except OSError as e:
+            self.workflow.logger.warning("%s: Output not stored in the result cache: %s", self.name, e)
+            return
+        self.workflow.checkpoints.record(self.checkpoint_key(), result_key=key)
+
     def initialize_checkpoint(self) -> Dict[str, Any]:
         """Create the common checkpoint record after a working directory exists."""
         checkpoint = {
             "working_dir": self.working_dir,
             "workflow": self.workflow.name,
             "name": self.name,
+            "fingerprint": incremental.fingerprint(self),
         }
         self.workflow.checkpoints[self.checkpoint_key()] = checkpoint
         return checkpoint
@@ -253,16 +538,16 @@ class Task(Thread):
         checkpoint_task = type(self).__name__ in {"Checkpoint", "RemoteCheckpoint"}
         if checkpoint_task:
             command = command.split("checkpoint.sh ", 1)[-1]
-        for previous in self.prevs:
-            for prefix in ("workflow:///%s/" % previous.name,
-                           "workflow://%s/%s/" % (self.workflow.name, previous.name)):
-                while prefix in command:
-                    start = command.index(prefix)
-                    end = start + len(prefix)
-                    while end < len(command) and not command[end].isspace() and command[end] not in "'\";|)&":
-                        end += 1
-                    relative = command[start + len(prefix):end]
-                    command = command[:start] + os.path.join(previous.working_dir, relative) + command[end:]
+        producers = {previous.name: previous for previous in self.prevs}
+
+        def local_path(reference: WorkflowReference) -> str:
+            producer = producers.get(reference.task)
+            if producer is None or reference.workflow not in ("", self.workflow.name) \
+                    or reference.raw[len(dagon.Workflow.SCHEMA):].count("/") < 2:
+                return reference.raw
+            return os.path.join(producer.working_dir, reference.path)
+
+        command = substitute(command, local_path, "'\";|)&")
         return "test -f " + " ".join(shlex.quote(item) for item in command.split()) if checkpoint_task else command
 
     def execute_portable(self) -> None:
@@ -276,15 +561,20 @@ class Task(Thread):
             self.working_dir = os.path.join(self.workflow.get_scratch_dir_base(), self.get_scratch_name())
         os.makedirs(os.path.join(self.working_dir, ".dagon"), exist_ok=True)
         self.initialize_checkpoint()
+        if self.reuse_result():
+            self.remove_reference_workflow()
+            return
         self.workflow._fire_event("on_task_execute_start", self)
-        completed = subprocess.run(self.portable_command(), cwd=self.working_dir,
-                                   shell=True, executable="/bin/bash", text=True,
-                                   capture_output=True)
+        with self.trace("execute"):
+            completed = subprocess.run(self.portable_command(), cwd=self.working_dir,
+                                       shell=True, executable="/bin/bash", text=True,
+                                       capture_output=True)
         self.result = {"code": completed.returncode, "message": completed.stderr,
                        "output": completed.stdout}
-        self.workflow.checkpoints[key]["code"] = completed.returncode
+        self.workflow.checkpoints.record(key, code=completed.returncode)
         if completed.returncode:
             raise RuntimeError("Portable task failed: " + completed.stderr)
+        self.store_result()
         self.remove_reference_workflow()
 
     def get_endpoint(self) -> Optional[str]:
@@ -316,6 +606,28 @@ class Task(Thread):
         """
         self.stager_mover = stager_mover
 
+    def set_idempotent(self, idempotent: bool = True, backup: Optional[Any] = None) -> "Task":
+        """
+        Declare that running the task twice at once is safe, so a straggling execution can be speculated
+
+        When the workflow speculates (:meth:`dagon.Workflow.enable_speculation`), a slow execution of an
+        idempotent task gets a duplicate attempt in a fresh scratch directory; the first one that succeeds
+        is kept and the other one is cancelled.
+
+        :param idempotent: False to stop speculating the task
+        :type idempotent: bool
+
+        :param backup: builds the task that runs the duplicate attempt, for example on another host;
+            by default a copy of this task on the same backend
+        :type backup: callable(:class:`dagon.task.Task`) returning a :class:`dagon.task.Task`
+
+        :return: this task
+        :rtype: :class:`dagon.task.Task`
+        """
+        self.idempotent = bool(idempotent)
+        self.backup = backup
+        return self
+
     def set_info(self, info: TaskInfo) -> None:
         """
         Change the information of the machine where the task is going to be executed. The information is used by
@@ -430,8 +742,10 @@ class Task(Thread):
         :param status: status of the task
         :type status: :class:`dagon.task.Status`
         """
+        previous = getattr(self, "status", None)
         self.status = status
         if self.workflow is not None:
+            self.workflow.metrics.status_changed(previous, status)
             self.workflow.logger.debug("%s: %s", self.name, self.status)
             if self.workflow.is_api_available:
                 self.workflow.api.update_task_status(
@@ -453,6 +767,7 @@ class Task(Thread):
         """
         task.nexts.append(self)
         self.prevs.append(task)
+        self.workflow._graph_changed()
 
         if self.workflow.is_api_available:  # add in the server
             self.workflow.api.add_dependency(
@@ -466,6 +781,7 @@ class Task(Thread):
         :type task: :class:`dagon.task.Task`
         """
         self.prevs.append(task)
+        self.workflow._graph_changed()
 
         if self.workflow.is_api_available:  # add in the server
             self.workflow.api.add_dependency(
@@ -495,8 +811,7 @@ class Task(Thread):
         self.working_dir = self.working_dir + "-removed"
 
         # Update the checkpoint
-        self.workflow.checkpoints[self.workflow.name + "." +
-                                  self.name]["working_dir"] = self.working_dir
+        self.workflow.checkpoints.record(self.checkpoint_key(), working_dir=self.working_dir)
 
     # Decrement the reference count
 
@@ -509,13 +824,8 @@ class Task(Thread):
         # Check if the scratch directory must be removed
         if self.reference_count == 0 and self.remove_scratch_dir is True:
             # Call garbage collector (remove scratch directory, container, cloud instace, etc)
-            self.on_garbage()
-
-            if self.workflow.checkpoint_file is not None:
-                fp = open(self.workflow.checkpoint_file, 'w')
-                fp.write(dumps(self.workflow.checkpoints,
-                         sort_keys=True, indent=4))
-                fp.close()
+            with self.trace("garbage"):
+                self.on_garbage()
 
     def set_semaphore(self, sem: Semaphore) -> None:
         self.semaphore = sem
@@ -529,58 +839,15 @@ class Task(Thread):
         2) Add a reference in the referenced task
 
         """
-        # Index of the starting position
-        pos = 0
         # get workflows of dag_tps
         if self.dag_tps is not None:
             self.workflows = self.dag_tps.workflows
 
-        # Forever unless no anymore dagon.Workflow.SCHEMA are present
-        while True:
-            # Get the position of the next dagon.Workflow.SCHEMA
-            pos1 = self.command.find(dagon.Workflow.SCHEMA, pos)
-
-            # Check if there is no dagon.Workflow.SCHEMA
-            if pos1 == -1:
-                # Exit the forever cycle
-                break
-
-            # Find the first occurrent of a whitespace (or if no occurrence means the end of the string)
-            pos2 = self.command.find(" ", pos1)
-
-            # Check if this is the last referenced argument
-            if pos2 == -1:
-                pos2 = len(self.command)
-
-            # Extract the parameter string
-            arg = self.command[pos1:pos2]
-
-            # Remove the dagon.Workflow.SCHEMA label
-            arg = arg.replace(dagon.Workflow.SCHEMA, "")
-
-            # Split each argument in elements by the slash
-            elements = arg.split("/")
-
-            # Extract the referenced task's workflow name
-            workflow_name = elements[0]
-
-            # The task name is the first element
-            task_name = elements[1]
-
-            # Set the default workflow name if needed
-            if workflow_name is None or workflow_name == "":
-                workflow_name = self.workflow.name
+        for reference in self.get_references():
+            workflow_name = reference.workflow_name(self.workflow.name)
 
             # Extract the reference task object
-
-            if self.workflows is None:
-                task = self.workflow.find_task_by_name(
-                    workflow_name, task_name)
-            else:
-                for wf in self.workflows:
-                    task = wf.find_task_by_name(workflow_name, task_name)
-                    if task is not None:
-                        break
+            task = self.resolve_reference(reference)
 
             # Check if the refernced task is consistent
             if task is not None:
@@ -592,25 +859,11 @@ class Task(Thread):
                 # Add the reference from the task
                 task.increment_reference_count()
 
-                # TODO: check this code
-                """
-                if self.mode == "parallel":
-                    for next_task in self.nexts:
-                        if self in next_task.prevs:
-                            next_task.prevs.remove(self)
-                        
-                        for new_task in self.new_tasks:
-                            next_task.add_dependency_to(new_task)
-                """
-
             if task is None:  # if is None means that task is from another WF maybe in the dagon service
-                # self.workflow.logger.debug("Adding transversal point")
-                # self.workflow.logger.debug(workflow_name)
-                # self.workflow.logger.debug(task)
                 if self.workflow.is_api_available:
                     workflow_id = self.workflow.api.get_workflow_by_name(
                         workflow_name)
-                    transversal_task = self.workflow.api.get_task(workflow_id, task_name)[
+                    transversal_task = self.workflow.api.get_task(workflow_id, reference.task)[
                         'task']  # get the task from the external workflow
                     transversal_task = DagonTask(TaskType[transversal_task['type'].upper()], transversal_task['name'],
                                                  transversal_task['command'],
@@ -620,9 +873,6 @@ class Task(Thread):
                 else:
                     raise ConnectionError("Dagon service is not available")
 
-            # Go to the next element
-            pos = pos2
-
     # Pre process command
     def pre_process_command(self, command):
         """
@@ -669,27 +919,9 @@ class Task(Thread):
 
         context_script += header + self.get_how_im_script() + "\n\n"
 
-        # execute context script
-        result = self.on_execute(context_script, "context.sh")
-        if result['code']:
-            raise Exception(result['message'])
-
-        # Step 1: Unescape the backslashes
-        unescaped_output = result['output'].encode(
-            'utf-8').decode('unicode_escape')
-
-        # Optional: remove trailing newline if needed
-        unescaped_output = unescaped_output.strip()
-
-        # Get only the JSON part of the output
-        parts_output = unescaped_output.split(
-            "************************************")
-        if len(parts_output) > 1:
-            json_output = parts_output[1].strip()
-        else:
-            raise ValueError("Output does not contain expected JSON format")
-
-        info = loads(json_output)
+        # Probe the execution target; tasks on the same target reuse the answer
+        with self.trace("context"):
+            info = self.workflow.context_cache.get(self.context_key(), lambda: self.probe_context(context_script))
 
         if "dynostore" in self.workflow.cfg:
             info['dynostore'] = self.workflow.cfg['dynostore']
@@ -707,59 +939,17 @@ class Task(Thread):
         # Create the body
         body = command
 
-        # Index of the starting position
-        pos = 0
-
-        # Forever unless no anymore dagon.Workflow.SCHEMA are present
-        while True:
-
-            # Get the position of the next dagon.Workflow.SCHEcdMA
-            pos1 = command.find(dagon.Workflow.SCHEMA, pos)
-
-            # Check if there is no dagon.Workflow.SCHEMA
-            if pos1 == -1:
-                # Exit the forever cycle
-                break
-
-            # Find the first occurrent of a whitespace (or if no occurrence means the end of the string)
-            pos2 = command.find(" ", pos1)
-
-            # Check if this is the last referenced argument
-            if pos2 == -1:
-                pos2 = len(command)
-
-            # Extract the parameter string
-            arg = command[pos1:pos2]
-
-            # Remove the dagon.Workflow.SCHEMA label
-            arg = arg.replace(dagon.Workflow.SCHEMA, "")
-
-            # Split each argument in elements by the slash
-            elements = arg.split("/")
-
-            # Extract the referenced task's workflow name
-            workflow_name = elements[0]
-
-            # The task name is the first element
-            task_name = elements[1]
+        references = self.get_references() if command == self.command else scan_command(command)
+        for reference in references:
+            arg = reference.raw[len(dagon.Workflow.SCHEMA):]
+            workflow_name = reference.workflow_name(self.workflow.name)
+            task_name = reference.task
 
             # Get the rest of the string as local path
-            local_path = "/" + "/".join(elements[2:])
-
-            # Set the default workflow name if needed
-            if workflow_name is None or workflow_name == "":
-                workflow_name = self.workflow.name
+            local_path = "/" + reference.path
 
             # Extract the reference task object
-            # task = self.workflow.find_task_by_name(workflow_name, task_name)
-            if self.workflows is None:
-                task = self.workflow.find_task_by_name(
-                    workflow_name, task_name)
-            else:
-                for wf in self.workflows:
-                    task = wf.find_task_by_name(workflow_name, task_name)
-                    if task is not None:
-                        break
+            task = self.resolve_reference(reference)
 
             if task is None:  # if is None means that task is from another WF maybe in the dagon service
                 if self.workflow.is_api_available:
@@ -795,9 +985,14 @@ class Task(Thread):
                 header = header + "\n\n# Create the destination directory\n"
                 header = header + "mkdir -p " + quote(dst_path + "/" + path.dirname(local_path)) + "\n"
                 header = header + "if [ $? -ne 0 ]; then code=1; fi\n\n"
-                # Add the move data command
-                header = header + \
-                    stager.stage_in(self, task, dst_path, local_path)
+                # Add the move data command, from the copy prefetched to this host if any
+                prefetched = None
+                if self.workflow.prefetch is not None:
+                    prefetched = self.workflow.prefetch.claim(self, task, local_path)
+                if prefetched is not None:
+                    header = header + stager.stage_in_prefetched(self, prefetched, dst_path, local_path)
+                else:
+                    header = header + stager.stage_in(self, task, dst_path, local_path)
 
                 if self.mode == "parallel":
                     files = glob.glob(
@@ -814,7 +1009,7 @@ class Task(Thread):
                             parallel_task = DagonTask(taskType, taskParallelName, cmd,
                                                       transversal_workflow=self.transversal_workflow)
 
-                        if type(self) == dagon.batch.RemoteBatch:
+                        elif type(self) == dagon.batch.RemoteBatch:
                             parallel_task = DagonTask(taskType, taskParallelName, cmd, ssh_username=self.ssh_username,
                                                       keypath=self.keypath, ip=self.ip)
 
@@ -872,22 +1067,30 @@ class Task(Thread):
                         self.workflow.add_task(parallel_task)
                         self.new_tasks.append(parallel_task)
 
-                    for next_task in self.nexts:
-                        if self in next_task.prevs:
+                    # The consumers wait for the fan-out tasks instead of this task
+                    consumers = [next_task for next_task in dict.fromkeys(self.nexts)
+                                 if next_task not in self.new_tasks]
+                    for next_task in consumers:
+                        while self in next_task.prevs:
                             next_task.prevs.remove(self)
+                        while next_task in self.nexts:
+                            self.nexts.remove(next_task)
 
                         for new_task in self.new_tasks:
                             next_task.add_dependency_to(new_task)
 
-                    self.workflow.make_dependencies()
+                    # Link only the fan-out tasks and count again the consumers edited above
+                    self.workflow.update_dependencies(consumers)
 
-                    body = "echo \"Starting parallel tasks...\"\n"
-                    body += "ln -sf " + quote(dst_path + "/" + local_path) + " " + quote(self.get_scratch_dir())
+                    # Link each staged file, a quoted pattern would not expand
+                    staged_dir = dst_path + "/" + path.dirname(local_path) + "/"
+                    body = "\n".join(["echo \"Starting parallel tasks...\""] +
+                                     ["ln -sf " + quote(staged_dir + path.basename(file)) + " " +
+                                      quote(self.get_scratch_dir()) for file in files])
                 else:
                     # Change the body of the command
                     body = body.replace(
                         dagon.Workflow.SCHEMA + arg, dst_path + "/" + local_path)
-            pos = pos2
 
         # Invoke the command
         header = header + "\n\n# Invoke the command\n"
@@ -951,6 +1154,107 @@ class Task(Thread):
         file.close()
         chmod(script_name, 0o744)
 
+    def open_output(self, script_name: str) -> Optional[OutputCapture]:
+        """
+        Return the capture that streams the output of the launcher, None for the other scripts
+
+        The launcher pipes the command's stdout into ``.dagon/stdout.txt`` itself; the capture
+        of a local launcher also writes its stderr to ``.dagon/stderr.txt``.
+
+        :param script_name: script name
+        :type script_name: str
+
+        :return: capture of the launcher output
+        :rtype: :class:`dagon.output.OutputCapture`
+        """
+        if script_name != "launcher.sh":
+            return None
+        files = {}
+        if self.ssh_connection is None:
+            files["stderr"] = path.join(self.working_dir, ".dagon", STREAM_FILES["stderr"])
+        tail_size = DEFAULT_TAIL
+        if self.workflow is not None:
+            tail_size = self.workflow.cfg.get("output", {}).get("tail_size", DEFAULT_TAIL)
+        capture = OutputCapture(files, tail_size)
+        capture.isolated = self.idempotent
+        self.get_runtime().output = capture
+        return capture
+
+    def cancel(self) -> bool:
+        """
+        Stop the launcher of the running task; it then ends with an error
+
+        Local launchers of idempotent tasks run in their own session, so every process they started
+        is stopped. Remote launchers lose their SSH channel.
+
+        :return: False when the launcher is not running
+        :rtype: bool
+        """
+        capture = self._runtime.output if self._runtime is not None else None
+        if capture is None:
+            return False
+        capture.cancel()
+        return True
+
+    def discard_working_dir(self) -> None:
+        """Remove the scratch directory of an attempt whose result is not used"""
+        if self.working_dir is not None:
+            shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def trace(self, name: str, **attributes: Any) -> Any:
+        """
+        Context manager that times a phase of this task
+
+        The duration is observed by the workflow metrics and, when the workflow
+        is traced, recorded as a span of its tracer.
+
+        :param name: phase name, see :mod:`dagon.tracing`
+        :type name: str
+
+        :param attributes: attributes of the span
+        :type attributes: dict(str, object)
+        """
+        tracer = getattr(self.workflow, "tracer", None)
+        metrics = getattr(self.workflow, "metrics", None)
+        start_time = time()
+        try:
+            if tracer is None:
+                yield
+            else:
+                with tracer.span(self, name, **attributes):
+                    yield
+        finally:
+            if metrics is not None:
+                metrics.phases.observe(time() - start_time, (name,))
+
+    def tail(self, stream: str = "stdout", size: Optional[int] = None) -> str:
+        """
+        Return the end of the launcher output, while the task runs or after it ended
+
+        Tasks that did not run their launcher in this process (for example
+        reused from a checkpoint) read the end of ``.dagon/stdout.txt`` or
+        ``.dagon/stderr.txt`` instead.
+
+        :param stream: ``stdout`` or ``stderr``
+        :type stream: str
+
+        :param size: characters returned, at most the ``[output] tail_size`` kept in memory
+        :type size: int
+
+        :return: the last characters written to *stream*, empty before the launcher starts
+        :rtype: str
+        """
+        if stream not in STREAM_FILES:
+            raise ValueError("Unknown output stream %s" % stream)
+        capture = self._runtime.output if self._runtime is not None else None
+        if capture is not None:
+            return capture.tail(stream, size)
+        if self.working_dir is None or self.ssh_connection is not None:
+            return ""
+        return read_tail(path.join(self.working_dir, ".dagon", STREAM_FILES[stream]),
+                         DEFAULT_TAIL if size is None else size)
+
     # create path using mkdirs
     def mkdir_working_dir(self, path):
         """
@@ -990,126 +1294,199 @@ class Task(Thread):
         Remove the reference
         For each workflow:// in the command
         """
-        # Remove the reference
-        # For each workflow:// in the command
+        with self.trace("release"):
+            self.release_references()
 
-        # Index of the starting position
-        pos = 0
+        if len(self.nexts) == 0 and self.remove_scratch_dir is True:
+            with self.trace("garbage"):
+                self.on_garbage()
 
-        # Forever unless no anymore dagon.Workflow.SCHEMA are present
-        while True:
-            # Get the position of the next dagon.Workflow.SCHEMA
-            pos1 = self.command.find(dagon.Workflow.SCHEMA, pos)
+    # Method execute
+    def execute(self):
+        """
+        Execute the task
 
-            # Check if there is no dagon.Workflow.SCHEMA
-            if pos1 == -1:
-                # Exit the forever cycle
-                break
+        :raises Exception: a problem occurred during the task  execution
+        """
+        if self.workflow.is_portable_emulation() is True:
+            return self.execute_portable()
+        launcher_script = self.prepare_execution()
+        if launcher_script is not None:
+            # Invoke the actual executor
+            start_time = time()
+            with self.trace("execute"):
+                result = self.on_execute(launcher_script, "launcher.sh")
+            if self.idempotent and self.workflow.speculation is not None:
+                # The first successful attempt of a speculated task wins
+                result = self.workflow.speculation.settle(self, result)
+            self.complete_execution(result, start_time)
+        self.stage_out()
 
-            # Find the first occurrent of a whitespace (or if no occurrence means the end of the string)
-            pos2 = self.command.find(" ", pos1)
+    async def execute_async(self):
+        """
+        Coroutine counterpart of :meth:`execute` used by :meth:`dagon.Workflow.run_async`
 
-            # Check if this is the last referenced argument
-            if pos2 == -1:
-                pos2 = len(self.command)
+        Preparing and staging run in the workflow blocking pool; the launcher is awaited through
+        :meth:`on_execute_async`. Tasks that override :meth:`execute` run it in the blocking pool.
 
-            # Extract the parameter string
-            arg = self.command[pos1:pos2]
+        :raises Exception: a problem occurred during the task  execution
+        """
+        if type(self).execute is not Task.execute or self.workflow.is_portable_emulation() is True:
+            await self.run_blocking(self.execute)
+            return
+        launcher_script = await self.run_blocking(self.prepare_execution)
+        if launcher_script is not None:
+            start_time = time()
+            with self.trace("execute"):
+                result = await self.on_execute_async(launcher_script, "launcher.sh")
+            if self.idempotent and self.workflow.speculation is not None:
+                result = await self.run_blocking(self.workflow.speculation.settle, self, result)
+            self.complete_execution(result, start_time)
+        await self.run_blocking(self.stage_out)
 
-            # Remove the dagon.Workflow.SCHEMA label
-            arg = arg.replace(dagon.Workflow.SCHEMA, "")
+    def prepare_execution(self):
+        """
+        Create the working directory and the launcher script of the task
 
-            # Split each argument in elements by the slash
-            elements = arg.split("/")
+        :return: launcher script, or None when the checkpoint or a cached result is reused or the workflow is dry
+        :rtype: str
+        """
+        # Local checkpoint
+        if self.reuse_checkpoint():
+            self.workflow.logger.debug(
+                "%s Already completed ---" % (self.name))
+            return None
+        self.create_working_dir()
+        self.initialize_checkpoint()
+        if self.workflow.dry is False and self.reuse_result():
+            return None
 
-            # Extract the referenced task's workflow name
-            workflow_name = elements[0]
+        # ``pre_process_command`` creates the staging-in portion of the
+        # launcher.  The generated launcher performs that staging when it
+        # is subsequently executed.
+        self.workflow._fire_event("on_task_staging_in_start", self)
+        try:
+            launcher_script = self.pre_process_command(self.command)
+        finally:
+            self.workflow._fire_event("on_task_staging_in_end", self)
+        # Apply some command post processing
+        launcher_script = self.post_process_command(launcher_script)
 
-            # The task name is the first element
-            task_name = elements[1]
+        # Execute only if not dry
+        self.workflow._fire_event("on_task_execute_start", self)
+        if self.workflow.dry is not False:
+            return None
+        return launcher_script
 
-            # Set the default workflow name if needed
-            if workflow_name is None or workflow_name == "":
-                workflow_name = self.workflow.name
+    def complete_execution(self, result, start_time):
+        """
+        Record the result of the launcher execution
 
-            # Extract the reference task object
-            # task = self.workflow.find_task_by_name(workflow_name, task_name)
-            if self.workflows is None:
-                task = self.workflow.find_task_by_name(
-                    workflow_name, task_name)
-            else:
-                for wf in self.workflows:
-                    task = wf.find_task_by_name(workflow_name, task_name)
-                    if task is not None:
-                        break
+        :param result: execution result returned by :meth:`on_execute`
+        :type result: dict() with the execution output (str), code (int) and message (str)
 
-            # Check if the refernced task is consistent
-            if task is not None:
-                # Remove the reference from the task
-                task.decrement_reference_count()
+        :param start_time: time when the launcher was started
+        :type start_time: float
 
-            # Go to the next element
-            pos = pos2
+        :raises Exception: the launcher exited with an error code
+        """
+        self.result = result
+        self.completetion_time = time() - start_time
+        self.workflow.logger.debug(
+            "%s Completed in %s seconds ---" % (self.name, self.completetion_time))
 
-        if len(self.nexts) == 0 and self.remove_scratch_dir is True:
-            self.on_garbage()
+        self.workflow.checkpoints.record(self.checkpoint_key(), code=self.result['code'])
 
-    # Method execute
-    def execute(self):
-        """
-        Execute the task
+        # Check if the execution failed
+        if self.result['code']:
+            raise Exception(
+                'Executable raised a execption ' + self.result['message'])
+        self.store_result()
 
-        :raises Exception: a problem occurred during the task  execution
+    def record_completion_time(self, elapsed):
         """
-        if self.workflow.is_portable_emulation() is True:
-            return self.execute_portable()
-        key = self.checkpoint_key()
+        Store the duration of the task in its checkpoint record, used to estimate later runs
 
-        # Local checkpoint
-        if self.reuse_checkpoint():
-            self.workflow.logger.debug(
-                "%s Already completed ---" % (self.name))
-        else:
-            self.create_working_dir()
-            self.initialize_checkpoint()
+        :param elapsed: seconds the task spent executing
+        :type elapsed: float
+        """
+        if self.fair_checkpoint_reused:
+            return
+        if not self.completetion_time:
+            self.completetion_time = elapsed
+        if self.checkpoint_key() in self.workflow.checkpoints:
+            self.workflow.checkpoints.record(self.checkpoint_key(), completetion_time=self.completetion_time)
 
-            # ``pre_process_command`` creates the staging-in portion of the
-            # launcher.  The generated launcher performs that staging when it
-            # is subsequently executed.
-            self.workflow._fire_event("on_task_staging_in_start", self)
-            try:
-                launcher_script = self.pre_process_command(self.command)
-            finally:
-                self.workflow._fire_event("on_task_staging_in_end", self)
-            # Apply some command post processing
-            launcher_script = self.post_process_command(launcher_script)
-
-            # Execute only if not dry
-            self.workflow._fire_event("on_task_execute_start", self)
-            if self.workflow.dry is False:
-
-                # Invoke the actual executor
-                start_time = time()
-                self.result = self.on_execute(launcher_script, "launcher.sh")
-                self.completetion_time = time() - start_time
-                self.workflow.logger.debug(
-                    "%s Completed in %s seconds ---" % (self.name, self.completetion_time))
-
-                self.workflow.checkpoints[key]["code"] = self.result['code']
-
-                # Check if the execution failed
-                if self.result['code']:
-                    raise Exception(
-                        'Executable raised a execption ' + self.result['message'])
-
-        # DAGonStar currently has no separate output-transfer phase.  These
-        # hooks bracket the existing post-execution output/reference cleanup.
+    def stage_out(self):
+        """
+        Start prefetching the outputs of this task to the hosts of its consumers, when the workflow
+        prefetches (see :mod:`dagon.prefetch`), and release the references of this task to its producers
+        """
+        # The prefetch transfers run in the background; consumers wait for them when they stage in
         self.workflow._fire_event("on_task_staging_out_start", self)
         try:
+            if self.workflow.prefetch is not None:
+                self.workflow.prefetch.push(self)
             self.remove_reference_workflow()
         finally:
             self.workflow._fire_event("on_task_staging_out_end", self)
 
+    async def on_execute_async(self, script, script_name):
+        """
+        Coroutine counterpart of :meth:`on_execute`; runs it in the workflow blocking pool
+
+        :param script: script content
+        :type script: str
+
+        :param script_name: script name
+        :type script_name: str
+
+        :return: execution result
+        :rtype: dict() with the execution output (str) and code (int)
+        """
+        return await self.run_blocking(self.on_execute, script, script_name)
+
+    async def run_blocking(self, function, *args):
+        """
+        Run a blocking callable in the blocking pool of the running workflow
+
+        :param function: callable to run
+        :type function: callable
+
+        :return: the value returned by the callable
+        """
+        loop = asyncio.get_event_loop()
+        pool = getattr(self.workflow, "_blocking_pool", None)
+        return await loop.run_in_executor(pool, functools.partial(function, *args))
+
+    def _transversal_poll(self, task):
+        """
+        Check whether a producer from another workflow ended
+
+        :param task: producer task
+        :type task: :class:`dagon.task.Task`
+
+        :return: None when the producer ended, otherwise seconds to wait before checking again
+        :rtype: float
+        """
+        if self.workflow.is_api_available and task.transversal_workflow is not None:  # when is an asynchronous execution
+            try:
+                transversal_task = self.workflow.api.get_task(task.transversal_workflow, task.name)[
+                    'task']  # get the task from the external workflow using the api
+                if transversal_task['status'] == dagon.Status.FINISHED.value or transversal_task[
+                        'status'] == dagon.Status.FAILED.value:
+                    return None
+                return 1
+            except Exception as e:
+                task.set_status(dagon.Status.FAILED)
+                self.workflow.logger.warning(
+                    'Worflow dependence not found, Error: ' + str(e))
+                return None
+        # when is used the dag_tps structure
+        if task.status == dagon.Status.FINISHED or task.status == dagon.Status.FAILED:
+            return None
+        return .5
+
     def run(self):
         """
         Runs the thread where the task will be executed
@@ -1121,38 +1498,17 @@ class Task(Thread):
                 self.set_status(dagon.Status.WAITING)
                 self.workflow._fire_event("on_task_wait", self)
 
-                # Wait for each previous tasks
+                # Producers of this workflow already ended: the workflow
+                # scheduler starts a task only when all of them are done.
+                # Producers of other workflows are still waited for here.
                 for task in self.prevs:
-                    # if its a process from other workflow
-                    if self.workflow.find_task_by_name(self.workflow.name, task.name) is None:
-                        while True:
-                            if self.workflow.is_api_available and task.transversal_workflow is not None:  # when is an asynchronous execution
-                                try:
-                                    transversal_task = self.workflow.api.get_task(task.transversal_workflow, task.name)[
-                                        'task']  # get the task from the external workflow using the api
-                                    if transversal_task['status'] == dagon.Status.FINISHED.value or transversal_task[
-                                            'status'] == dagon.Status.FAILED.value:
-                                        break
-                                    else:
-                                        sleep(1)
-                                except Exception as e:
-                                    task.set_status(dagon.Status.FAILED)
-                                    self.workflow.logger.warning(
-                                        'Worflow dependence not found, Error: ' + str(e))
-                                    break
-                            # when is used the dag_tps structure
-                            elif task.status == dagon.Status.FINISHED or task.status == dagon.Status.FAILED:
-                                break
-                            else:
-                                sleep(.5)
-                    else:
-                        while True:
-                            # if this happends, the workflow is probably a meta-workflow
-                            if task.status == dagon.Status.WAITING or task.status == dagon.Status.READY:
-                                sleep(.5)
-                            else:
-                                task.join()
-                                break
+                    if task.workflow is self.workflow:
+                        continue
+                    with self.trace("wait.external", producer=task.name):
+                        delay = self._transversal_poll(task)
+                        while delay is not None:
+                            sleep(delay)
+                            delay = self._transversal_poll(task)
 
                 # Check if one of the previous tasks crashed
                 for task in self.prevs:
@@ -1164,19 +1520,9 @@ class Task(Thread):
                 self.set_status(dagon.Status.RUNNING)
                 # Execute the task Job
                 self.workflow.logger.debug("%s: Executing...", self.name)
-                # self.semaphore.acquire()
+                start_time = self.execution_start = time()
                 self.execute()
-                sleep(2)
-                # Start all next task
-                for task in self.nexts:
-                    if task.status == dagon.Status.READY:
-                        self.workflow.logger.debug(
-                            "%s: Starting task: %s", self.name, task.name)
-                        try:
-                            task.start()
-                        except RuntimeError:
-                            self.workflow.logger.warning(
-                                "%s: Task %s already started.", self.name, task.name)
+                self.record_completion_time(time() - start_time)
 
                 # Change the status
                 # self.workflow.api.update_task(self.workflow.workflow_id, self.name, "working_dir", self.working_dir)
@@ -1187,6 +1533,105 @@ class Task(Thread):
                 self.set_status(dagon.Status.FAILED)
             finally:
                 self.workflow._fire_event("on_task_end", self)
+                # Release the consumers of this task
+                self.workflow._task_ended(self)
+
+    async def run_async(self):
+        """
+        Coroutine counterpart of :meth:`run` used by :meth:`dagon.Workflow.run_async`
+        """
+        if self.workflow is not None:
+            self.workflow._fire_event("on_task_start", self)
+            try:
+                self.set_status(dagon.Status.WAITING)
+                self.workflow._fire_event("on_task_wait", self)
+
+                # Only producers of other workflows are waited for here
+                for task in self.prevs:
+                    if task.workflow is self.workflow:
+                        continue
+                    with self.trace("wait.external", producer=task.name):
+                        delay = await self.run_blocking(self._transversal_poll, task)
+                        while delay is not None:
+                            await asyncio.sleep(delay)
+                            delay = await self.run_blocking(self._transversal_poll, task)
+
+                # Check if one of the previous tasks crashed
+                for task in self.prevs:
+                    if task.status == dagon.Status.FAILED:
+                        self.set_status(dagon.Status.FAILED)
+                        return
+
+                self.set_status(dagon.Status.RUNNING)
+                self.workflow.logger.debug("%s: Executing...", self.name)
+                start_time = self.execution_start = time()
+                await self.execute_async()
+                self.record_completion_time(time() - start_time)
+                self.set_status(dagon.Status.FINISHED)
+            except Exception:
+                self.workflow.logger.exception("%s: execution failed", self.name)
+                self.set_status(dagon.Status.FAILED)
+            finally:
+                self.workflow._fire_event("on_task_end", self)
+                self.workflow._task_ended(self)
+
+    def context_key(self) -> Optional[Tuple[Any, ...]]:
+        """
+        Return the execution target whose context this task shares with other tasks
+
+        Tasks with the same key reuse one ``context.sh`` probe through
+        :class:`dagon.context.ContextCache`.
+
+        :return: hashable description of the target, None to probe for this task alone
+        :rtype: tuple
+        """
+        return None
+
+    def probe_context(self, context_script: str) -> Dict[str, Any]:
+        """
+        Execute the context script and parse the machine information it prints
+
+        :param context_script: script that ends printing the JSON of :meth:`get_how_im_script`
+        :type context_script: str
+
+        :return: machine information (type, ip, public_ip, user and protocol status)
+        :rtype: dict(str, object)
+        """
+        result = self.on_execute(context_script, "context.sh")
+        if result['code']:
+            raise Exception(result['message'])
+
+        # Step 1: Unescape the backslashes
+        unescaped_output = result['output'].encode(
+            'utf-8').decode('unicode_escape')
+
+        # Optional: remove trailing newline if needed
+        unescaped_output = unescaped_output.strip()
+
+        # Get only the JSON part of the output
+        parts_output = unescaped_output.split(
+            "************************************")
+        if len(parts_output) > 1:
+            json_output = parts_output[1].strip()
+        else:
+            raise ValueError("Output does not contain expected JSON format")
+
+        return loads(json_output)
+
+    def public_key_command(self) -> str:
+        """
+        Return the command that prints the temporal public key of the task
+
+        The key pair is created in the ``.dagon`` directory of the task the
+        first time a SCP transfer asks for it.
+
+        :return: shell command
+        :rtype: str
+        """
+        key_path = quote(self.working_dir + "/.dagon/ssh_key")
+        script = ("test -f %s || ssh-keygen -b 2048 -t rsa -f %s -q -N '' </dev/null >/dev/null; cat %s.pub"
+                  % (key_path, key_path, key_path))
+        return join_command(("sh", "-c", script))
 
     def get_public_key(self):
         """
@@ -1216,45 +1661,11 @@ class Task(Thread):
         # Remove the reference
         # For each workflow:// in the command
 
-        # Index of the starting position
-        pos = 0
         temp = self.command
-        while True:
-            # Get the position of the next dagon.Workflow.SCHEMA
-            pos1 = self.command.find(dagon.Workflow.SCHEMA, pos)
-
-            # Check if there is no dagon.Workflow.SCHEMA
-            if pos1 == -1:
-                # Exit the forever cycle
-                break
-
-            # Find the first occurrent of a whitespace (or if no occurrence means the end of the string)
-            pos2 = self.command.find(" ", pos1)
-
-            # Check if this is the last referenced argument
-            if pos2 == -1:
-                pos2 = len(self.command)
-
-            # Extract the parameter string
-            arg = self.command[pos1:pos2]
-
-            # Remove the dagon.Workflow.SCHEMA label
-            arg = arg.replace(dagon.Workflow.SCHEMA, "")
-
-            # Split each argument in elements by the slash
-            elements = arg.split("/")
-
-            # Extract the referenced task's workflow name
-            workflow_name = elements[0]
-
-            # Set the default workflow name if needed
-            if workflow_name is None or workflow_name == "":
-                pass
-            else:
-                temp = temp.replace(workflow_name, "")
-
-            # Go to the next element
-            pos = pos2
+        for reference in self.get_references():
+            # Drop the explicit workflow names
+            if reference.workflow:
+                temp = temp.replace(reference.workflow, "")
         return temp
 
     def get_how_im_script(self):
@@ -1346,8 +1757,6 @@ fi
 # Get the user
 user=$USER
 
-echo "no" | ssh-keygen  -b 2048 -t rsa -f ssh_key -q -N ""  >/dev/null
-
 # Construct the json
 json="{\\\"type\\\":\\\"$machine_type\\\",\\\"public_ip\\\":\\\"$public_ip\\\",\\\"ip\\\":\\\"$private_ip\\\",\\\"user\\\":\\\"$user\\\",\\\"SCP\\\":\\\"$status_sshd\\\",\\\"FTP\\\":\\\"$status_ftpd\\\",\\\"GRIDFTP\\\":\\\"$status_gsiftpd\\\",\\\"SKYCDS\\\":\\\"$status_skycds\\\"}"
 echo $json
@@ -0,0 +1,277 @@
+"""Phase-level tracing of workflow runs.
+
+:meth:`dagon.Workflow.enable_tracing` attaches a :class:`Tracer` to the
+workflow.  It turns the workflow events into spans (the run, each task, its
+staging in and out) and receives the spans that tasks and backends open
+around the other phases with :meth:`dagon.task.Task.trace`:
+
+``dependencies``
+    from the start of the run until the producers of the task ended
+``queue``
+    from then until an execution slot started the task
+``wait.external``
+    polling producers of other workflows
+``context``, ``stage_in``, ``execute``, ``stage_out``, ``release``, ``garbage``
+    context probe, launcher generation, launcher execution, post-execution
+    phase, reference release and scratch-directory collection
+``prefetch``
+    background copy of an output to the host of a consumer, see :mod:`dagon.prefetch`
+``image_pull``, ``container_create``, ``pod_create``, ``slurm.queue``
+    backend phases
+
+Spans are exported as Chrome ``trace_event`` JSON (``chrome://tracing``,
+Perfetto), with one row per task, and as OTLP/JSON trace data, which
+OpenTelemetry collectors and viewers import.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+#: Exporters of :meth:`Tracer.export`, by format name.
+FORMATS = ("chrome", "otlp")
+
+_SCOPE = "dagon"
+
+
+class Span(object):
+    """One timed phase of a task or of the run; times are nanoseconds since the epoch."""
+
+    __slots__ = ("span_id", "parent_id", "name", "task", "start", "end", "attributes")
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, task: Optional[str],
+                 start: int, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.task = task
+        self.start = start
+        self.end: Optional[int] = None
+        self.attributes = dict(attributes or {})
+
+    @property
+    def duration(self) -> float:
+        """Seconds the span lasted, up to now while it is open."""
+        return ((self.end if self.end is not None else time.time_ns()) - self.start) / 1e9
+
+
+class Tracer(object):
+    """Spans of the runs of one workflow."""
+
+    def __init__(self, workflow: Any, chrome: Optional[str] = None, otlp: Optional[str] = None) -> None:
+        """
+        :param workflow: traced workflow
+        :type workflow: :class:`dagon.Workflow`
+
+        :param chrome: Chrome trace file written when each run ends
+        :type chrome: str
+
+        :param otlp: OTLP/JSON file written when each run ends
+        :type otlp: str
+        """
+        self.workflow = workflow
+        self.files = {"chrome": chrome, "otlp": otlp}
+        self.spans: List[Span] = []
+        self.trace_id = os.urandom(16).hex()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._run: Optional[Span] = None
+        # Open spans of each task, innermost last
+        self._open: Dict[Any, List[Span]] = {}
+        self._roots: Dict[Any, Span] = {}
+        self._hooks = self._listeners()
+        for event_name, listener in self._hooks.items():
+            workflow.add_listener(event_name, listener)
+
+    def _listeners(self) -> Dict[str, Any]:
+        return {
+            "on_workflow_start": self._workflow_start,
+            "on_workflow_end": self._workflow_end,
+            "on_task_start": self._task_start,
+            "on_task_end": lambda task: self.end(task, "task"),
+            "on_task_staging_in_start": lambda task: self.begin(task, "stage_in"),
+            "on_task_staging_in_end": lambda task: self.end(task, "stage_in"),
+            "on_task_staging_out_start": lambda task: self.begin(task, "stage_out"),
+            "on_task_staging_out_end": lambda task: self.end(task, "stage_out"),
+        }
+
+    def close(self) -> None:
+        """Stop receiving the events of the workflow."""
+        for event_name, listener in self._hooks.items():
+            try:
+                self.workflow.remove_listener(event_name, listener)
+            except ValueError:
+                pass
+
+    def _new(self, name: str, task: Any, parent: Optional[Span], start: Optional[int],
+             attributes: Dict[str, Any]) -> Span:
+        span = Span(self._next_id, parent.span_id if parent is not None else None, name,
+                    task.name if task is not None else None,
+                    time.time_ns() if start is None else start, attributes)
+        self._next_id += 1
+        self.spans.append(span)
+        return span
+
+    def _parent(self, task: Any) -> Optional[Span]:
+        stack = self._open.get(task)
+        if stack:
+            return stack[-1]
+        return self._roots.get(task, self._run)
+
+    def begin(self, task: Any, name: str, **attributes: Any) -> Span:
+        """Open a span of *task*, nested in its innermost open span."""
+        with self._lock:
+            span = self._new(name, task, self._parent(task), None, attributes)
+            self._open.setdefault(task, []).append(span)
+            return span
+
+    def end(self, task: Any, name: str, **attributes: Any) -> Optional[Span]:
+        """Close the innermost open span of *task* called *name*, and the spans opened inside it."""
+        now = time.time_ns()
+        with self._lock:
+            stack = self._open.get(task, [])
+            for index in range(len(stack) - 1, -1, -1):
+                if stack[index].name == name:
+                    break
+            else:
+                return None
+            for span in stack[index:]:
+                span.end = now
+            span = stack[index]
+            span.attributes.update(attributes)
+            del stack[index:]
+            return span
+
+    @contextlib.contextmanager
+    def span(self, task: Any, name: str, **attributes: Any) -> Iterator[Span]:
+        """Context manager that times a phase of *task*; failures are recorded in the ``error`` attribute."""
+        span = self.begin(task, name, **attributes)
+        try:
+            yield span
+        except BaseException as exc:
+            span.attributes["error"] = str(exc)
+            raise
+        finally:
+            self.end(task, name)
+
+    def add(self, task: Any, name: str, start: float, end: float, **attributes: Any) -> Span:
+        """
+        Record a phase that was measured elsewhere, for example by the batch scheduler
+
+        :param start: start of the phase, in seconds since the epoch
+        :type start: float
+
+        :param end: end of the phase, in seconds since the epoch
+        :type end: float
+        """
+        with self._lock:
+            span = self._new(name, task, self._parent(task), int(start * 1e9), attributes)
+            span.end = int(end * 1e9)
+            return span
+
+    def _workflow_start(self, workflow: Any) -> None:
+        with self._lock:
+            self._run = self._new("workflow", None, None, None, {"workflow": workflow.name})
+            self._roots.clear()
+
+    def _workflow_end(self, workflow: Any) -> None:
+        with self._lock:
+            if self._run is not None:
+                self._run.end = time.time_ns()
+        for file_format, file_path in self.files.items():
+            if file_path:
+                self.export(file_path, file_format)
+
+    def _task_start(self, task: Any) -> None:
+        now = time.time_ns()
+        with self._lock:
+            root = self._new("task", task, self._run, now, {"task": task.name, "type": type(task).__name__})
+            self._roots[task] = root
+            self._open[task] = [root]
+            run_start = self._run.start if self._run is not None else now
+            released = int(task.release_time * 1e9) if task.release_time is not None else now
+            released = min(max(released, run_start), now)
+            for name, start, end in (("dependencies", run_start, released), ("queue", released, now)):
+                self._new(name, task, root, start, {}).end = end
+
+    def _finished(self) -> List[Span]:
+        with self._lock:
+            return [span for span in self.spans if span.end is not None]
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """
+        Return the closed spans as a Chrome ``trace_event`` document
+
+        :return: JSON object with ``traceEvents``
+        :rtype: dict(str, object)
+        """
+        spans = self._finished()
+        rows: Dict[Optional[str], int] = {None: 0}
+        events: List[Dict[str, Any]] = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": 0,
+                                         "args": {"name": self.workflow.name}}]
+        for span in spans:
+            if span.task not in rows:
+                rows[span.task] = len(rows)
+                events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": rows[span.task],
+                               "args": {"name": span.task}})
+        for span in sorted(spans, key=lambda span: (span.start, span.span_id)):
+            events.append({"name": span.name, "cat": span.task or "workflow", "ph": "X", "pid": 1,
+                           "tid": rows[span.task], "ts": span.start / 1e3, "dur": (span.end - span.start) / 1e3,
+                           "args": span.attributes})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otlp(self) -> Dict[str, Any]:
+        """
+        Return the closed spans as OTLP/JSON trace data (``ExportTraceServiceRequest``)
+
+        :return: JSON object with ``resourceSpans``
+        :rtype: dict(str, object)
+        """
+        spans = []
+        for span in self._finished():
+            attributes = dict(span.attributes)
+            if span.task is not None:
+                attributes.setdefault("task", span.task)
+            record = {"traceId": self.trace_id, "spanId": "%016x" % span.span_id, "name": span.name,
+                      "kind": 1, "startTimeUnixNano": str(span.start), "endTimeUnixNano": str(span.end),
+                      "attributes": [_attribute(key, value) for key, value in attributes.items()]}
+            if span.parent_id is not None:
+                record["parentSpanId"] = "%016x" % span.parent_id
+            if "error" in attributes:
+                record["status"] = {"code": 2, "message": str(attributes["error"])}
+            spans.append(record)
+        resource = {"attributes": [_attribute("service.name", "dagon"),
+                                   _attribute("dagon.workflow", self.workflow.name)]}
+        return {"resourceSpans": [{"resource": resource,
+                                   "scopeSpans": [{"scope": {"name": _SCOPE}, "spans": spans}]}]}
+
+    def export(self, file_path: str, file_format: str = "chrome") -> None:
+        """
+        Write the closed spans to a file
+
+        :param file_path: destination file
+        :type file_path: str
+
+        :param file_format: ``chrome`` or ``otlp``
+        :type file_format: str
+        """
+        if file_format not in FORMATS:
+            raise ValueError("Unknown trace format %s" % file_format)
+        document = self.chrome_trace() if file_format == "chrome" else self.otlp()
+        with open(file_path, "w") as fp:
+            json.dump(document, fp, default=str)
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
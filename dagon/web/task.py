@@ -1,23 +1,28 @@
 """Declarative HTTP/HTTPS workflow task."""
 
+import asyncio
 import json
 import os
 import shutil
 import subprocess
 import sys
+from asyncio.subprocess import PIPE
 from pathlib import Path
-from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 import dagon
 from dagon.batch import Slurm
+from dagon.references import WorkflowReference, parse_reference, scan_value
 from dagon.shell import join_command
 from dagon.task import Task
-from dagon.web.schema import references, safe_output_path, validate
+from dagon.web.schema import safe_output_path, validate
 
 
 class WebTask(Task):
     """Run a JSON-serializable web request through a scratch-local runner."""
 
+    pool = "service"
+
     def __init__(self, name: str, specification: Mapping[str, Any], executor: str = "local",
                  resources: Optional[Mapping[str, Any]] = None, python: str = sys.executable,
                  working_dir: Optional[str] = None, environment: Optional[Mapping[str, str]] = None,
@@ -33,45 +38,36 @@ class WebTask(Task):
                       globusendpoint=globusendpoint)
 
     @staticmethod
-    def _parse_reference(reference: str) -> Tuple[str, str, str]:
-        pieces = reference[len(dagon.Workflow.SCHEMA):].split("/")
-        if len(pieces) < 3 or not pieces[1] or not "/".join(pieces[2:]):
+    def _parse_reference(reference: str) -> WorkflowReference:
+        parsed = parse_reference(reference)
+        if not parsed.task or not parsed.path:
             raise ValueError("Invalid web workflow input reference: %s" % reference)
-        relative = safe_output_path("/".join(pieces[2:]))
-        return pieces[0], pieces[1], relative
+        return parsed._replace(path=safe_output_path(parsed.path))
 
-    def _references(self) -> Iterable[str]:
-        seen = set()
-        for reference in references(self.specification):
-            if reference not in seen:
-                seen.add(reference)
-                yield reference
+    def _scan_references(self) -> Tuple[WorkflowReference, ...]:
+        return tuple(self._parse_reference(reference.raw) for reference in scan_value(self.specification))
 
     def pre_run(self) -> None:
-        for reference in self._references():
-            workflow_name, task_name, _ = self._parse_reference(reference)
-            workflow_name = workflow_name or self.workflow.name
-            task = self.workflow.find_task_by_name(workflow_name, task_name)
+        for reference in self.get_references():
+            workflow_name = reference.workflow_name(self.workflow.name)
+            task = self.resolve_reference(reference)
             if task is None:
-                raise ValueError("Web input producer was not found: %s" % reference)
+                raise ValueError("Web input producer was not found: %s" % reference.raw)
             if workflow_name == self.workflow.name:
                 self.add_dependency_to(task)
             else:
                 self.add_transversal_point(task)
             task.increment_reference_count()
 
-    def _staged_path(self, reference: str) -> str:
-        workflow_name, task_name, relative = self._parse_reference(reference)
-        return "inputs/%s/%s/%s" % (workflow_name or self.workflow.name, task_name, relative)
+    def _staged_path(self, reference: WorkflowReference) -> str:
+        return "inputs/%s/%s/%s" % (reference.workflow_name(self.workflow.name), reference.task, reference.path)
 
     def _stage_inputs(self) -> None:
-        for reference in self._references():
-            workflow_name, task_name, relative = self._parse_reference(reference)
-            workflow_name = workflow_name or self.workflow.name
-            producer = self.workflow.find_task_by_name(workflow_name, task_name)
+        for reference in self.get_references():
+            producer = self.resolve_reference(reference)
             if producer is None or producer.working_dir is None:
-                raise ValueError("Web input producer is unavailable: %s" % reference)
-            source = Path(producer.working_dir, relative)
+                raise ValueError("Web input producer is unavailable: %s" % reference.raw)
+            source = Path(producer.working_dir, reference.path)
             if not source.is_file():
                 raise FileNotFoundError("Web input file does not exist: %s" % source)
             destination = Path(self.working_dir, self._staged_path(reference))
@@ -80,17 +76,17 @@ class WebTask(Task):
 
     def _resolve(self, value: Any) -> Any:
         if isinstance(value, str):
-            for reference in self._references():
-                value = value.replace(reference, self._staged_path(reference))
+            for reference in self.get_references():
+                value = value.replace(reference.raw, self._staged_path(reference))
             return value
         if isinstance(value, list):
             return [self._resolve(item) for item in value]
         if not isinstance(value, dict):
             return value
         if set(value) == {"text"} and isinstance(value["text"], str) and value["text"].startswith("workflow://"):
-            return Path(self.working_dir, self._staged_path(value["text"])).read_text(encoding="utf-8")
+            return Path(self.working_dir, self._staged_path(self._parse_reference(value["text"]))).read_text(encoding="utf-8")
         if set(value) == {"json_file"} and isinstance(value["json_file"], str) and value["json_file"].startswith("workflow://"):
-            return json.loads(Path(self.working_dir, self._staged_path(value["json_file"])).read_text(encoding="utf-8"))
+            return json.loads(Path(self.working_dir, self._staged_path(self._parse_reference(value["json_file"]))).read_text(encoding="utf-8"))
         return {key: self._resolve(item) for key, item in value.items()}
 
     def as_json(self) -> Dict[str, Any]:
@@ -104,10 +100,10 @@ class WebTask(Task):
         slurm.working_dir = self.working_dir
         return slurm.generate_command(script_name)
 
-    def execute(self) -> None:
+    def _prepare_request(self) -> Optional[Tuple[str, Dict[str, Any]]]:
         if self.reuse_checkpoint():
-            self._release_references()
-            return
+            self.release_references()
+            return None
         self.create_working_dir()
         key = self.checkpoint_key()
         self.initialize_checkpoint()
@@ -121,46 +117,82 @@ class WebTask(Task):
         finally:
             self.workflow._fire_event("on_task_staging_in_end", self)
         self.workflow._fire_event("on_task_execute_start", self)
+        return key, resolved
+
+    def _emulate(self, key: str, resolved: Dict[str, Any]) -> None:
+        outputs = resolved.get("outputs") or {}
+        for name, relative in outputs.items():
+            target = Path(self.working_dir, "outputs", relative)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(json.dumps({"portable": True, "output": name,
+                                          "request": resolved}, sort_keys=True) + "\n",
+                              encoding="utf-8")
+        self.workflow.checkpoints.record(key, code=0)
+        self.release_references()
+
+    def _runner_command(self) -> List[str]:
+        return [self.python, "-m", "dagon.web.runner", ".dagon/web_request.json"]
+
+    def _write_slurm_launcher(self) -> None:
+        launcher = "#! /bin/bash\ncd " + self.working_dir + "\n" + join_command(self._runner_command()) + "\n"
+        Task.on_execute(self, launcher, "web_launcher.sh")
+
+    def _record_local(self, returncode: int, stdout: str, stderr: str) -> None:
+        Path(self.working_dir, ".dagon/web_stdout.txt").write_text(stdout, encoding="utf-8")
+        Path(self.working_dir, ".dagon/web_stderr.txt").write_text(stderr, encoding="utf-8")
+        if returncode:
+            raise RuntimeError("Web request failed: " + stderr)
+
+    def _stage_out(self) -> None:
+        self.workflow._fire_event("on_task_staging_out_start", self)
+        try:
+            self.release_references()
+        finally:
+            self.workflow._fire_event("on_task_staging_out_end", self)
+
+    def execute(self) -> None:
+        prepared = self._prepare_request()
+        if prepared is None:
+            return
+        key, resolved = prepared
         if not self.workflow.dry:
             if self.workflow.is_portable_emulation() is True:
-                outputs = resolved.get("outputs") or {}
-                for name, relative in outputs.items():
-                    target = Path(self.working_dir, "outputs", relative)
-                    target.parent.mkdir(parents=True, exist_ok=True)
-                    target.write_text(json.dumps({"portable": True, "output": name,
-                                                  "request": resolved}, sort_keys=True) + "\n",
-                                      encoding="utf-8")
-                self.workflow.checkpoints[key]["code"] = 0
-                self._release_references()
+                self._emulate(key, resolved)
                 return
-            command = [self.python, "-m", "dagon.web.runner", ".dagon/web_request.json"]
             environment = dict(os.environ, **self.environment)
             if self.executor == "local":
-                completed = subprocess.run(command, cwd=self.working_dir, env=environment, text=True, capture_output=True)
-                Path(self.working_dir, ".dagon/web_stdout.txt").write_text(completed.stdout, encoding="utf-8")
-                Path(self.working_dir, ".dagon/web_stderr.txt").write_text(completed.stderr, encoding="utf-8")
-                if completed.returncode:
-                    raise RuntimeError("Web request failed: " + completed.stderr)
+                completed = subprocess.run(self._runner_command(), cwd=self.working_dir, env=environment, text=True,
+                                           capture_output=True)
+                self._record_local(completed.returncode, completed.stdout, completed.stderr)
             else:
-                launcher = "#! /bin/bash\ncd " + self.working_dir + "\n" + join_command(command) + "\n"
-                Task.on_execute(self, launcher, "web_launcher.sh")
+                self._write_slurm_launcher()
                 completed = subprocess.run(self.generate_slurm_command("web_launcher.sh"), shell=True, text=True, capture_output=True)
                 if completed.returncode:
                     raise RuntimeError("Web Slurm request failed: " + completed.stderr)
-            self.workflow.checkpoints[key]["code"] = 0
-        self.workflow._fire_event("on_task_staging_out_start", self)
-        try:
-            for reference in self._references():
-                workflow_name, task_name, _ = self._parse_reference(reference)
-                producer = self.workflow.find_task_by_name(workflow_name or self.workflow.name, task_name)
-                if producer:
-                    producer.decrement_reference_count()
-        finally:
-            self.workflow._fire_event("on_task_staging_out_end", self)
+            self.workflow.checkpoints.record(key, code=0)
+        self._stage_out()
 
-    def _release_references(self) -> None:
-        for reference in self._references():
-            workflow_name, task_name, _ = self._parse_reference(reference)
-            producer = self.workflow.find_task_by_name(workflow_name or self.workflow.name, task_name)
-            if producer:
-                producer.decrement_reference_count()
+    async def execute_async(self) -> None:
+        prepared = await self.run_blocking(self._prepare_request)
+        if prepared is None:
+            return
+        key, resolved = prepared
+        if not self.workflow.dry:
+            if self.workflow.is_portable_emulation() is True:
+                await self.run_blocking(self._emulate, key, resolved)
+                return
+            environment = dict(os.environ, **self.environment)
+            if self.executor == "local":
+                process = await asyncio.create_subprocess_exec(*self._runner_command(), cwd=self.working_dir,
+                                                               env=environment, stdout=PIPE, stderr=PIPE)
+                stdout, stderr = await process.communicate()
+                self._record_local(process.returncode, stdout.decode(), stderr.decode())
+            else:
+                self._write_slurm_launcher()
+                process = await asyncio.create_subprocess_shell(self.generate_slurm_command("web_launcher.sh"),
+                                                                stdout=PIPE, stderr=PIPE)
+                _, stderr = await process.communicate()
+                if process.returncode:
+                    raise RuntimeError("Web Slurm request failed: " + stderr.decode())
+            self.workflow.checkpoints.record(key, code=0)
+        await self.run_blocking(self._stage_out)
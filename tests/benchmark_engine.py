@@ -0,0 +1,195 @@
+"""Scaling benchmark of the workflow engine on synthetic DAGs.
+
+Builds chains, wide fan-out/fan-in graphs, layered random graphs and the
+envapp hours x domains shape, then times ``add_task``, ``make_dependencies``,
+``Validate_WF``, ``as_json``, ``saveAsCWL`` and an end-to-end ``run`` of
+no-op tasks.  Every case runs in its own interpreter so peak RSS is not
+shared between cases.  Results are written as JSON::
+
+    python -m tests.benchmark_engine --sizes 1000 10000 100000 --output engine.json
+
+The file name does not match the unittest discovery pattern; the benchmark
+only runs when invoked explicitly.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import dagon
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+SHAPES = ("chain", "fanout", "layered", "envapp")
+SIZES = (1000, 10000, 100000)
+# Consumers of a fan-in reference at most this many producers each
+FAN_IN = 100
+
+
+def _command(*producers: str) -> str:
+    return " ".join(["true"] + ["workflow:///%s/out.txt" % name for name in producers])
+
+
+def chain(size: int) -> List[Any]:
+    """T0 <- T1 <- ... <- Tn-1"""
+    return [("T%d" % index, _command(*(["T%d" % (index - 1)] if index else []))) for index in range(size)]
+
+
+def fanout(size: int) -> List[Any]:
+    """One source, a wide middle layer and a tree of collectors back to one sink"""
+    collectors = max(1, (size - 2) // (FAN_IN + 1))
+    width = max(1, size - 2 - collectors)
+    specs = [("source", _command())]
+    specs += [("M%d" % index, _command("source")) for index in range(width)]
+    names = ["M%d" % index for index in range(width)]
+    groups = [names[start:start + FAN_IN] for start in range(0, width, FAN_IN)]
+    groups = groups[:collectors - 1] + [sum(groups[collectors - 1:], [])]
+    specs += [("C%d" % index, _command(*group)) for index, group in enumerate(groups)]
+    specs.append(("sink", _command(*("C%d" % index for index in range(len(groups))))))
+    return specs
+
+
+def layered(size: int, seed: int = 0) -> List[Any]:
+    """Square grid of layers; each task reads up to three random tasks of the previous layer"""
+    generator = random.Random(seed)
+    width = max(1, int(size ** 0.5))
+    specs = []
+    for index in range(size):
+        layer, column = divmod(index, width)
+        producers = []
+        if layer:
+            previous = ["L%d_%d" % (layer - 1, item) for item in range(width)]
+            producers = generator.sample(previous, min(3, len(previous)))
+        specs.append(("L%d_%d" % (layer, column), _command(*producers)))
+    return specs
+
+
+def envapp(size: int, domains: int = 3) -> List[Any]:
+    """Hourly WRF -> ROMS -> WaComM runs over nested domains, restarting from the previous hour"""
+    hours = max(1, size // (3 * domains))
+    specs = []
+    for hour in range(hours):
+        for domain in range(domains):
+            def name(model: str, h: int = hour, d: int = domain) -> str:
+                return "%s_%d_%d" % (model, h, d)
+            wrf = ([name("wrf", hour - 1)] if hour else []) + ([name("wrf", hour, domain - 1)] if domain else [])
+            specs.append((name("wrf"), _command(*wrf)))
+            specs.append((name("roms"), _command(*([name("wrf")] + ([name("roms", hour - 1)] if hour else [])))))
+            specs.append((name("wacomm"), _command(*([name("roms")] + ([name("wacomm", hour - 1)] if hour else [])))))
+    return specs
+
+
+BUILDERS: Dict[str, Callable[[int], List[Any]]] = {
+    "chain": chain, "fanout": fanout, "layered": layered, "envapp": envapp}
+
+
+def _timed(results: Dict[str, Any], key: str, function: Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    value = function()
+    results[key] = time.perf_counter() - start
+    return value
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_case(shape: str, size: int, mode: str = "portable", run: bool = True, max_threads: int = 10) -> Dict[str, Any]:
+    """Build and run one synthetic workflow and return its measurements in seconds"""
+    specs = BUILDERS[shape](size)
+    results: Dict[str, Any] = {"shape": shape, "size": size, "tasks": len(specs), "mode": mode,
+                               "references": sum(command.count("workflow://") for _, command in specs)}
+    with tempfile.TemporaryDirectory() as directory:
+        config = minimal_config()
+        config["batch"]["scratch_dir_base"] = directory
+        workflow = dagon.Workflow("bench_" + shape, config=config, max_threads=max_threads,
+                                  portable_emulation=(mode == "portable"))
+        workflow.set_dry(mode == "dry")
+        tasks = [DagonTask(TaskType.BATCH, name, command) for name, command in specs]
+
+        def add_tasks() -> None:
+            for task in tasks:
+                workflow.add_task(task)
+
+        _timed(results, "add_task", add_tasks)
+        _timed(results, "make_dependencies", workflow.make_dependencies)
+        _timed(results, "validate", workflow.Validate_WF)
+        _timed(results, "as_json", workflow.as_json)
+        _timed(results, "save_as_cwl", lambda: workflow.saveAsCWL(os.path.join(directory, "workflow.cwl")))
+        results["levels"] = max(workflow.get_levels().values()) + 1
+        results["threads_peak"] = threading.active_count()
+        if run:
+            peak = [threading.active_count()]
+            workflow.on_task_start += lambda task: peak.__setitem__(0, max(peak[0], threading.active_count()))
+            _timed(results, "run", workflow.run)
+            results["run_per_task"] = results["run"] / len(tasks)
+            results["threads_peak"] = max(peak[0], results["threads_peak"])
+            results["failed"] = sum(1 for task in tasks if task.status != dagon.Status.FINISHED)
+    results["peak_rss_bytes"] = _peak_rss_bytes()
+    return results
+
+
+def run_isolated(shape: str, size: int, mode: str, run: bool, max_threads: int) -> Dict[str, Any]:
+    """Run one case in a fresh interpreter so its peak RSS is its own"""
+    command = [sys.executable, "-m", "tests.benchmark_engine", "--case", shape, str(size), "--mode", mode,
+               "--max-threads", str(max_threads), "--run-max", str(size if run else 0)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run(command, cwd=root, text=True, capture_output=True)
+    if completed.returncode:
+        return {"shape": shape, "size": size, "mode": mode, "error": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--mode", choices=("portable", "dry"), default="portable",
+                        help="run tasks through portable emulation or as a dry run")
+    parser.add_argument("--run-max", type=int, default=10000,
+                        help="largest size whose end-to-end run is measured (default: %(default)s)")
+    parser.add_argument("--max-threads", type=int, default=10)
+    parser.add_argument("--output", help="JSON file for the results (default: standard output)")
+    parser.add_argument("--case", nargs=2, metavar=("SHAPE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        size = int(args.case[1])
+        result = run_case(args.case[0], size, args.mode, size <= args.run_max, args.max_threads)
+        print(json.dumps(result, sort_keys=True))
+        return 0
+
+    cases = []
+    for size in args.sizes:
+        for shape in args.shapes:
+            result = run_isolated(shape, size, args.mode, size <= args.run_max, args.max_threads)
+            cases.append(result)
+            print("%-8s %7d %s" % (shape, size, "error" if "error" in result else
+                                   " ".join("%s=%.3fs" % (key, result[key]) for key in
+                                            ("add_task", "make_dependencies", "validate", "run") if key in result)),
+                  file=sys.stderr)
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "cases": cases}
+    text = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as fp:
+            fp.write(text)
+    else:
+        sys.stdout.write(text)
+    return 1 if any("error" in case or case.get("failed") for case in cases) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
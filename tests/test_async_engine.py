@@ -0,0 +1,103 @@
+import asyncio
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import dagon
+from dagon.batch import Slurm
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class AsyncEngineTests(unittest.TestCase):
+    def _workflow(self, directory, name, **kwargs):
+        config = minimal_config()
+        config["batch"]["scratch_dir_base"] = directory
+        return dagon.Workflow(name, config=config, **kwargs)
+
+    def test_run_async_executes_dependencies_in_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workflow = self._workflow(directory, "AsyncDiamond")
+            workflow.add_task(DagonTask(TaskType.BATCH, "A", "echo A > a.txt"))
+            workflow.add_task(DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt > b.txt"))
+            workflow.add_task(DagonTask(TaskType.BATCH, "C", "cat workflow:///A/a.txt > c.txt"))
+            workflow.add_task(DagonTask(TaskType.BATCH, "D", "cat workflow:///B/b.txt workflow:///C/c.txt > d.txt"))
+
+            events = []
+            workflow.on_task_start += lambda task: events.append(("start", task.name))
+            workflow.on_task_end += lambda task: events.append(("end", task.name))
+            asyncio.run(workflow.run_async())
+
+            self.assertTrue(all(task.status == dagon.Status.FINISHED for task in workflow.tasks))
+            task_d = workflow.find_task_by_name("AsyncDiamond", "D")
+            self.assertEqual(Path(task_d.working_dir, "d.txt").read_text(), "A\nA\n")
+            self.assertLess(events.index(("end", "B")), events.index(("start", "D")))
+            self.assertLess(events.index(("end", "C")), events.index(("start", "D")))
+            # Tasks ran as coroutines, not as task threads
+            self.assertFalse(any(task.is_alive() or task.ident for task in workflow.tasks))
+            self.assertIsNone(workflow._blocking_pool)
+
+    def test_run_async_bounds_blocking_threads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workflow = self._workflow(directory, "AsyncWide", max_threads=50, portable_emulation=True)
+            for index in range(20):
+                workflow.add_task(DagonTask(TaskType.BATCH, "T%d" % index, "sleep 0.1"))
+
+            baseline = threading.active_count()
+            peak = [baseline]
+            workflow.on_task_end += lambda task: peak.__setitem__(0, max(peak[0], threading.active_count()))
+            asyncio.run(workflow.run_async(blocking_threads=2))
+
+            self.assertTrue(all(task.status == dagon.Status.FINISHED for task in workflow.tasks))
+            self.assertLessEqual(peak[0], baseline + 2)
+
+    def test_run_async_marks_consumers_of_failed_tasks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workflow = self._workflow(directory, "AsyncFailure")
+            task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+            workflow.add_task(task_a)
+            workflow.add_task(DagonTask(TaskType.BATCH, "B", "cat workflow:///A/missing.txt"))
+
+            async def fail():
+                raise RuntimeError("boom")
+
+            task_a.execute_async = fail
+            asyncio.run(workflow.run_async())
+
+            self.assertEqual([task.status for task in workflow.tasks], [dagon.Status.FAILED, dagon.Status.FAILED])
+
+    def test_slurm_awaits_sbatch_as_a_subprocess(self):
+        with tempfile.TemporaryDirectory() as directory:
+            task = Slurm("job", "true", working_dir=directory)
+            Path(directory, ".dagon").mkdir()
+            with patch.object(Slurm, "generate_command", return_value="echo Submitted batch job 7"):
+                result = asyncio.run(task.on_execute_async("#!/bin/bash\ntrue\n", "launcher.sh"))
+
+            self.assertEqual(result["code"], 0)
+            self.assertEqual(result["output"], "Submitted batch job 7\n")
+            self.assertTrue(Path(directory, ".dagon", "launcher.sh").is_file())
+
+    def test_nomad_polls_from_the_event_loop(self):
+        from dagon.nomad_task import NomadTask
+
+        with tempfile.TemporaryDirectory() as directory:
+            workflow = self._workflow(directory, "AsyncNomad")
+            task = NomadTask("job", "true", working_dir=directory)
+            workflow.add_task(task)
+            done = {"code": 0, "output": "Job completed", "message": "Success"}
+            with patch.object(NomadTask, "_poll_job", side_effect=[None, None, done]) as poll, \
+                    patch("dagon.nomad_task.asyncio.sleep", new_callable=AsyncMock) as sleep, \
+                    patch.object(NomadTask, "_get_logs", return_value="log\n"):
+                result = asyncio.run(task.on_execute_async("true", "launcher.sh"))
+
+            self.assertEqual(poll.call_count, 3)
+            self.assertEqual(sleep.await_count, 2)
+            self.assertEqual(result["output"], "log\n")
+            self.assertEqual(Path(directory, ".dagon", "stdout.txt").read_text(), "log\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
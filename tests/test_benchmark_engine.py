@@ -0,0 +1,34 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from tests import benchmark_engine
+
+
+class BenchmarkEngineTests(unittest.TestCase):
+    def test_shapes_build_acyclic_graphs_of_the_requested_size(self):
+        for shape in benchmark_engine.SHAPES:
+            with self.subTest(shape=shape):
+                result = benchmark_engine.run_case(shape, 40)
+                self.assertLessEqual(abs(result["tasks"] - 40), 8)
+                self.assertEqual(result["failed"], 0)
+                for key in ("add_task", "make_dependencies", "validate", "as_json", "save_as_cwl", "run",
+                            "peak_rss_bytes", "threads_peak"):
+                    self.assertIn(key, result)
+
+    def test_report_is_machine_readable(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory, "engine.json")
+            status = benchmark_engine.main(["--shapes", "chain", "--sizes", "20", "--run-max", "0",
+                                            "--output", str(output)])
+            report = json.loads(output.read_text())
+
+        self.assertEqual(status, 0)
+        self.assertEqual([(case["shape"], case["size"]) for case in report["cases"]], [("chain", 20)])
+        self.assertEqual(report["cases"][0]["levels"], 20)
+        self.assertNotIn("run", report["cases"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import dagon
+from dagon import checkpoint_db, journal
+from dagon.checkpoint_db import SQLiteCheckpointStore
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class SQLiteCheckpointTests(unittest.TestCase):
+    def test_changes_are_queryable_before_the_store_closes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "runs.sqlite")
+            store = SQLiteCheckpointStore({"WF.A": {"name": "A"}, "_scratch_dir": "/tmp/"})
+            store.open(path, "WF")
+            store.record("WF.A", code=0, working_dir="/scratch/A")
+            store["WF.B"] = {"name": "B"}
+            store.record("WF.B", code=1)
+            del store["_scratch_dir"]
+            store.flush()
+
+            self.assertEqual(journal.load(path, "WF"), {"WF.A": {"name": "A", "code": 0, "working_dir": "/scratch/A"},
+                                                        "WF.B": {"name": "B", "code": 1}})
+            rows = checkpoint_db.status(path, "WF")
+            self.assertEqual([(row["task"], row["working_dir"], row["code"]) for row in rows],
+                             [("A", "/scratch/A", 0), ("B", None, 1)])
+            store.close()
+            self.assertFalse(os.path.exists(journal.journal_path(path)))
+
+    def test_workflows_share_one_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "runs.db")
+            first = SQLiteCheckpointStore({"One.A": {"code": 0}})
+            second = SQLiteCheckpointStore({"Two.A": {"code": 1}})
+            first.open(path, "One")
+            second.open(path, "Two")
+            first.close()
+            second.close()
+
+            self.assertEqual(journal.load(path, "One"), {"One.A": {"code": 0}})
+            self.assertEqual(journal.load(path), {"One.A": {"code": 0}, "Two.A": {"code": 1}})
+            self.assertEqual([row["workflow"] for row in checkpoint_db.status(path, task="A")], ["One", "Two"])
+
+            # Reopening a workflow replaces its rows only
+            SQLiteCheckpointStore().open(path, "One")
+            self.assertEqual(journal.load(path), {"Two.A": {"code": 1}})
+
+    def test_json_checkpoint_is_migrated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "checkpoint.json")
+            Path(source).write_text(json.dumps({"_scratch_dir": "/tmp/",
+                                                "WF.A": {"workflow": "WF", "code": 0}}))
+            destination = os.path.join(directory, "runs.sqlite3")
+
+            with mock.patch("builtins.print"):
+                self.assertEqual(checkpoint_db.main(["migrate", source, destination]), 0)
+            self.assertEqual(journal.load(destination, "WF"), {"_scratch_dir": "/tmp/",
+                                                               "WF.A": {"workflow": "WF", "code": 0}})
+            self.assertTrue(journal.is_sqlite(destination))
+            with self.assertRaises(ValueError):
+                journal.is_sqlite(destination, "redis")
+
+    def test_reading_a_missing_database_does_not_create_it(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "missing.db")
+            self.assertEqual(journal.load(path), {})
+            self.assertEqual(checkpoint_db.load(path, "WF"), {})
+            self.assertFalse(os.path.exists(path))
+
+    def test_status_of_a_missing_database_does_not_create_it(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "missing.db")
+            self.assertEqual(checkpoint_db.status(path), [])
+            self.assertEqual(checkpoint_db.status(path, "WF", "A"), [])
+            self.assertFalse(os.path.exists(path))
+
+    def test_workflow_runs_and_resumes_from_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = minimal_config()
+            config["batch"]["scratch_dir_base"] = directory
+            config["checkpoint"] = {"backend": "sqlite"}
+            checkpoint_file = os.path.join(directory, "checkpoint.state")
+
+            def build():
+                workflow = dagon.Workflow("Indexed", config=config, checkpoint_file=checkpoint_file,
+                                          portable_emulation=True)
+                workflow.add_task(DagonTask(TaskType.BATCH, "A", "echo A > a.txt"))
+                workflow.add_task(DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt"))
+                return workflow
+
+            first = build()
+            self.assertIsInstance(first.checkpoints, SQLiteCheckpointStore)
+            first.run()
+            self.assertEqual({row["task"]: row["code"] for row in checkpoint_db.status(checkpoint_file)},
+                             {"A": 0, "B": 0})
+
+            second = build()
+            with mock.patch("dagon.task.subprocess.run") as run:
+                second.run(resume_checkpoint_file=checkpoint_file)
+            run.assert_not_called()
+            self.assertTrue(all(task.status == dagon.Status.FINISHED for task in second.tasks))
+
+
+if __name__ == "__main__":
+    unittest.main()
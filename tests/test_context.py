@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from dagon.batch import Batch
+from dagon.context import ContextCache
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import make_workflow
+
+CONTEXT = {"type": "cluster-frontend", "public_ip": "203.0.113.7", "ip": "10.0.0.7", "user": "dagon",
+           "SCP": "active", "FTP": "none", "GRIDFTP": "none", "SKYCDS": "none"}
+
+
+class ContextCacheTests(unittest.TestCase):
+    def test_probe_results_expire_after_the_ttl(self):
+        now = [0.0]
+        cache = ContextCache(ttl=60, clock=lambda: now[0])
+        probe = mock.Mock(side_effect=lambda: dict(CONTEXT))
+
+        self.assertEqual(cache.get(("local",), probe), CONTEXT)
+        cache.get(("local",), probe)["ip"] = "changed"
+        now[0] = 59.0
+        self.assertEqual(cache.get(("local",), probe)["ip"], "10.0.0.7")
+        self.assertEqual(probe.call_count, 1)
+
+        now[0] = 60.0
+        cache.get(("local",), probe)
+        cache.get(None, probe)
+        cache.get(None, probe)
+        self.assertEqual(probe.call_count, 4)
+        self.assertEqual(len(cache), 1)
+
+    def test_concurrent_tasks_wait_for_the_first_probe(self):
+        cache = ContextCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def probe():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return dict(CONTEXT)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get(("ssh", "u", "h", 22), probe)))
+                   for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [CONTEXT] * 4)
+
+    def test_negative_ttl_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ContextCache(ttl=-1)
+
+
+class TaskContextTests(unittest.TestCase):
+    def test_tasks_on_the_same_target_share_one_probe(self):
+        workflow = make_workflow("Context")
+        tasks = [DagonTask(TaskType.BATCH, name, "echo " + name) for name in "ABC"]
+        for task in tasks:
+            workflow.add_task(task)
+            task.working_dir = "/scratch/" + task.name
+        scripts = []
+
+        def on_execute(task, script, script_name):
+            scripts.append(script_name)
+            return {"code": 0, "output": "\n************************************\n" + json.dumps(CONTEXT)}
+
+        with mock.patch.object(Batch, "on_execute", autospec=True, side_effect=on_execute):
+            for task in tasks:
+                task.pre_process_command(task.command)
+
+        self.assertEqual(scripts, ["context.sh"])
+        self.assertEqual([task.get_info()["ip"] for task in tasks], ["10.0.0.7"] * 3)
+        self.assertIsNot(tasks[0].get_info(), tasks[1].get_info())
+
+        workflow.context_cache.invalidate()
+        with mock.patch.object(Batch, "on_execute", autospec=True, side_effect=on_execute):
+            tasks[0].pre_process_command(tasks[0].command)
+        self.assertEqual(scripts, ["context.sh", "context.sh"])
+
+    def test_context_keys_name_the_execution_target(self):
+        self.assertEqual(DagonTask(TaskType.BATCH, "A", "true").context_key(), ("local",))
+        self.assertEqual(DagonTask(TaskType.SLURM, "B", "true", partition="gpu").context_key(), ("slurm", "gpu"))
+        with mock.patch("dagon.remote.SSHManager"):
+            remote = DagonTask(TaskType.BATCH, "C", "true", ip="192.0.2.1", ssh_username="user")
+        self.assertEqual(remote.context_key(), ("ssh", "user", "192.0.2.1", 22))
+
+    def test_probe_does_not_create_ssh_keys(self):
+        self.assertNotIn("ssh-keygen", DagonTask(TaskType.BATCH, "A", "true").get_how_im_script())
+
+    @unittest.skipUnless(shutil.which("ssh-keygen"), "ssh-keygen is not installed")
+    def test_public_key_is_created_on_first_request(self):
+        with tempfile.TemporaryDirectory() as directory:
+            task = DagonTask(TaskType.BATCH, "A", "true")
+            task.working_dir = directory
+            os.makedirs(os.path.join(directory, ".dagon"))
+
+            key = task.get_public_key()
+            self.assertTrue(key.startswith("ssh-rsa "))
+            self.assertEqual(task.get_public_key(), key)
+
+
+if __name__ == "__main__":
+    unittest.main()
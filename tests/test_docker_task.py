@@ -131,7 +131,7 @@ class TestDockerTask(unittest.TestCase):
         result = self.task.on_execute("script content", "run.sh")
 
         mock_task_exec.assert_called_once()
-        mock_batch_exec.assert_called_with("bash /app/.dagon/run.sh")
+        mock_batch_exec.assert_called_with("bash /app/.dagon/run.sh", None)
         self.assertEqual(result["output"], "ok")
 
     @patch("dagon.docker_task.DockerTask.remove_container")
@@ -225,7 +225,7 @@ class TestDockerRemoteTask(unittest.TestCase):
         result = self.task.on_execute("launcher.sh", "script.sh")
 
         self.assertEqual(result["output"], "done")
-        self.mock_ssh.execute_command.assert_called_with("bash /home/user/work/.dagon/script.sh")
+        self.mock_ssh.execute_command.assert_called_with("bash /home/user/work/.dagon/script.sh", None)
 
     @patch("dagon.docker_task.DockerRemoteTask.remove_container")
     @patch("dagon.docker_task.RemoteTask.on_garbage")
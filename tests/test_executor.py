@@ -0,0 +1,102 @@
+import tempfile
+import threading
+import unittest
+
+import dagon
+from dagon.executor import Executor
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class FakeTask(object):
+    def __init__(self, name, pool="local"):
+        self.name = name
+        self.pool = pool
+
+
+class ExecutorTests(unittest.TestCase):
+    def test_acquire_is_bounded_by_max_workers(self):
+        executor = Executor(2)
+        tasks = [FakeTask("T%d" % index) for index in range(5)]
+        for task in tasks:
+            executor.submit(task)
+
+        self.assertEqual(executor.acquire(), tasks[:2])
+        self.assertEqual(executor.acquire(), [])
+        executor.release(tasks[0])
+        self.assertEqual(executor.acquire(), [tasks[2]])
+
+        stats = executor.stats()
+        self.assertEqual(stats["running"], 2)
+        self.assertEqual(stats["queued"], 2)
+        self.assertEqual(stats["utilisation"], 1.0)
+
+    def test_saturated_pool_does_not_block_other_pools(self):
+        executor = Executor(4, {"ssh": 1})
+        first = FakeTask("first", "ssh")
+        second = FakeTask("second", "ssh")
+        local = FakeTask("local")
+        for task in (first, second, local):
+            executor.submit(task)
+
+        self.assertEqual(executor.acquire(), [first, local])
+
+        stats = executor.stats()
+        self.assertEqual(stats["pools"]["ssh"], {"limit": 1, "running": 1, "queued": 1, "utilisation": 1.0})
+        self.assertEqual(stats["pools"]["local"]["running"], 1)
+
+    def test_invalid_limits_are_rejected(self):
+        with self.assertRaises(ValueError):
+            Executor(0)
+        with self.assertRaises(ValueError):
+            Executor(2, {"slurm": "0"})
+
+    def test_workflow_reads_pool_limits_from_config(self):
+        config = minimal_config()
+        config["executor"] = {"slurm": "3"}
+        workflow = dagon.Workflow("Limits", config=config, max_threads=8)
+        workflow.set_pool_limit("ssh", 2)
+
+        stats = workflow.get_executor_stats()
+        self.assertEqual(stats["max_workers"], 8)
+        self.assertEqual(stats["pools"]["slurm"]["limit"], 3)
+        self.assertEqual(stats["pools"]["ssh"]["limit"], 2)
+        self.assertEqual(stats["pools"]["local"]["limit"], 8)
+
+    def test_task_classes_declare_their_pool(self):
+        self.assertEqual(DagonTask(TaskType.BATCH, "A", "echo A").pool, "local")
+        self.assertEqual(DagonTask(TaskType.SLURM, "B", "echo B").pool, "slurm")
+
+    def test_workflow_run_honours_max_threads(self):
+        config = minimal_config()
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            config["batch"]["scratch_dir_base"] = scratch_dir
+            workflow = dagon.Workflow("Bounded", config=config, max_threads=2)
+            for index in range(6):
+                workflow.add_task(DagonTask(TaskType.BATCH, "T%d" % index, "sleep 0.2"))
+
+            lock = threading.Lock()
+            running = [0]
+            peak = [0]
+
+            def started(task):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+
+            def ended(task):
+                with lock:
+                    running[0] -= 1
+
+            workflow.on_task_start += started
+            workflow.on_task_end += ended
+            workflow.run()
+
+            self.assertTrue(all(task.status == dagon.Status.FINISHED for task in workflow.tasks))
+            self.assertEqual(peak[0], 2)
+            self.assertEqual(workflow.get_executor_stats()["running"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
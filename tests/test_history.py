@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from time import time
+
+import dagon
+from dagon.history import HistoryStore, command_hash
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class HistoryStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "history.sqlite")
+
+    def test_estimates_prefer_runs_of_the_same_command(self):
+        store = HistoryStore(self.path, window=3)
+        for index, duration in enumerate((100, 1, 2, 3, 50)):
+            store.record("Daily", "Model", "new" if duration < 10 else "old", duration, finished=index)
+        store.record("Daily", "Model", "new", 999, code=1, finished=10)
+        store.record("Daily", "Post", "old", 7, code=0, finished=11)
+
+        self.assertEqual(store.estimates("Daily", {"Model": "new"}), {"Model": 2, "Post": 7})
+        self.assertEqual(store.estimates("Daily", {"Model": "unknown"})["Model"], 3)
+        self.assertEqual([run["duration"] for run in store.runs("Daily", "Model", limit=2)], [999, 50])
+        self.assertIsNone(HistoryStore.from_config({}))
+        self.assertEqual(HistoryStore.from_config({"path": self.path, "window": "4"}).window, 4)
+
+    def test_runs_are_recorded_when_tasks_end(self):
+        config = minimal_config()
+        config["batch"]["scratch_dir_base"] = self.directory.name
+        config["history"] = {"path": self.path}
+        workflow = dagon.Workflow("Recorded", config=config)
+        workflow.add_task(DagonTask(TaskType.BATCH, "Mesh", "printf 0123456789 > mesh.txt"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Model", "cat workflow:///Mesh/mesh.txt"))
+        model = workflow.find_task_by_name("Recorded", "Model")
+        execute = model.execute
+
+        def fail():
+            execute()
+            raise RuntimeError("boom")
+
+        model.execute = fail
+        workflow.run()
+
+        runs = {run["task"]: run for run in workflow.history.runs("Recorded")}
+        self.assertEqual(sorted(runs), ["Mesh", "Model"])
+        self.assertEqual((runs["Mesh"]["code"], runs["Model"]["code"]), (0, 1))
+        self.assertEqual(runs["Model"]["staged_bytes"], 10)
+        self.assertEqual(runs["Mesh"]["command"], command_hash(workflow.find_task_by_name("Recorded", "Mesh")))
+        self.assertGreaterEqual(runs["Mesh"]["queue_wait"], 0)
+        self.assertEqual(list(workflow.history.estimates("Recorded")), ["Mesh"])
+
+
+class EtaTests(unittest.TestCase):
+    def test_eta_follows_the_run(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config = minimal_config()
+        config["batch"]["scratch_dir_base"] = directory.name
+        config["history"] = {"path": os.path.join(directory.name, "history.sqlite")}
+        workflow = dagon.Workflow("Forecast", config=config, max_threads=2)
+        workflow.add_task(DagonTask(TaskType.BATCH, "Fetch", "true"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Model", "cat workflow:///Fetch/out 2>/dev/null; true"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Publish", "cat workflow:///Model/out 2>/dev/null; true"))
+        model = workflow.find_task_by_name("Forecast", "Model")
+        workflow.history.record("Forecast", "Model", command_hash(model), 40)
+        workflow.history.record("Forecast", "Publish", "edited", 5)
+
+        before = workflow.eta(default=1, deadline=time() + 60)
+        self.assertAlmostEqual(before["remaining"], 46)
+        self.assertEqual(before["critical_path"], ["Fetch", "Model", "Publish"])
+        self.assertTrue(before["on_time"])
+
+        seen = {}
+
+        def during(task):
+            if task.name == "Model":
+                seen.update(workflow.eta(estimates={"Model": 40, "Publish": 5}, deadline=time() + 30))
+
+        workflow.add_listener("on_task_execute_start", during)
+        workflow.run()
+
+        self.assertEqual(sorted(seen["tasks"]), ["Model", "Publish"])
+        self.assertAlmostEqual(seen["remaining"], 45, delta=1)
+        self.assertFalse(seen["on_time"])
+        self.assertLess(seen["slack"], -10)
+        self.assertGreater(seen["tasks"]["Publish"], seen["tasks"]["Model"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import dagon
+from dagon import incremental, journal
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class IncrementalRunTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+        self.checkpoint_file = os.path.join(self.directory.name, "checkpoint.json")
+        self.dataset = os.path.join(self.directory.name, "dataset.csv")
+        Path(self.dataset).write_text("1,2\n")
+
+    def build(self, mesh="echo mesh > mesh.txt"):
+        workflow = dagon.Workflow("Forecast", config=self.config, checkpoint_file=self.checkpoint_file,
+                                  portable_emulation=True)
+        ingest = DagonTask(TaskType.BATCH, "Ingest", "cp %s data.csv" % self.dataset)
+        ingest.declare_inputs(self.dataset)
+        workflow.add_task(ingest)
+        workflow.add_task(DagonTask(TaskType.BATCH, "Model", "wc -l workflow:///Ingest/data.csv > model.txt"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Mesh", mesh))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Plot",
+                                    "cat workflow:///Mesh/mesh.txt workflow:///Model/model.txt > plot.txt"))
+        return workflow
+
+    def executed(self, workflow):
+        workflow.run(incremental=True)
+        return sorted(task.name for task in workflow.tasks if not task.fair_checkpoint_reused)
+
+    def test_only_changed_tasks_and_their_consumers_run_again(self):
+        self.assertEqual(self.executed(self.build()), ["Ingest", "Mesh", "Model", "Plot"])
+        self.assertEqual(self.executed(self.build()), [])
+
+        # The upstream dataset is republished
+        Path(self.dataset).write_text("1,2\n3,4\n")
+        os.utime(self.dataset, ns=(1, 10 ** 18))
+        workflow = self.build()
+        self.assertEqual(self.executed(workflow), ["Ingest", "Model", "Plot"])
+        self.assertIn("2", Path(workflow.find_task_by_name("Forecast", "Plot").working_dir, "plot.txt").read_text())
+
+        self.assertEqual(self.executed(self.build(mesh="echo finer > mesh.txt")), ["Mesh", "Plot"])
+
+    def test_modified_outputs_of_a_clean_producer_dirty_its_consumers(self):
+        first = self.build()
+        self.executed(first)
+        model_dir = first.find_task_by_name("Forecast", "Model").working_dir
+        os.utime(os.path.join(model_dir, "model.txt"), ns=(1, 10 ** 18))
+
+        second = self.build()
+        second.make_dependencies()
+        dirty = incremental.dirty_tasks(second, journal.load(self.checkpoint_file))
+        self.assertEqual([task.name for task in dirty], ["Plot"])
+
+    def test_signatures_cover_files_and_directories(self):
+        self.assertIsNone(incremental.signature(os.path.join(self.directory.name, "missing")))
+        self.assertEqual(incremental.signature(self.dataset)[0], 4)
+        os.makedirs(os.path.join(self.directory.name, "tree", ".dagon"))
+        Path(self.directory.name, "tree", "a.txt").write_text("abc")
+        Path(self.directory.name, "tree", ".dagon", "launcher.sh").write_text("ignored")
+        self.assertEqual(incremental.signature(os.path.join(self.directory.name, "tree"))[::2], [3, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import dagon
+from dagon import journal
+from dagon.journal import CheckpointStore
+from dagon.scheduling import load_estimates
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class CheckpointJournalTests(unittest.TestCase):
+    def test_changes_survive_a_crash_and_replay_in_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint.json")
+            store = CheckpointStore({"WF.A": {"name": "A"}})
+            store.open(path)
+            store["WF.B"] = {"name": "B", "working_dir": "/scratch/B"}
+            store.record("WF.A", code=0)
+            store.record("WF.B", code=1)
+            store.record("WF.B", code=0, completetion_time=2.5)
+            store.flush()
+            # Crash: the writer is never closed and the last line is torn
+            with open(journal.journal_path(path), "a") as fp:
+                fp.write('{"key": "WF.A", "upd')
+
+            records = journal.load(path)
+            self.assertEqual(records, {"WF.A": {"name": "A", "code": 0},
+                                       "WF.B": {"name": "B", "working_dir": "/scratch/B", "code": 0,
+                                                "completetion_time": 2.5}})
+            store.close()
+
+    def test_close_compacts_the_journal_into_the_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint.json")
+            store = CheckpointStore()
+            store.open(path)
+            with mock.patch.object(journal, "_MIN_COMPACT", 3):
+                for index in range(50):
+                    store.record("WF.T%d" % (index % 5), code=index)
+                store.flush()
+                self.assertLess(len(Path(journal.journal_path(path)).read_text().splitlines()), 50)
+            store.close()
+
+            snapshot = json.loads(Path(path).read_text())
+            self.assertEqual(snapshot["WF.T4"], {"code": 49})
+            self.assertIn(journal.GENERATION, snapshot)
+            self.assertEqual(len(Path(journal.journal_path(path)).read_text().splitlines()), 1)
+            self.assertEqual(journal.load(path)["WF.T0"], {"code": 45})
+
+            store["WF.late"] = {}
+            self.assertNotIn("WF.late", journal.load(path))
+
+    def test_compacted_journal_round_trips_through_load_estimates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint.json")
+            store = CheckpointStore()
+            store.open(path)
+            store["_scratch_dir"] = directory
+            store.record("WF.A", name="A", code=0, completetion_time=2.5)
+            store.record("WF.B", name="B", code=0, completetion_time=4.0)
+            store.close()
+
+            expected = {"WF.A": 2.5, "A": 2.5, "WF.B": 4.0, "B": 4.0}
+            snapshot = json.loads(Path(path).read_text())
+            self.assertIn(journal.GENERATION, snapshot)
+            self.assertEqual(load_estimates(snapshot), expected)
+            self.assertEqual(load_estimates(path), expected)
+
+    def test_journal_of_an_older_snapshot_is_not_replayed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint.json")
+            Path(path).write_text(json.dumps({"WF.A": {"code": 0}, journal.GENERATION: 2}))
+            Path(journal.journal_path(path)).write_text(
+                json.dumps({"generation": 1}) + "\n" + json.dumps({"key": "WF.A", "update": {"code": 1}}) + "\n")
+            self.assertEqual(journal.load(path), {"WF.A": {"code": 0}})
+
+            # Files written before the journal existed load unchanged
+            os.remove(journal.journal_path(path))
+            Path(path).write_text(json.dumps({"_scratch_dir": "/tmp/", "WF.A": {"code": 0}}))
+            self.assertEqual(journal.load(path), {"_scratch_dir": "/tmp/", "WF.A": {"code": 0}})
+
+    def test_workflow_journals_task_state_and_resumes_from_it(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = minimal_config()
+            config["batch"]["scratch_dir_base"] = directory
+            checkpoint_file = os.path.join(directory, "checkpoint.json")
+
+            def build():
+                workflow = dagon.Workflow("Journaled", config=config, checkpoint_file=checkpoint_file,
+                                          portable_emulation=True)
+                workflow.add_task(DagonTask(TaskType.BATCH, "A", "echo A > a.txt"))
+                workflow.add_task(DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt"))
+                return workflow
+
+            first = build()
+            first.run()
+            records = journal.load(checkpoint_file)
+            self.assertEqual(records["Journaled.A"]["code"], 0)
+            self.assertEqual(records["Journaled.B"]["code"], 0)
+            self.assertIsInstance(first.checkpoints, CheckpointStore)
+
+            second = build()
+            with mock.patch("dagon.task.subprocess.run") as run:
+                second.run(resume_checkpoint_file=checkpoint_file)
+            run.assert_not_called()
+            self.assertTrue(all(task.status == dagon.Status.FINISHED for task in second.tasks))
+            self.assertEqual(second.find_task_by_name("Journaled", "A").working_dir,
+                             records["Journaled.A"]["working_dir"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import importlib.util
+import os
+import re
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import dagon
+from dagon.metrics import Counter, Histogram, staged_size
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+def sample(text, name, **labels):
+    selector = ",".join('%s="%s"' % item for item in labels.items())
+    pattern = r"^%s%s (\S+)$" % (re.escape(name), re.escape("{%s}" % selector) if labels else "")
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+class ShardedMetricTests(unittest.TestCase):
+    def test_threads_update_their_own_shards(self):
+        counter = Counter("events_total", "Events.", ("kind",))
+        histogram = Histogram("latency_seconds", "Latency.", buckets=(1.0, 10.0))
+
+        def work():
+            for _ in range(1000):
+                counter.inc(("a",))
+                histogram.observe(0.5)
+            histogram.observe(20.0)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(("b",), 2.5)
+
+        self.assertEqual(counter.collect(), {("a",): 4000, ("b",): 2.5})
+        self.assertEqual(histogram.collect()[()], [4000, 0, 4, 2080.0, 4004])
+        # Shards of the ended threads were folded
+        self.assertEqual(len(counter._shards), 1)
+        self.assertEqual(counter.collect(), {("a",): 4000, ("b",): 2.5})
+
+
+class WorkflowMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+
+    def test_run_updates_the_exposition(self):
+        workflow = dagon.Workflow("Measured", config=self.config,
+                                  checkpoint_file=os.path.join(self.directory.name, "checkpoint.json"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Mesh", "printf 0123456789 > mesh.txt"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Model", "cat workflow:///Mesh/mesh.txt > model.txt"))
+        self.assertEqual(sample(workflow.metrics.render(), "dagon_tasks", status="READY"), 2)
+
+        workflow.run()
+        text = workflow.metrics.render()
+
+        self.assertEqual(sample(text, "dagon_tasks", status="READY"), 0)
+        self.assertEqual(sample(text, "dagon_tasks", status="FINISHED"), 2)
+        self.assertEqual(sample(text, "dagon_ready_tasks"), 0)
+        self.assertEqual(sample(text, "dagon_running_tasks", pool="local"), 0)
+        self.assertEqual(sample(text, "dagon_task_phase_seconds_count", phase="execute"), 2)
+        self.assertEqual(sample(text, "dagon_task_phase_seconds_bucket", phase="task", le="+Inf"), 2)
+        self.assertEqual(sample(text, "dagon_staged_bytes_total", mover="COPY"), 10)
+        self.assertEqual(sample(text, "dagon_staging_transfers_total", mover="COPY"), 1)
+        self.assertEqual(sample(text, "dagon_ssh_connections_open"), 0)
+        self.assertGreater(sample(text, "dagon_checkpoint_write_seconds_count"), 0)
+        self.assertIn("# TYPE dagon_task_phase_seconds histogram", text)
+
+    def test_sources_are_measured_once_per_run(self):
+        workflow = dagon.Workflow("Fanned", config=self.config)
+        workflow.add_task(DagonTask(TaskType.BATCH, "Mesh", "printf 0123456789 > mesh.txt"))
+        for name in ("Wind", "Wave"):
+            workflow.add_task(DagonTask(TaskType.BATCH, name, "cat workflow:///Mesh/mesh.txt"))
+        with mock.patch("dagon.metrics.staged_size", wraps=staged_size) as measured:
+            workflow.run()
+        self.assertEqual(measured.call_count, 1)
+
+        self.assertEqual(sample(workflow.metrics.render(), "dagon_staged_bytes_total", mover="COPY"), 20)
+        self.assertEqual([task.staged_bytes for task in workflow.tasks[1:]], [10, 10])
+
+    @unittest.skipUnless(importlib.util.find_spec("flask") and importlib.util.find_spec("flask_api"),
+                         "flask is not installed")
+    def test_workflow_server_serves_metrics(self):
+        from dagon.api.server import WorkflowServer
+
+        workflow = dagon.Workflow("Served", config=self.config)
+        server = WorkflowServer(workflow, "127.0.0.1", 0)
+        client = server.srv.app.test_client()
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        self.assertIn("dagon_tasks", response.get_data(as_text=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
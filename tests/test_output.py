@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import dagon
+from dagon import output
+from dagon.communication.ssh import SSHManager
+from dagon.output import OutputCapture
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class FakeChannel(object):
+    def __init__(self, stdout, stderr, code):
+        self.stdout, self.stderr, self.code = list(stdout), list(stderr), code
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv(self, size):
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self.code
+
+
+class OutputCaptureTests(unittest.TestCase):
+    def test_memory_keeps_only_the_tail(self):
+        capture = OutputCapture(tail_size=10)
+        for line in range(100):
+            capture.write("stdout", "%03d\n" % line)
+        self.assertEqual(capture.tail(), "7\n098\n099\n")
+        self.assertEqual(capture.tail(size=4), "099\n")
+        self.assertTrue(capture.truncated())
+        self.assertFalse(capture.truncated("stderr"))
+
+    def test_characters_split_across_chunks_are_decoded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            errors = os.path.join(directory, "stderr.txt")
+            capture = OutputCapture({"stderr": errors})
+            data = "température\n".encode()
+            capture.feed("stderr", data[:5])
+            capture.feed("stderr", data[5:])
+            result = capture.result(1)
+            self.assertEqual(result, {"code": 1, "message": "température\n", "output": ""})
+            self.assertEqual(Path(errors).read_text(), "température\n")
+
+    def test_run_streams_both_pipes(self):
+        script = "import sys\nfor i in range(20000): print(i)\nsys.stderr.write('failed')\nsys.exit(3)\n"
+        result = output.run([sys.executable, "-c", script], OutputCapture(tail_size=12))
+        self.assertEqual(result["code"], 3)
+        self.assertEqual(result["output"], "19998\n19999\n")
+        self.assertEqual(result["message"], "failed")
+
+    def test_ssh_channels_are_streamed(self):
+        channel = FakeChannel([b"a" * 8, b"b\n"], [b"warn"], 0)
+        result = SSHManager._stream(channel, OutputCapture(tail_size=4))
+        self.assertEqual((result["code"], result["output"], result["error"]), (0, "aab\n", "warn"))
+
+
+class LauncherOutputTests(unittest.TestCase):
+    def test_local_launcher_output_is_bounded_and_written_to_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = minimal_config()
+            config["batch"]["scratch_dir_base"] = directory
+            config["output"] = {"tail_size": "18"}
+            workflow = dagon.Workflow("Output", config=config)
+            task = DagonTask(TaskType.BATCH, "Loud", "(seq 50000; echo done >&2)")
+            workflow.add_task(task)
+            workflow.run()
+
+            self.assertEqual(task.status, dagon.Status.FINISHED)
+            self.assertEqual(task.tail(), "49998\n49999\n50000\n")
+            self.assertEqual(task.tail("stderr"), "done\n")
+            dagon_dir = Path(task.working_dir, ".dagon")
+            self.assertEqual(len(dagon_dir.joinpath("stdout.txt").read_text().splitlines()), 50000)
+            self.assertEqual(dagon_dir.joinpath("stderr.txt").read_text(), "done\n")
+            with self.assertRaises(ValueError):
+                task.tail("stdin")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import dagon
+from dagon import prefetch
+from dagon.batch import RemoteBatch
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+def hosts(task):
+    # The producer runs on another host than its consumers
+    return ("ssh", "hpc") if task.name == "WRF" else prefetch.LOCAL
+
+
+def local_copy(prefetcher, producer, consumer, path):
+    # Stands for the SCP transfer from the producer host
+    target = prefetcher.target(producer, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copy(os.path.join(producer.working_dir, path), target)
+
+
+class PrefetchTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+        self.config["prefetch"] = {"threads": "2"}
+
+    def run_fan_out(self):
+        workflow = dagon.Workflow("Prefetched", config=self.config)
+        workflow.add_task(DagonTask(TaskType.BATCH, "WRF", "mkdir -p out && echo field > out/wrfout.nc"))
+        for index in range(2):
+            workflow.add_task(DagonTask(TaskType.BATCH, "Post%d" % index,
+                                        "cat workflow:///WRF/out/wrfout.nc > copy.txt"))
+        pushed = []
+        push = workflow.prefetch.push
+        workflow.prefetch.push = lambda producer: pushed.extend(push(producer))
+        workflow.run()
+        self.assertEqual([task.status for task in workflow.tasks], [dagon.Status.FINISHED] * 3)
+        for task in workflow.tasks[1:]:
+            with open(os.path.join(task.working_dir, "copy.txt")) as fp:
+                self.assertEqual(fp.read(), "field\n")
+        return workflow, pushed
+
+    def launcher(self, workflow, name):
+        with open(os.path.join(workflow.find_task_by_name("Prefetched", name).working_dir, ".dagon",
+                               "launcher.sh")) as fp:
+            return fp.read()
+
+    def test_outputs_are_pushed_once_per_host_when_the_producer_ends(self):
+        with mock.patch("dagon.prefetch.host", side_effect=hosts), \
+                mock.patch.object(prefetch.Prefetcher, "_copy", autospec=True, side_effect=local_copy):
+            workflow, pushed = self.run_fan_out()
+
+        self.assertIsInstance(workflow.prefetch, prefetch.Prefetcher)
+        self.assertEqual(workflow.prefetch.threads, 2)
+        # Both consumers share the host: one transfer
+        self.assertEqual(len(pushed), 1)
+        self.assertIsNone(pushed[0].exception())
+        cached = os.path.join(self.directory.name, prefetch.PREFETCH_CACHE, "Prefetched", "WRF", "out", "wrfout.nc")
+        for name in ("Post0", "Post1"):
+            self.assertIn("src=" + cached, self.launcher(workflow, name))
+        # The cache is removed when the run ends
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, prefetch.PREFETCH_CACHE, "Prefetched")))
+
+    def test_failed_prefetch_falls_back_to_the_stage_in(self):
+        with mock.patch("dagon.prefetch.host", side_effect=hosts), \
+                mock.patch.object(prefetch.Prefetcher, "_copy", side_effect=IOError("unreachable")):
+            workflow, pushed = self.run_fan_out()
+
+        self.assertEqual(len(pushed), 1)
+        self.assertNotIn(prefetch.PREFETCH_CACHE, self.launcher(workflow, "Post0"))
+
+    def test_consumers_on_the_producer_host_are_not_prefetched(self):
+        workflow, pushed = self.run_fan_out()
+        self.assertEqual(pushed, [])
+        self.assertEqual(prefetch.host(workflow.tasks[0]), prefetch.LOCAL)
+        self.assertNotIn(prefetch.PREFETCH_CACHE, self.launcher(workflow, "Post0"))
+
+
+class PrefetchCopyTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        config = minimal_config()
+        config["batch"]["scratch_dir_base"] = self.directory.name
+        self.workflow = dagon.Workflow("Coast", config=config)
+        self.prefetcher = self.workflow.enable_prefetch()
+        self.scp = {}
+        patcher = mock.patch("dagon.prefetch._scp", side_effect=lambda task: self.scp[task.name])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = os.path.join(self.directory.name, prefetch.PREFETCH_CACHE, "Coast", "ROMS", "out")
+
+    def task(self, remote, name, working_dir):
+        if remote:
+            task = RemoteBatch(name, "true", working_dir=working_dir)
+            task.ssh_connection = mock.Mock()
+            task.ssh_connection.execute_command.return_value = {"code": 0, "message": "", "output": ""}
+            self.scp[name] = mock.Mock()
+        else:
+            task = DagonTask(TaskType.BATCH, name, "true", working_dir=working_dir)
+        self.workflow.add_task(task)
+        return task
+
+    def test_remote_outputs_are_fetched_to_a_local_consumer(self):
+        producer = self.task(True, "ROMS", "/scratch/roms")
+        consumer = self.task(False, "WACOMM", None)
+        self.prefetcher._copy(producer, consumer, "out/his.nc")
+        self.scp["ROMS"].get.assert_called_once_with("/scratch/roms/out/his.nc", self.cache, recursive=True)
+        self.assertTrue(os.path.isdir(self.cache))
+
+    def test_local_outputs_are_pushed_to_a_remote_consumer(self):
+        producer = self.task(False, "ROMS", "/data/roms")
+        consumer = self.task(True, "WACOMM", None)
+        self.prefetcher._copy(producer, consumer, "out/his.nc")
+        consumer.ssh_connection.execute_command.assert_called_once_with("mkdir -p " + self.cache)
+        self.scp["WACOMM"].put.assert_called_once_with("/data/roms/out/his.nc", self.cache, recursive=True)
+
+    def test_outputs_between_remote_hosts_are_relayed(self):
+        producer = self.task(True, "ROMS", "/scratch/roms")
+        consumer = self.task(True, "WACOMM", None)
+        relays = []
+
+        def get(source, relay, recursive):
+            relays.append(relay)
+            with open(os.path.join(relay, "his.nc"), "w") as fp:
+                fp.write("field")
+
+        self.scp["ROMS"].get.side_effect = get
+        self.prefetcher._copy(producer, consumer, "out/his.nc")
+        self.scp["WACOMM"].put.assert_called_once_with(os.path.join(relays[0], "his.nc"), self.cache,
+                                                       recursive=True)
+        self.assertFalse(os.path.exists(relays[0]))
+
+    def test_failed_remote_mkdir_fails_the_prefetch(self):
+        producer = self.task(False, "ROMS", "/data/roms")
+        consumer = self.task(True, "WACOMM", None)
+        consumer.ssh_connection.execute_command.return_value = {"code": 1, "message": "denied", "output": ""}
+        with self.assertRaises(IOError):
+            self.prefetcher._copy(producer, consumer, "out/his.nc")
+        self.scp["WACOMM"].put.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest import mock
+
+from dagon.references import WorkflowReference, parse_reference, scan_command, scan_value, substitute
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import make_workflow
+
+
+class ReferenceParserTests(unittest.TestCase):
+    def test_parse_reference_splits_workflow_task_and_path(self):
+        self.assertEqual(parse_reference("workflow://WF/A/out/data.txt"),
+                         WorkflowReference("workflow://WF/A/out/data.txt", "WF", "A", "out/data.txt"))
+        reference = parse_reference("workflow:///A/data.txt")
+        self.assertEqual(reference.workflow_name("Current"), "Current")
+
+    def test_scan_command_stops_at_whitespace_and_drops_repetitions(self):
+        command = "cat workflow:///A/a.txt workflow:///B/b.txt\tworkflow:///A/a.txt > out.txt"
+        self.assertEqual([reference.raw for reference in scan_command(command)],
+                         ["workflow:///A/a.txt", "workflow:///B/b.txt"])
+        self.assertEqual(scan_command(None), ())
+
+    def test_scan_value_walks_nested_structures(self):
+        value = {"url": "http://x", "body": [{"file": "workflow:///A/a.json"}, "see workflow:///B/b.txt."]}
+        self.assertEqual([reference.task for reference in scan_value(value, ".")], ["A", "B"])
+        self.assertEqual(scan_value(value, ".")[1].path, "b.txt")
+
+    def test_substitute_replaces_all_references_in_one_pass(self):
+        command = "cat workflow:///A/a.txt;cat workflow:///A/a.txt"
+        result = substitute(command, lambda reference: "/scratch/" + reference.path, ";")
+        self.assertEqual(result, "cat /scratch/a.txt;cat /scratch/a.txt")
+
+
+class ReferenceTableTests(unittest.TestCase):
+    def test_find_task_by_name_uses_the_index(self):
+        workflow = make_workflow("Indexed")
+        first = DagonTask(TaskType.BATCH, "A", "echo first")
+        workflow.add_task(first)
+        workflow.add_task(DagonTask(TaskType.BATCH, "A", "echo duplicate"))
+
+        with mock.patch.object(workflow, "tasks", new=[]):
+            self.assertIs(workflow.find_task_by_name("Indexed", "A"), first)
+        self.assertIsNone(workflow.find_task_by_name("Other", "A"))
+        self.assertIsNone(workflow.find_task_by_name("Indexed", "missing"))
+
+    def test_references_are_parsed_once_and_refreshed_with_the_command(self):
+        workflow = make_workflow("Table")
+        workflow.add_task(DagonTask(TaskType.BATCH, "A", "echo A"))
+        task = DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt workflow:///A/a.txt")
+        with mock.patch("dagon.task.scan_command", wraps=scan_command) as scan:
+            workflow.add_task(task)
+            workflow.make_dependencies()
+            workflow.make_dependencies()
+        self.assertEqual(scan.call_count, 1)
+        self.assertEqual(task.get_references(), (parse_reference("workflow:///A/a.txt"),))
+
+        task.command = "cat workflow:///A/b.txt"
+        self.assertEqual(task.get_references()[0].path, "b.txt")
+
+    def test_release_references_balances_reference_counts(self):
+        workflow = make_workflow("Counts")
+        task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+        task_b = DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt workflow://Counts/A/b.txt")
+        workflow.add_task(task_a)
+        workflow.add_task(task_b)
+        workflow.make_dependencies()
+        self.assertEqual(task_a.reference_count, 2)
+
+        task_b.release_references()
+        self.assertEqual(task_a.reference_count, 0)
+
+    def test_portable_command_resolves_local_producers(self):
+        workflow = make_workflow("Portable")
+        task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+        task_b = DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt|wc -l; ls workflow:///A")
+        workflow.add_task(task_a)
+        workflow.add_task(task_b)
+        workflow.make_dependencies()
+        task_a.working_dir = "/scratch/A"
+
+        self.assertEqual(task_b.portable_command(), "cat /scratch/A/a.txt|wc -l; ls workflow:///A")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import dagon
+from dagon.result_cache import ResultCache, parse_size
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class ResultCacheTests(unittest.TestCase):
+    def test_outputs_are_hardlinked_without_the_dagon_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(os.path.join(directory, "cache"))
+            source = os.path.join(directory, "run1")
+            os.makedirs(os.path.join(source, ".dagon"))
+            os.makedirs(os.path.join(source, "out"))
+            Path(source, "out", "field.nc").write_text("data")
+            Path(source, ".dagon", "launcher.sh").write_text("true")
+            key = cache.key({"command": "model"})
+
+            self.assertFalse(cache.fetch(key, os.path.join(directory, "run2")))
+            self.assertTrue(cache.store(key, source))
+            self.assertFalse(cache.store(key, source))
+            self.assertTrue(cache.fetch(key, os.path.join(directory, "run2")))
+
+            fetched = Path(directory, "run2", "out", "field.nc")
+            self.assertEqual(fetched.read_text(), "data")
+            self.assertFalse(Path(directory, "run2", ".dagon").exists())
+            self.assertEqual(os.stat(fetched).st_nlink, 2)
+            self.assertEqual(cache.digest(source), cache.digest(os.path.join(directory, "run2")))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(os.path.join(directory, "cache"), max_size="25", link="copy")
+            keys = []
+            for index in range(3):
+                source = os.path.join(directory, "run%d" % index)
+                os.makedirs(source)
+                Path(source, "out").write_text("x" * 10)
+                keys.append(cache.key({"index": index}))
+                cache.store(keys[-1], source)
+                if index == 1:
+                    # Use the first entry so the second one is the oldest
+                    os.utime(os.path.join(cache._entry(keys[0]), "entry.json"), (0, 2))
+                    os.utime(os.path.join(cache._entry(keys[1]), "entry.json"), (0, 1))
+
+            self.assertEqual([key in cache for key in keys], [True, False, True])
+            self.assertEqual(cache.size(), 20)
+
+    def test_sizes_accept_unit_suffixes(self):
+        self.assertEqual(parse_size("20G"), 20 * 1024 ** 3)
+        self.assertEqual(parse_size("1.5kb"), 1536)
+        self.assertEqual(parse_size(100), 100)
+        self.assertIsNone(ResultCache.from_config({}))
+        with self.assertRaises(ValueError):
+            ResultCache("/tmp/unused", link="symlink")
+
+
+class WorkflowResultCacheTests(unittest.TestCase):
+    def test_only_tasks_with_changed_inputs_run_again(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = minimal_config()
+            config["batch"]["scratch_dir_base"] = directory
+            config["result_cache"] = {"path": os.path.join(directory, "cache")}
+
+            def run(name, observation):
+                workflow = dagon.Workflow(name, config=config, portable_emulation=True)
+                workflow.add_task(DagonTask(TaskType.BATCH, "Observe", "echo %s > obs.txt" % observation))
+                workflow.add_task(DagonTask(TaskType.BATCH, "Mesh", "echo mesh > mesh.txt"))
+                workflow.add_task(DagonTask(TaskType.BATCH, "Forecast",
+                                            "cat workflow:///Observe/obs.txt workflow:///Mesh/mesh.txt > out.txt"))
+                workflow.run()
+                executed = sorted(task.name for task in workflow.tasks if not task.fair_checkpoint_reused)
+                forecast = workflow.find_task_by_name(name, "Forecast")
+                return executed, Path(forecast.working_dir, "out.txt").read_text()
+
+            self.assertEqual(run("Day1", "sunny"), (["Forecast", "Mesh", "Observe"], "sunny\nmesh\n"))
+            self.assertEqual(run("Day2", "sunny"), ([], "sunny\nmesh\n"))
+            self.assertEqual(run("Day3", "rain"), (["Forecast", "Observe"], "rain\nmesh\n"))
+
+            workflow = dagon.Workflow("Day4", config=config, portable_emulation=True)
+            workflow.add_task(DagonTask(TaskType.BATCH, "Mesh", "echo mesh > mesh.txt"))
+            with mock.patch("dagon.task.subprocess.run") as executed:
+                workflow.run()
+            executed.assert_not_called()
+            self.assertEqual(workflow.checkpoints["Day4.Mesh"]["code"], 0)
+            self.assertIn("result_key", workflow.checkpoints["Day4.Mesh"])
+
+    def test_declared_local_inputs_are_part_of_the_key(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = minimal_config()
+            config["batch"]["scratch_dir_base"] = directory
+            config["result_cache"] = {"path": os.path.join(directory, "cache")}
+            bathymetry = os.path.join(directory, "bathymetry.nc")
+
+            def run(name, depth):
+                Path(bathymetry).write_text(depth)
+                workflow = dagon.Workflow(name, config=config, portable_emulation=True)
+                task = DagonTask(TaskType.BATCH, "Model", "cat %s > out.txt" % bathymetry)
+                workflow.add_task(task.declare_inputs(bathymetry))
+                workflow.run()
+                return task.fair_checkpoint_reused, Path(task.working_dir, "out.txt").read_text()
+
+            self.assertEqual(run("Day1", "10m"), (False, "10m"))
+            self.assertEqual(run("Day2", "10m"), (True, "10m"))
+            self.assertEqual(run("Day3", "12m"), (False, "12m"))
+
+            os.remove(bathymetry)
+            workflow = dagon.Workflow("Day4", config=config, portable_emulation=True)
+            task = DagonTask(TaskType.BATCH, "Model", "true")
+            workflow.add_task(task.declare_inputs(bathymetry))
+            self.assertIsNone(task.result_spec())
+
+
+if __name__ == "__main__":
+    unittest.main()
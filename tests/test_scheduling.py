@@ -0,0 +1,107 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import dagon
+from dagon.scheduling import CriticalPathPolicy, FanOutPolicy, FIFOPolicy, load_estimates
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class SchedulingPolicyTests(unittest.TestCase):
+    def _workflow(self, directory, name, **kwargs):
+        config = minimal_config()
+        config["batch"]["scratch_dir_base"] = directory
+        return dagon.Workflow(name, config=config, max_threads=1, portable_emulation=True, **kwargs)
+
+    def _envapp(self, workflow):
+        for index in range(4):
+            workflow.add_task(DagonTask(TaskType.BATCH, "post%d" % index, "true"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "wrf", "echo wrf > out.txt"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "roms", "cat workflow:///wrf/out.txt > out.txt"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "wacomm", "cat workflow:///roms/out.txt"))
+
+    def _start_order(self, workflow):
+        order = []
+        workflow.on_task_start += lambda task: order.append(task.name)
+        workflow.run()
+        self.assertTrue(all(task.status == dagon.Status.FINISHED for task in workflow.tasks))
+        return order
+
+    def test_fifo_starts_ready_tasks_in_release_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workflow = self._workflow(directory, "fifo")
+            self._envapp(workflow)
+            self.assertIsInstance(workflow.get_scheduling_policy(), FIFOPolicy)
+            self.assertEqual(self._start_order(workflow)[:5], ["post0", "post1", "post2", "post3", "wrf"])
+
+    def test_critical_path_starts_the_longest_chain_first(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workflow = self._workflow(directory, "envapp")
+            self._envapp(workflow)
+            workflow.set_scheduling_policy(CriticalPathPolicy({"wrf": 100, "roms": 50, "wacomm": 30, "post0": 5}))
+            order = self._start_order(workflow)
+            self.assertEqual(order[:3], ["wrf", "roms", "wacomm"])
+
+            ranks = workflow.get_scheduling_policy()._keys
+            wrf = workflow.find_task_by_name("envapp", "wrf")
+            self.assertEqual(ranks[wrf], 180)
+
+    def test_critical_path_updates_only_the_changed_tasks_and_their_producers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workflow = self._workflow(directory, "envapp")
+            self._envapp(workflow)
+            policy = CriticalPathPolicy({"wrf": 100, "roms": 50, "wacomm": 30, "plot": 20})
+            workflow.make_dependencies()
+            policy.prepare(workflow)
+            plot = DagonTask(TaskType.BATCH, "plot", "cat workflow:///wacomm/out.txt")
+            workflow.add_task(plot)
+            workflow.update_dependencies()
+
+            with mock.patch.object(workflow, "topological_order", side_effect=AssertionError("whole graph ranked")):
+                policy.update(workflow, [plot])
+            self.assertEqual(policy._keys, policy.rank(workflow))
+            self.assertEqual(policy._keys[workflow.find_task_by_name("envapp", "wrf")], 200)
+
+    def test_critical_path_uses_durations_recorded_by_a_previous_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_file = str(Path(directory, "previous.json"))
+            previous = self._workflow(directory, "envapp", checkpoint_file=checkpoint_file)
+            self._envapp(previous)
+            previous.run()
+            records = json.loads(Path(checkpoint_file).read_text())
+            self.assertIsInstance(records["envapp.wrf"]["completetion_time"], float)
+
+            records["envapp.wrf"]["completetion_time"] = 3600.0
+            Path(checkpoint_file).write_text(json.dumps(records))
+            estimates = load_estimates(checkpoint_file)
+            self.assertEqual(estimates["envapp.wrf"], 3600.0)
+            self.assertEqual(estimates["wrf"], 3600.0)
+
+            workflow = self._workflow(directory, "envapp")
+            self._envapp(workflow)
+            workflow.set_scheduling_policy(CriticalPathPolicy(checkpoint_file))
+            self.assertEqual(self._start_order(workflow)[0], "wrf")
+
+    def test_fan_out_starts_tasks_with_most_consumers_first(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workflow = self._workflow(directory, "fanout")
+            workflow.add_task(DagonTask(TaskType.BATCH, "leaf", "true"))
+            workflow.add_task(DagonTask(TaskType.BATCH, "hub", "echo hub > out.txt"))
+            for index in range(3):
+                workflow.add_task(DagonTask(TaskType.BATCH, "c%d" % index, "cat workflow:///hub/out.txt"))
+            workflow.set_scheduling_policy("fan_out")
+            self.assertIsInstance(workflow.get_scheduling_policy(), FanOutPolicy)
+            self.assertEqual(self._start_order(workflow)[0], "hub")
+
+    def test_unknown_policy_is_rejected(self):
+        workflow = dagon.Workflow("policy", config=minimal_config())
+        with self.assertRaises(ValueError):
+            workflow.set_scheduling_policy("random")
+
+
+if __name__ == "__main__":
+    unittest.main()
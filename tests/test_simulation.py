@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import dagon
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class SimulationTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+
+    def fan_out(self, max_threads=2):
+        workflow = dagon.Workflow("Plan", config=self.config, max_threads=max_threads)
+        workflow.add_task(DagonTask(TaskType.BATCH, "Split", "split input"))
+        for index in range(4):
+            workflow.add_task(DagonTask(TaskType.BATCH, "Chunk%d" % index, "process workflow:///Split/part"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Merge",
+                                    "merge workflow:///Chunk0/out workflow:///Chunk3/out"))
+        return workflow
+
+    def test_makespan_and_critical_path_without_executing(self):
+        workflow = self.fan_out()
+        with mock.patch("dagon.task.Task.start") as start:
+            report = workflow.simulate(estimates={"Split": 2, "Chunk3": 5})
+
+        start.assert_not_called()
+        self.assertEqual(os.listdir(self.directory.name), [])
+        self.assertEqual(report.makespan, 9.0)
+        self.assertEqual(report.critical_path, ["Split", "Chunk3", "Merge"])
+        self.assertEqual((report.tasks["Chunk3"].ready, report.tasks["Chunk3"].start), (2.0, 3.0))
+        self.assertAlmostEqual(report.utilisation()["utilisation"], 11 / 18)
+        self.assertEqual(report.utilisation()["pools"]["local"]["peak"], 2)
+        self.assertEqual(self.fan_out(max_threads=4).simulate(estimates={"Split": 2, "Chunk3": 5}).makespan, 8.0)
+        self.assertIn("Makespan: 9.000 s", report.summary())
+
+    def test_estimates_come_from_annotations_and_history(self):
+        workflow = self.fan_out(max_threads=8)
+        workflow.find_task_by_name("Plan", "Split").annotate(duration=3)
+        history = {"Plan.Merge": {"name": "Merge", "completetion_time": 4.5}}
+        report = workflow.simulate(history=history, default=0.25)
+        self.assertEqual([report.tasks[name].duration for name in ("Split", "Chunk0", "Merge")], [3.0, 0.25, 4.5])
+        self.assertEqual(report.makespan, 7.75)
+
+    def test_simulated_width_may_exceed_the_workflow_width(self):
+        workflow = dagon.Workflow("Wide", config=self.config, max_threads=4)
+        for index in range(32):
+            workflow.add_task(DagonTask(TaskType.BATCH, "Tile%d" % index, "render"))
+        makespans = [workflow.simulate(default=10, max_threads=width).makespan for width in (4, 16, 32)]
+        self.assertEqual(makespans, [80.0, 20.0, 10.0])
+        self.assertEqual(workflow.simulate(default=10, max_threads=32).utilisation()["pools"]["local"]["slots"], 32)
+        # Configured pool limits still apply, capped by the simulated width
+        workflow.executor.set_limit("local", 8)
+        self.assertEqual(workflow.simulate(default=10, max_threads=32).makespan, 40.0)
+        workflow.executor.set_limit("local", 64)
+        self.assertEqual(workflow.simulate(default=10, max_threads=16).makespan, 20.0)
+
+    def test_backend_pools_add_latency_and_limits(self):
+        workflow = dagon.Workflow("Cluster", config=self.config, max_threads=10)
+        for index in range(4):
+            workflow.add_task(DagonTask(TaskType.SLURM, "Job%d" % index, "model", partition="short"))
+        report = workflow.simulate(default=60, pools={"slurm": {"limit": 2, "latency": 30}})
+        self.assertEqual(report.makespan, 180.0)
+        self.assertEqual(report.utilisation()["pools"]["slurm"], {"slots": 2, "peak": 2, "utilisation": 1.0})
+
+    def test_policy_and_targets_are_honoured(self):
+        workflow = dagon.Workflow("Order", config=self.config, max_threads=2)
+        for index in range(3):
+            workflow.add_task(DagonTask(TaskType.BATCH, "Short%d" % index, "true"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Long", "true"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "After", "cat workflow:///Long/out"))
+        estimates = {"Long": 5, "After": 5}
+
+        self.assertEqual(workflow.simulate(estimates=estimates).makespan, 11.0)
+        self.assertEqual(workflow.simulate(estimates=estimates, policy="critical_path").makespan, 10.0)
+        report = workflow.simulate(estimates=estimates, targets=["After"])
+        self.assertEqual((sorted(report.tasks), report.makespan), (["After", "Long"], 10.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
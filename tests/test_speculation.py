@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from time import time
+
+import dagon
+from dagon.shell import quote
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class SpeculationTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+        self.lock = quote(os.path.join(self.directory.name, "first"))
+
+    def workflow(self, name):
+        workflow = dagon.Workflow(name, config=self.config, max_threads=8,
+                                  checkpoint_file=os.path.join(self.directory.name, name + ".json"))
+        workflow.enable_speculation(multiplier=2, quantile=0.5, min_runtime=0.2, interval=0.05)
+        return workflow
+
+    def test_attempt_of_a_straggler_wins(self):
+        workflow = self.workflow("FanOut")
+        workflow.add_task(DagonTask(TaskType.BATCH, "Split", "echo part > part.txt"))
+        for index in range(3):
+            workflow.add_task(DagonTask(TaskType.BATCH, "Post%d" % index, "cat workflow:///Split/part.txt > out.txt"))
+        # The first execution hangs; the attempt finds the lock and ends at once
+        straggler = DagonTask(TaskType.BATCH, "Post3", "mkdir %s && sleep 60; cat workflow:///Split/part.txt > out.txt"
+                              % self.lock)
+        workflow.add_task(straggler.set_idempotent())
+        workflow.add_task(DagonTask(TaskType.BATCH, "Merge", "cat workflow:///Post3/out.txt > merged.txt"))
+
+        start = time()
+        workflow.run()
+
+        self.assertLess(time() - start, 30)
+        self.assertEqual([task.status for task in workflow.tasks], [dagon.Status.FINISHED] * 6)
+        self.assertTrue(straggler.working_dir.endswith("-Post3.attempt"))
+        self.assertEqual(workflow.checkpoints["FanOut.Post3"]["working_dir"], straggler.working_dir)
+        self.assertEqual(workflow.checkpoints["FanOut.Post3"]["code"], 0)
+        merge = workflow.find_task_by_name("FanOut", "Merge")
+        with open(os.path.join(merge.working_dir, "merged.txt")) as fp:
+            self.assertEqual(fp.read(), "part\n")
+        # The scratch directory of the cancelled execution was removed
+        self.assertEqual(len([name for name in os.listdir(self.directory.name) if name.endswith("-Post3")]), 0)
+        self.assertIn('dagon_speculative_attempts_total{outcome="won"} 1', workflow.metrics.render())
+
+    def test_original_that_ends_first_cancels_the_attempt(self):
+        workflow = self.workflow("Single")
+        task = DagonTask(TaskType.BATCH, "Model", "if mkdir %s; then sleep 1; else sleep 60; fi; echo ok > out.txt"
+                         % self.lock)
+        workflow.add_task(task.set_idempotent().annotate(duration=0.1))
+
+        start = time()
+        workflow.run()
+
+        self.assertLess(time() - start, 30)
+        self.assertEqual(task.status, dagon.Status.FINISHED)
+        self.assertTrue(task.working_dir.endswith("-Model"))
+        self.assertEqual([name for name in os.listdir(self.directory.name) if name.endswith(".attempt")], [])
+        self.assertIn('dagon_speculative_attempts_total{outcome="lost"} 1', workflow.metrics.render())
+
+    def test_tasks_that_are_not_idempotent_are_not_speculated(self):
+        workflow = self.workflow("Plain")
+        task = DagonTask(TaskType.BATCH, "Model", "sleep 0.6")
+        workflow.add_task(task.annotate(duration=0.1))
+        workflow.run()
+        self.assertTrue(task.working_dir.endswith("-Model"))
+        self.assertFalse(workflow.speculation.eligible(task))
+        self.assertNotIn("dagon_speculative_attempts_total{", workflow.metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
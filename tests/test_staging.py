@@ -1,6 +1,15 @@
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
-from dagon.stager.base import Stager, StagerMover, DataMover
+import dagon
+from dagon.stager.base import STAGING_CACHE, Stager, StagerMover, DataMover
+from dagon.batch import RemoteBatch
+from dagon.shell import quote
+from dagon.stager import transfer
+from dagon.task import DagonTask, TaskType
 
 from tests.helpers import minimal_config
 
@@ -35,5 +44,192 @@ class StagingTests(unittest.TestCase):
                 self.assertIn("job_ids=()", script)
 
 
+class HardlinkStagingTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+
+    def run_fan_in(self, producer_dir=None):
+        workflow = dagon.Workflow("Linked", config=self.config)
+        workflow.set_data_mover(DataMover.HARDLINK)
+        workflow.add_task(DagonTask(TaskType.BATCH, "WRF", "mkdir -p out && echo field > out/wrfout.nc",
+                                    working_dir=producer_dir))
+        for index in range(3):
+            workflow.add_task(DagonTask(TaskType.BATCH, "Post%d" % index, "cat workflow:///WRF/out/wrfout.nc"))
+        workflow.run()
+        self.assertEqual([task.status for task in workflow.tasks], [dagon.Status.FINISHED] * 4)
+        staged = [os.path.join(task.working_dir, ".dagon", "inputs", "Linked", "WRF", "out", "wrfout.nc")
+                  for task in workflow.tasks[1:]]
+        for path in staged:
+            with open(path) as fp:
+                self.assertEqual(fp.read(), "field\n")
+        return workflow, [os.stat(path) for path in staged]
+
+    def test_consumers_link_the_producer_files(self):
+        self.config["batch"]["remove_dir"] = True
+        workflow, staged = self.run_fan_in()
+        producer = workflow.find_task_by_name("Linked", "WRF")
+        # The producer scratch directory was moved away; the links still hold the data
+        self.assertTrue(producer.working_dir.endswith("-removed"))
+        original = os.stat(os.path.join(producer.working_dir, "out", "wrfout.nc"))
+        self.assertEqual({stat.st_ino for stat in staged}, {original.st_ino})
+        self.assertEqual(original.st_nlink, 4)
+
+    @unittest.skipUnless(os.path.isdir("/dev/shm") and
+                         os.stat("/dev/shm").st_dev != os.stat(tempfile.gettempdir()).st_dev,
+                         "needs a second file system")
+    def test_sources_on_another_file_system_are_materialised_once(self):
+        producer_dir = tempfile.mkdtemp(dir="/dev/shm")
+        self.addCleanup(shutil.rmtree, producer_dir, True)
+        workflow, staged = self.run_fan_in(producer_dir)
+        source = os.stat(os.path.join(producer_dir, "out", "wrfout.nc"))
+        self.assertEqual(len({stat.st_ino for stat in staged}), 1)
+        self.assertNotEqual(staged[0].st_dev, source.st_dev)
+        self.assertEqual(staged[0].st_nlink, 3)
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, STAGING_CACHE, "Linked")))
+
+    def test_caches_of_remote_hosts_are_removed_once_per_host(self):
+        workflow = dagon.Workflow("Remote", config=self.config)
+        workflow.set_data_mover(DataMover.HARDLINK)
+        connections = {}
+        for name, ip in (("ROMS", "10.0.0.1"), ("WACOMM", "10.0.0.1"), ("Plot", "10.0.0.2")):
+            task = RemoteBatch(name, "true")
+            task.ip = ip
+            task.ssh_connection = mock.Mock()
+            task.ssh_connection.execute_command.return_value = {"code": 0, "message": "", "output": ""}
+            connections[name] = task.ssh_connection
+            workflow.add_task(task)
+        connections["Plot"].execute_command.return_value = {"code": 1, "message": "denied", "output": ""}
+        cache = "/".join((workflow.get_scratch_dir_base(), STAGING_CACHE, "Remote"))
+
+        with self.assertLogs(workflow.logger, "WARNING") as logs:
+            workflow._remove_staging_cache()
+
+        connections["ROMS"].execute_command.assert_called_once_with("rm -rf " + quote(cache))
+        connections["WACOMM"].execute_command.assert_not_called()
+        connections["Plot"].execute_command.assert_called_once_with("rm -rf " + quote(cache))
+        self.assertIn("10.0.0.2: denied", logs.output[0])
+
+
+class PythonTransferTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+        self.config["batch"]["threads"] = "4"
+
+    def test_tree_is_copied_in_batches_and_large_files_in_the_kernel(self):
+        source = os.path.join(self.directory.name, "source", "out")
+        os.makedirs(os.path.join(source, "logs"))
+        for index in range(40):
+            with open(os.path.join(source, "logs", "%02d.log" % index), "w") as fp:
+                fp.write("line %d\n" % index)
+        with open(os.path.join(source, "field.nc"), "wb") as fp:
+            fp.write(os.urandom(3 * transfer.SMALL_FILE))
+        os.chmod(os.path.join(source, "field.nc"), 0o750)
+        os.symlink("field.nc", os.path.join(source, "latest.nc"))
+        seen = []
+
+        report = transfer.transfer(source, os.path.join(self.directory.name, "inputs"), threads=4,
+                                   progress=lambda *counts: seen.append(counts))
+
+        self.assertTrue(report.ok)
+        target = os.path.join(self.directory.name, "inputs", "out")
+        self.assertEqual(sorted(os.listdir(os.path.join(target, "logs"))),
+                         sorted(os.listdir(os.path.join(source, "logs"))))
+        with open(os.path.join(target, "field.nc"), "rb") as fp, open(os.path.join(source, "field.nc"), "rb") as sp:
+            self.assertEqual(fp.read(), sp.read())
+        self.assertEqual(os.stat(os.path.join(target, "field.nc")).st_mode & 0o777, 0o750)
+        self.assertEqual(os.readlink(os.path.join(target, "latest.nc")), "field.nc")
+        methods = {item.destination: item.method for item in report.files}
+        self.assertIn(methods[os.path.join(target, "field.nc")], ("copy_file_range", "sendfile", "read"))
+        self.assertEqual(methods[os.path.join(target, "logs")], "mkdir")
+        # 40 logs and the link in one batch, the large file alone
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(max(seen), (42, 42, report.bytes, report.bytes))
+
+    def test_missing_sources_are_reported(self):
+        report = transfer.transfer(os.path.join(self.directory.name, "nothing*"), self.directory.name)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.failed[0].error, "No such file or directory")
+
+    def run_fan_in(self, data_mover, consumer):
+        workflow = dagon.Workflow("Engine", config=self.config)
+        workflow.set_data_mover(data_mover)
+        workflow.set_stager_mover(StagerMover.PYTHON)
+        workflow.add_task(DagonTask(TaskType.BATCH, "WRF", "mkdir -p out && echo field > out/wrfout.nc"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Post", consumer))
+        workflow.run()
+        return workflow, workflow.find_task_by_name("Engine", "Post")
+
+    def test_workflow_stages_local_sources_with_the_engine(self):
+        for data_mover in (DataMover.COPY, DataMover.HARDLINK):
+            # The bytes come from the transfer, the source is not measured again
+            with mock.patch("dagon.metrics.staged_size") as measured:
+                workflow, post = self.run_fan_in(data_mover, "cat workflow:///WRF/out/wrfout.nc > copy.txt")
+            measured.assert_not_called()
+            self.assertEqual(post.status, dagon.Status.FINISHED)
+            with open(os.path.join(post.working_dir, "copy.txt")) as fp:
+                self.assertEqual(fp.read(), "field\n")
+            expected = ("hardlink",) if data_mover == DataMover.HARDLINK else ("copy_file_range", "sendfile", "read")
+            self.assertEqual(len(post.transfers), 1)
+            self.assertIn(post.transfers[0].method, expected)
+            self.assertEqual(post.transfers[0].size, 6)
+            self.assertEqual(post.staged_bytes, 6)
+            with open(os.path.join(post.working_dir, ".dagon", "launcher.sh")) as fp:
+                self.assertNotIn("for file in", fp.read())
+
+    def test_failed_transfers_fail_the_task(self):
+        workflow, post = self.run_fan_in(DataMover.COPY, "cat workflow:///WRF/out/missing.nc")
+        self.assertEqual(post.status, dagon.Status.FAILED)
+        self.assertEqual(post.transfers[0].error, "No such file or directory")
+
+
+class TarStagingTests(unittest.TestCase):
+    def test_matching_files_are_streamed_as_one_archive(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config = minimal_config()
+        config["batch"]["scratch_dir_base"] = directory.name
+        workflow = dagon.Workflow("Tiles", config=config)
+        workflow.set_data_mover(DataMover.TAR)
+        workflow.add_task(DagonTask(TaskType.BATCH, "Map", "mkdir -p tiles/z1 && for i in $(seq 200); do "
+                                    "echo $i > tiles/$i.png; done && touch tiles/index.txt tiles/z1/0.png"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Publish", "ls workflow:///Map/tiles/*.png | wc -l > count.txt"))
+        workflow.run()
+
+        publish = workflow.find_task_by_name("Tiles", "Publish")
+        self.assertEqual(publish.status, dagon.Status.FINISHED)
+        staged = os.path.join(publish.working_dir, ".dagon", "inputs", "Tiles", "Map", "tiles")
+        self.assertEqual(len(os.listdir(staged)), 200)
+        self.assertFalse(os.path.exists(os.path.join(staged, "index.txt")))
+        with open(os.path.join(staged, "17.png")) as fp:
+            self.assertEqual(fp.read(), "17\n")
+        with open(os.path.join(publish.working_dir, ".dagon", "launcher.sh")) as fp:
+            launcher = fp.read()
+        self.assertIn("tar -cf - *.png | tar -xf - -C", launcher)
+        self.assertNotIn("for file in", launcher)
+
+    def test_remote_sources_are_read_over_one_ssh_channel(self):
+        source = RemoteBatch("Model", "true", working_dir="/scratch/model dir")
+        source.info = {"user": "ubuntu", "ip": "10.0.0.2"}
+        source.ssh_port = 2222
+        destination = DagonTask(TaskType.BATCH, "Post", "true", working_dir="/scratch/post")
+        stager = Stager(DataMover.TAR, StagerMover.NORMAL, minimal_config())
+
+        with mock.patch.object(type(destination), "get_public_key", return_value="ssh-rsa KEY"), \
+                mock.patch.object(RemoteBatch, "add_public_key") as add_public_key:
+            command = stager.tar_stream(destination, source, "/scratch/post/.dagon/inputs/out", "/out/his_*.nc")
+
+        add_public_key.assert_called_once_with("ssh-rsa KEY")
+        self.assertIn("-i /scratch/post/.dagon/ssh_key -p 2222 ubuntu@10.0.0.2 ", command)
+        self.assertIn(quote("cd '/scratch/model dir//out' && tar -cf - his_*.nc"), command)
+        self.assertTrue(command.startswith("(set -o pipefail; ssh "))
+        self.assertTrue(command.endswith("| tar -xf - -C /scratch/post/.dagon/inputs/out)\n"))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import dagon
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class TargetedRunTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+        self.checkpoint_file = os.path.join(self.directory.name, "checkpoint.json")
+
+    def build(self):
+        workflow = dagon.Workflow("Domains", config=self.config, checkpoint_file=self.checkpoint_file,
+                                  portable_emulation=True)
+        workflow.add_task(DagonTask(TaskType.BATCH, "Mesh", "echo mesh > mesh.txt"))
+        for domain in ("North", "South"):
+            workflow.add_task(DagonTask(TaskType.BATCH, "Model" + domain,
+                                        "cat workflow:///Mesh/mesh.txt > %s.txt" % domain))
+            workflow.add_task(DagonTask(TaskType.BATCH, "Plot" + domain,
+                                        "cat workflow:///Model%s/%s.txt > plot.txt" % (domain, domain)))
+        return workflow
+
+    def states(self, workflow):
+        return {task.name: (task.status, task.working_dir is not None) for task in workflow.tasks}
+
+    def test_only_the_producers_of_a_target_run(self):
+        workflow = self.build()
+        workflow.run(targets=["workflow:///PlotNorth/plot.txt"])
+
+        finished, ready = (dagon.Status.FINISHED, True), (dagon.Status.READY, False)
+        self.assertEqual(self.states(workflow), {"Mesh": finished, "ModelNorth": finished, "PlotNorth": finished,
+                                                 "ModelSouth": ready, "PlotSouth": ready})
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory.name))),
+                         sorted(["checkpoint.json", "checkpoint.json.journal"] +
+                                [os.path.basename(task.working_dir) for task in workflow.tasks if task.working_dir]))
+
+    def test_targets_combine_with_resume(self):
+        self.build().run(targets=["PlotNorth"])
+
+        workflow = self.build()
+        with mock.patch("dagon.task.subprocess.run", wraps=subprocess.run) as executed:
+            workflow.run(resume_checkpoint_file=self.checkpoint_file, targets=["PlotSouth"])
+        self.assertEqual(executed.call_count, 2)
+        self.assertTrue(workflow.find_task_by_name("Domains", "Mesh").fair_checkpoint_reused)
+        self.assertEqual(workflow.find_task_by_name("Domains", "PlotNorth").status, dagon.Status.READY)
+
+    def test_launch_and_run_async_accept_targets(self):
+        workflow = self.build()
+        workflow.launch(targets=[workflow.find_task_by_name("Domains", "ModelSouth")])
+        self.assertTrue(workflow.wait(30))
+        self.assertEqual([task.name for task in workflow.tasks if task.status == dagon.Status.FINISHED],
+                         ["Mesh", "ModelSouth"])
+
+        workflow = self.build()
+        asyncio.run(workflow.run_async(targets=["Mesh"]))
+        self.assertEqual([task.name for task in workflow.tasks if task.status == dagon.Status.FINISHED], ["Mesh"])
+
+    def test_unknown_targets_are_rejected(self):
+        workflow = self.build()
+        for target in ("Missing", "workflow://Other/Mesh/mesh.txt"):
+            with self.assertRaises(ValueError):
+                workflow.launch(targets=[target])
+        self.assertEqual([task.name for task in workflow.select_tasks("PlotSouth")],
+                         ["Mesh", "ModelSouth", "PlotSouth"])
+
+
+if __name__ == "__main__":
+    unittest.main()
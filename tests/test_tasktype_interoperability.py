@@ -5,6 +5,7 @@ portable DAGonStar contract shared by every backend; backend-specific suites
 cover command generation and mocked provider behavior separately.
 """
 
+import asyncio
 import tempfile
 import unittest
 import json
@@ -167,6 +168,18 @@ class TaskTypeInteroperabilityTests(unittest.TestCase):
             run = json.loads(Path(fair_dir, "run.json").read_text(encoding="utf-8"))
             self.assertEqual(set(run["tasks"]), {task.name for task in workflow.tasks})
 
+    def test_every_task_type_executes_together_with_run_async(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = minimal_config()
+            config["batch"]["scratch_dir_base"] = directory
+            workflow = Workflow("portable-async", config=config, portable_emulation=True)
+            workflow.add_task(DagonTask(TaskType.BATCH, "producer",
+                                        "mkdir -p output; printf '1\\n2\\n' > output/value.txt"))
+            for task in self._tasks().values():
+                workflow.add_task(task)
+            asyncio.run(workflow.run_async())
+            self.assertTrue(all(task.status is Status.FINISHED for task in workflow.tasks))
+
 
 if __name__ == "__main__":
     unittest.main()
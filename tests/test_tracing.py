@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import dagon
+from dagon.batch import Slurm
+from dagon.task import DagonTask, TaskType
+
+from tests.helpers import minimal_config
+
+
+class TracingTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.config = minimal_config()
+        self.config["batch"]["scratch_dir_base"] = self.directory.name
+
+    def build(self, **options):
+        workflow = dagon.Workflow("Traced", config=self.config, **options)
+        workflow.add_task(DagonTask(TaskType.BATCH, "Mesh", "echo mesh > mesh.txt"))
+        workflow.add_task(DagonTask(TaskType.BATCH, "Model", "cat workflow:///Mesh/mesh.txt > model.txt"))
+        return workflow
+
+    def spans(self, tracer, task):
+        return {span.name: span for span in tracer.spans if span.task == task}
+
+    def test_task_phases_are_recorded(self):
+        workflow = self.build()
+        tracer = workflow.enable_tracing()
+        workflow.run()
+
+        mesh, model = self.spans(tracer, "Mesh"), self.spans(tracer, "Model")
+        for phase in ("task", "dependencies", "queue", "stage_in", "context", "execute", "stage_out", "release"):
+            self.assertIn(phase, model)
+            self.assertIsNotNone(model[phase].end)
+        self.assertGreaterEqual(model["dependencies"].end, mesh["execute"].end)
+        self.assertEqual(model["context"].parent_id, model["stage_in"].span_id)
+        self.assertEqual(model["execute"].parent_id, model["task"].span_id)
+        run = [span for span in tracer.spans if span.name == "workflow"][0]
+        self.assertEqual(mesh["task"].parent_id, run.span_id)
+
+    def test_runs_are_exported_as_chrome_and_otlp_json(self):
+        chrome = os.path.join(self.directory.name, "trace.json")
+        otlp = os.path.join(self.directory.name, "trace.otlp.json")
+        self.config["tracing"] = {"chrome": chrome, "otlp": otlp}
+        workflow = self.build(portable_emulation=True)
+        workflow.run()
+
+        with open(chrome) as fp:
+            events = json.load(fp)["traceEvents"]
+        rows = {event["args"]["name"]: event["tid"] for event in events if event["ph"] == "M"}
+        self.assertEqual(set(rows), {"Traced", "Mesh", "Model"})
+        executed = [event for event in events if event["name"] == "execute"]
+        self.assertEqual(sorted(event["tid"] for event in executed), sorted([rows["Mesh"], rows["Model"]]))
+        self.assertTrue(all(event["dur"] >= 0 for event in executed))
+
+        with open(otlp) as fp:
+            spans = json.load(fp)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        identifiers = {span["spanId"] for span in spans}
+        self.assertTrue(all(span["parentSpanId"] in identifiers for span in spans if "parentSpanId" in span))
+        self.assertEqual(len({span["traceId"] for span in spans}), 1)
+        with self.assertRaises(ValueError):
+            workflow.tracer.export(chrome, "perfetto")
+
+    def test_slurm_queue_wait_comes_from_sacct(self):
+        workflow = dagon.Workflow("Queued", config=self.config)
+        task = Slurm("job", "true")
+        workflow.add_task(task)
+        tracer = workflow.enable_tracing()
+        accounting = {"code": 0, "output": "2026-01-05T10:00:00|2026-01-05T10:02:30\n"}
+        with mock.patch.object(Slurm, "query_command", return_value=accounting) as query:
+            task.trace_queue({"code": 0, "output": "Submitted batch job 42\n"})
+        self.assertIn("42", query.call_args[0][0])
+        span = self.spans(tracer, "job")["slurm.queue"]
+        self.assertEqual(span.duration, 150)
+        self.assertEqual(span.start, int(datetime(2026, 1, 5, 10).timestamp() * 1e9))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ import tempfile
 import threading
 import json
 import os
+from unittest import mock
 
 import dagon
 from dagon.task import DagonTask, TaskType
@@ -220,6 +221,292 @@ class WorkflowCoreTests(unittest.TestCase):
             self.assertIs(events[0][1], workflow)
             self.assertIs(events[-1][1], workflow)
 
+    def test_scheduler_starts_consumers_only_after_their_producers(self):
+        config = minimal_config()
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            config["batch"]["scratch_dir_base"] = scratch_dir
+            workflow = dagon.Workflow("Diamond", config=config)
+            task_a = DagonTask(TaskType.BATCH, "A", "echo A > a.txt")
+            task_b = DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt > b.txt")
+            task_c = DagonTask(TaskType.BATCH, "C", "cat workflow:///A/a.txt > c.txt")
+            task_d = DagonTask(
+                TaskType.BATCH, "D", "cat workflow:///B/b.txt workflow:///C/c.txt workflow:///B/b.txt")
+            for task in (task_a, task_b, task_c, task_d):
+                workflow.add_task(task)
+
+            events = []
+            lock = threading.Lock()
+
+            def record(name):
+                def listener(subject):
+                    with lock:
+                        events.append((name, subject.name))
+                return listener
+
+            workflow.on_task_start += record("start")
+            workflow.on_task_end += record("end")
+
+            started = time.monotonic()
+            workflow.run()
+            elapsed = time.monotonic() - started
+
+            self.assertTrue(all(task.status == dagon.Status.FINISHED for task in workflow.tasks))
+            self.assertEqual(len(events), 8)
+            self.assertLess(events.index(("end", "A")), events.index(("start", "B")))
+            self.assertLess(events.index(("end", "A")), events.index(("start", "C")))
+            self.assertLess(events.index(("end", "B")), events.index(("start", "D")))
+            self.assertLess(events.index(("end", "C")), events.index(("start", "D")))
+            # Consumers are released as soon as producers end, without fixed delays.
+            self.assertLess(elapsed, 4)
+
+    def test_scheduler_releases_consumers_of_failed_tasks(self):
+        config = minimal_config()
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            config["batch"]["scratch_dir_base"] = scratch_dir
+            workflow = dagon.Workflow("FailedProducer", config=config)
+            task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+            task_b = DagonTask(TaskType.BATCH, "B", "cat workflow:///A/missing.txt")
+            workflow.add_task(task_a)
+            workflow.add_task(task_b)
+            workflow.make_dependencies()
+
+            def fail():
+                raise RuntimeError("boom")
+
+            task_a.execute = fail
+
+            workflow.launch()
+            self.assertTrue(workflow.wait(timeout=10))
+
+            self.assertEqual(task_a.status, dagon.Status.FAILED)
+            self.assertEqual(task_b.status, dagon.Status.FAILED)
+
+    def test_scheduler_ignores_stale_consumer_edges(self):
+        config = minimal_config()
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            config["batch"]["scratch_dir_base"] = scratch_dir
+            workflow = dagon.Workflow("Stale", config=config)
+            task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+            task_b = DagonTask(TaskType.BATCH, "B", "sleep 0.3")
+            task_c = DagonTask(TaskType.BATCH, "C", "echo C")
+            for task in (task_a, task_b, task_c):
+                workflow.add_task(task)
+            task_c.add_dependency_to(task_b)
+            # Left behind by an edit that only removed the prevs side
+            task_a.nexts.append(task_c)
+            events = []
+            workflow.on_task_start += lambda task: events.append(("start", task.name))
+            workflow.on_task_end += lambda task: events.append(("end", task.name))
+            workflow.run()
+
+            self.assertEqual(task_c.status, dagon.Status.FINISHED)
+            self.assertLess(events.index(("end", "B")), events.index(("start", "C")))
+
+    def test_make_dependencies_resolves_only_new_and_changed_tasks(self):
+        workflow = make_workflow("Incremental")
+        task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+        task_b = DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt")
+        workflow.add_task(task_a)
+        workflow.add_task(task_b)
+        workflow.make_dependencies()
+
+        task_c = DagonTask(TaskType.BATCH, "C", "cat workflow:///A/a.txt workflow:///B/b.txt")
+        workflow.add_task(task_c)
+        self.assertFalse(workflow._dependencies_made)
+        calls = []
+        for task in workflow.tasks:
+            task.pre_run = (lambda original, task: lambda: (calls.append(task.name), original())[1])(task.pre_run, task)
+        self.assertEqual(workflow.update_dependencies(), [task_c])
+        self.assertEqual(calls, ["C"])
+        self.assertEqual(task_a.nexts, [task_b, task_c])
+        self.assertEqual(task_a.reference_count, 2)
+
+        task_b.command = "cat workflow:///C/c.txt"
+        task_c.command = "echo C"
+        workflow.make_dependencies()
+        self.assertEqual(calls, ["C", "B", "C"])
+        self.assertEqual(task_a.nexts, [])
+        self.assertEqual(task_c.nexts, [task_b])
+        self.assertEqual((task_a.reference_count, task_b.reference_count, task_c.reference_count), (0, 0, 1))
+
+        workflow.make_dependencies(rebuild=True)
+        self.assertEqual(calls, ["C", "B", "C", "A", "B", "C"])
+        self.assertEqual(task_b.prevs, [task_c])
+
+    def test_update_dependencies_keeps_edges_added_by_hand(self):
+        workflow = make_workflow("Manual")
+        task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+        task_b = DagonTask(TaskType.BATCH, "B", "echo B")
+        workflow.add_task(task_a)
+        workflow.add_task(task_b)
+        workflow.make_dependencies()
+        task_b.add_dependency_to(task_a)
+
+        workflow.add_task(DagonTask(TaskType.BATCH, "C", "cat workflow:///B/b.txt"))
+        workflow.make_dependencies()
+        self.assertEqual(task_b.prevs, [task_a])
+
+        with self.assertRaisesRegex(Exception, "cycle"):
+            task_a.command = "cat workflow:///C/c.txt"
+            workflow.make_dependencies()
+
+    def test_update_dependencies_validates_only_the_changed_subgraph(self):
+        workflow = make_workflow("Subgraph")
+        for name, command in (("A", "echo A"), ("B", "cat workflow:///A/a.txt"), ("X", "echo X"),
+                              ("Y", "cat workflow:///X/x.txt")):
+            workflow.add_task(DagonTask(TaskType.BATCH, name, command))
+        workflow.make_dependencies()
+        task_a = workflow.find_task_by_name("Subgraph", "A")
+        task_c = DagonTask(TaskType.BATCH, "C", "cat workflow:///B/b.txt")
+        workflow.add_task(task_c)
+
+        with mock.patch.object(workflow, "Validate_WF", side_effect=AssertionError("whole graph validated")):
+            self.assertEqual(workflow.update_dependencies(), [task_c])
+            task_a.command = "cat workflow:///C/c.txt"
+            with self.assertRaises(dagon.WorkflowCycleError) as raised:
+                workflow.make_dependencies()
+        self.assertEqual([task.name for task in raised.exception.tasks], ["A", "B", "C"])
+
+    def test_tasks_added_during_a_run_are_scheduled(self):
+        config = minimal_config()
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            config["batch"]["scratch_dir_base"] = scratch_dir
+            workflow = dagon.Workflow("Growing", config=config)
+            task_a = DagonTask(TaskType.BATCH, "A", "echo A > a.txt")
+            workflow.add_task(task_a)
+            events = []
+
+            def grow(task):
+                events.append(("start", task.name))
+                if task is task_a:
+                    workflow.add_task(DagonTask(TaskType.BATCH, "C", "cat workflow:///A/a.txt > c.txt"))
+                    workflow.update_dependencies()
+
+            workflow.on_task_start += grow
+            workflow.on_task_end += lambda task: events.append(("end", task.name))
+            workflow.run()
+
+            task_c = workflow.find_task_by_name("Growing", "C")
+            self.assertEqual(task_c.status, dagon.Status.FINISHED)
+            self.assertLess(events.index(("end", "A")), events.index(("start", "C")))
+
+    def test_consumers_of_a_parallel_task_wait_for_its_fan_out(self):
+        config = minimal_config()
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            config["batch"]["scratch_dir_base"] = scratch_dir
+            workflow = dagon.Workflow("Parallel", config=config)
+            workflow.add_task(DagonTask(TaskType.BATCH, "Split", "mkdir parts && echo 0.1 > parts/d1.txt && "
+                                                                 "echo 0.3 > parts/d3.txt && echo 0.6 > parts/d6.txt"))
+            task_a = DagonTask(TaskType.BATCH, "A", "xargs sleep < workflow:///Split/parts/*.txt")
+            task_a.mode = "parallel"
+            workflow.add_task(task_a)
+            workflow.add_task(DagonTask(TaskType.BATCH, "C", "echo workflow:///A/out"))
+            starts, ends = {}, {}
+            workflow.on_task_start += lambda task: starts.setdefault(task.name, time.monotonic())
+            workflow.on_task_end += lambda task: ends.setdefault(task.name, time.monotonic())
+            workflow.run()
+
+            fan_out = ["A_d1", "A_d3", "A_d6"]
+            self.assertEqual(sorted(task.name for task in task_a.new_tasks), fan_out)
+            task_c = workflow.find_task_by_name("Parallel", "C")
+            self.assertEqual(task_c.status, dagon.Status.FINISHED)
+            self.assertNotIn(task_c, task_a.nexts)
+            self.assertNotIn(task_a, task_c.prevs)
+            for name in fan_out:
+                self.assertEqual(workflow.find_task_by_name("Parallel", name).status, dagon.Status.FINISHED)
+                self.assertGreaterEqual(starts["C"], ends[name])
+
+    def test_validation_sorts_long_chains_without_recursion(self):
+        workflow = make_workflow("Chain")
+        previous = None
+        for index in range(5000):
+            task = DagonTask(TaskType.BATCH, "T%d" % index, "echo %d" % index)
+            workflow.add_task(task)
+            if previous is not None:
+                task.add_dependency_to(previous)
+            previous = task
+        workflow.make_dependencies()
+
+        order = workflow.topological_order()
+        self.assertEqual(order, workflow.tasks)
+        self.assertIs(workflow.topological_order(), order)
+        self.assertEqual(workflow.get_levels()[previous], 4999)
+
+    def test_topological_order_and_levels_follow_dependencies(self):
+        workflow = make_workflow("Levels")
+        task_d = DagonTask(TaskType.BATCH, "D", "cat workflow:///B/b.txt workflow:///C/c.txt")
+        task_b = DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt")
+        task_c = DagonTask(TaskType.BATCH, "C", "echo C")
+        task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+        for task in (task_d, task_b, task_c, task_a):
+            workflow.add_task(task)
+        workflow.make_dependencies()
+
+        self.assertEqual(workflow.topological_order(), [task_c, task_a, task_b, task_d])
+        self.assertEqual(workflow.get_levels(), {task_a: 0, task_b: 1, task_c: 0, task_d: 2})
+        self.assertEqual(list(workflow.as_json()["tasks"]), ["C", "A", "B", "D"])
+
+        order = workflow.topological_order()
+        workflow.add_task(DagonTask(TaskType.BATCH, "E", "cat workflow:///D/d.txt"))
+        workflow.make_dependencies()
+        self.assertIsNot(workflow.topological_order(), order)
+        self.assertEqual(workflow.get_levels()[workflow.find_task_by_name("Levels", "E")], 3)
+
+    def test_cycle_error_names_every_task_on_the_cycle(self):
+        workflow = make_workflow("Cycles")
+        tasks = {}
+        for name in "ABCDE":
+            tasks[name] = DagonTask(TaskType.BATCH, name, "echo " + name)
+            workflow.add_task(tasks[name])
+        tasks["B"].add_dependency_to(tasks["A"])
+        tasks["C"].add_dependency_to(tasks["B"])
+        tasks["A"].add_dependency_to(tasks["C"])
+        tasks["D"].add_dependency_to(tasks["C"])
+        tasks["E"].add_dependency_to(tasks["E"])
+
+        with self.assertRaises(dagon.WorkflowCycleError) as raised:
+            workflow.Validate_WF()
+        self.assertEqual([task.name for task in raised.exception.tasks], ["A", "B", "C", "E"])
+        self.assertIn("cycle", str(raised.exception))
+
+    def test_task_specs_are_compact_until_started(self):
+        workflow = make_workflow("Compact")
+        task_a = DagonTask(TaskType.BATCH, "A", "echo A")
+        task_b = DagonTask(TaskType.BATCH, "B", "cat workflow:///A/a.txt")
+        workflow.add_task(task_a)
+        workflow.add_task(task_b)
+        workflow.make_dependencies()
+        workflow.as_json()
+
+        self.assertNotIsInstance(task_a, threading.Thread)
+        self.assertEqual(vars(task_a), {})
+        self.assertIsNone(task_a._runtime)
+        self.assertIsNone(task_a.result)
+        self.assertEqual(task_a.completetion_time, 0)
+        self.assertEqual(task_a.fair_inputs, [])
+
+    def test_task_start_keeps_the_thread_interface(self):
+        config = minimal_config()
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            config["batch"]["scratch_dir_base"] = scratch_dir
+            workflow = dagon.Workflow("Threaded", config=config, portable_emulation=True)
+            task = DagonTask(TaskType.BATCH, "A", "echo A")
+            workflow.add_task(task)
+            self.assertFalse(task.is_alive())
+            self.assertIsNone(task.ident)
+            with self.assertRaises(RuntimeError):
+                task.join()
+
+            workflow.run()
+
+            self.assertEqual(task.status, dagon.Status.FINISHED)
+            self.assertIsNotNone(task.ident)
+            task.join(timeout=5)
+            self.assertFalse(task.is_alive())
+            self.assertEqual(task.get_runtime().result["code"], 0)
+            with self.assertRaises(RuntimeError):
+                task.start()
+
 
 if __name__ == "__main__":
     unittest.main()